@@ -0,0 +1,45 @@
+"""離線 benchmark.
+
+DB 與 Azure File Storage 以替身取代, 不需要 .env 或任何外部服務.
+
+    python -m app.benchmark --output logs/benchmark.json
+    python -m app.benchmark --compare logs/benchmark.json --threshold 0.1
+"""
+
+import argparse
+import sys
+from app.benchmark import fakes
+
+
+def main() -> int:
+    """執行 benchmark, 保存並與基準比較
+
+    Returns:
+        int: 有項目退步時為 1
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=5, help="每個項目的測量輪數")
+    parser.add_argument("--only", help="只執行名稱包含此字串的項目, 例如 jwt.")
+    parser.add_argument("--output", help="結果存成 json")
+    parser.add_argument("--compare", help="與之前保存的 json 比較")
+    parser.add_argument("--threshold", type=float, default=0.1, help="中位數變慢超過此比例視為退步")
+    args = parser.parse_args()
+
+    fakes.install()
+    from app.benchmark import runner
+    from app.benchmark.hot_path import build_cases
+
+    report = runner.run(build_cases(), rounds=args.rounds, only=args.only)
+    comparison = runner.compare(runner.load(args.compare), report, args.threshold) if args.compare else None
+    print(runner.format_report(report, comparison))
+
+    if args.output:
+        runner.save(report, args.output)
+    if comparison and any(row["regression"] for row in comparison):
+        print(f"\n退步超過 {args.threshold:.0%} 的項目: {', '.join(r['name'] for r in comparison if r['regression'])}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
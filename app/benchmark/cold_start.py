@@ -0,0 +1,149 @@
+"""Worker 冷啟動時間: 每輪啟動新的 Python process, 測量 import main 與 lifespan startup.
+
+DB 與 Azure File Storage 以替身取代, 結果格式與 python -m app.benchmark 相同, 可以保存與比較.
+
+    python -m app.benchmark.cold_start --rounds 10 --output logs/cold_start.json
+    python -m app.benchmark.cold_start --compare logs/cold_start.json
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+import orjson
+from app.benchmark import runner
+
+# 在新的 process 中執行, stdout 輸出各階段秒數
+SCRIPT = """
+import asyncio, time
+import orjson
+started_at = time.perf_counter()
+from app.benchmark import fakes
+fakes.install()
+installed_at = time.perf_counter()
+import main
+imported_at = time.perf_counter()
+
+async def startup():
+    async with main.app.router.lifespan_context(main.app):
+        return time.perf_counter()
+
+ready_at = asyncio.run(startup())
+print(orjson.dumps({"import_main": imported_at - installed_at, "lifespan_startup": ready_at - imported_at}).decode())
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def parse_importtime(stderr: str) -> Dict[str, float]:
+    """解析 python -X importtime 的輸出
+
+    Args:
+        stderr (str): process 的 stderr
+
+    Returns:
+        Dict[str, float]: 模組名稱與自身 import 秒數 (不含其 import 的模組)
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:") :].split("|", 2)
+        modules[name.strip()] = int(self_us) / 1_000_000
+    return modules
+
+
+def measure_once() -> Tuple[Dict[str, float], Dict[str, float]]:
+    """啟動一個 process 測量一次
+
+    Raises:
+        RuntimeError: process 執行失敗
+
+    Returns:
+        Tuple[Dict[str, float], Dict[str, float]]: 各階段秒數, 各模組的 import 秒數
+    """
+    started_at = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", SCRIPT], cwd=ROOT, capture_output=True, text=True, check=False
+    )
+    elapsed = time.perf_counter() - started_at
+    if completed.returncode:
+        raise RuntimeError(f"Cold start failed:\n{completed.stderr[-2000:]}")
+    phases = orjson.loads(completed.stdout.strip().splitlines()[-1])
+    phases["process"] = elapsed
+    return phases, parse_importtime(completed.stderr)
+
+
+def top_packages(samples: List[Dict[str, float]], count: int) -> List[Tuple[str, float]]:
+    """依頂層套件加總 import 秒數, 取中位數最大的幾個
+
+    Args:
+        samples (List[Dict[str, float]]): 每輪各模組的 import 秒數
+        count (int): 數量
+
+    Returns:
+        List[Tuple[str, float]]: 套件名稱與秒數
+    """
+    totals: Dict[str, List[float]] = defaultdict(list)
+    for modules in samples:
+        packages: Dict[str, float] = defaultdict(float)
+        for name, seconds in modules.items():
+            packages[name.split(".")[0]] += seconds
+        for name, seconds in packages.items():
+            totals[name].append(seconds)
+    medians = [(name, statistics.median(values)) for name, values in totals.items()]
+    return sorted(medians, key=lambda item: item[1], reverse=True)[:count]
+
+
+def main() -> int:
+    """執行冷啟動測量並印出結果
+
+    Returns:
+        int: exit code, 與基準比較有退步時為 1
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=5, help="測量輪數")
+    parser.add_argument("--top", type=int, default=15, help="列出 import 最久的套件數")
+    parser.add_argument("--output", help="結果存成 json")
+    parser.add_argument("--compare", help="與保存的結果比較")
+    parser.add_argument("--threshold", type=float, default=0.1, help="中位數變慢超過此比例視為退步")
+    args = parser.parse_args()
+
+    phases: Dict[str, List[float]] = defaultdict(list)
+    imports = []
+    for _ in range(args.rounds):
+        result, modules = measure_once()
+        for name, seconds in result.items():
+            phases[name].append(seconds * 1_000_000)
+        imports.append(modules)
+
+    results = {
+        f"cold_start.{name}": {
+            "number": 1,
+            "rounds": args.rounds,
+            "min_us": min(samples),
+            "median_us": statistics.median(samples),
+            "mean_us": statistics.fmean(samples),
+            "stdev_us": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        }
+        for name, samples in phases.items()
+    }
+    report = {"meta": runner.environment(), "results": results}
+    comparison = runner.compare(runner.load(args.compare), report, args.threshold) if args.compare else None
+
+    print(runner.format_report(report, comparison))
+    print()
+    print("import time by package (median):")
+    for name, seconds in top_packages(imports, args.top):
+        print(f"  {name:<30} {seconds * 1000:>8.1f}ms")
+    if args.output:
+        runner.save(report, args.output)
+    return 1 if comparison and any(row["regression"] for row in comparison) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
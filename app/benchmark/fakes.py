@@ -0,0 +1,744 @@
+"""Benchmark 用的 pyodbc 與 Azure File Storage 替身, 不需要 SQL Server 或 Azure 即可執行.
+
+install() 必須在 import app 的其他模組之前呼叫, 之後 import 的 pyodbc / azure.storage.fileshare (含 aio) 都是這裡的替身.
+"""
+
+import itertools
+import os
+import sys
+import types
+from io import BytesIO
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+from azure.core.exceptions import HttpResponseError, ResourceExistsError, ResourceNotFoundError
+
+ResultSet = Tuple[Sequence[str], List[tuple]]
+
+# 測試用的設定, 覆蓋 .env 與環境變數, 每次執行條件相同; 撤銷清單與 JWKS 只使用記憶體, 不讀寫檔案
+BENCHMARK_ENV = {
+    "DB_SERVER": "benchmark",
+    "DB_DATABASE": "benchmark",
+    "DB_USER": "benchmark",
+    "DB_PASSWORD": "benchmark",
+    "JWT_ALGORITHM": "HS256",
+    "JWT_SECRET_KEY": "0" * 64,
+    "JWT_EXPIRE_MINUTES": "15",
+    "JWT_RE_SECRET_KEY": "1" * 64,
+    "JWT_RE_EXPIRE_MINUTES": "60",
+    "JWT_KEYS_FILE": "",
+    "JWT_REVOCATION_FILE": "",
+    "AFS_CONNECTION_STRING": "benchmark",
+    "AFS_SHARE_NAME": "benchmark",
+}
+
+
+def synthetic_rows(row_count: int, column_count: int = 10) -> ResultSet:
+    """產生假的結果集, 欄位型態混合 int / str / float / None
+
+    Args:
+        row_count (int): 筆數
+        column_count (int, optional): 欄位數. Defaults to 10.
+
+    Returns:
+        ResultSet: (欄位名稱, 資料列)
+    """
+    columns = [f"COLUMN_{index}" for index in range(column_count)]
+    samples: List[Any] = [0, "text", 1.5, None]
+    rows = [
+        tuple(row if index == 0 else samples[index % len(samples)] for index in range(column_count))
+        for row in range(row_count)
+    ]
+    return columns, rows
+
+
+class FakeError(Exception):
+    """pyodbc.Error 替身"""
+
+
+class FakeCursor:
+    """pyodbc.Cursor 替身, 依序回傳 FakeConnection.results 產生的結果集
+
+    結果集在 execute 與 nextset 時才產生, results 拋出的錯誤與 pyodbc 相同, 在讀到該結果集時才發生.
+
+    Attributes:
+        description: 目前結果集的欄位資訊, 沒有結果集時為 None
+    """
+
+    def __init__(self, connection: "FakeConnection") -> None:
+        """Init.
+
+        Args:
+            connection (FakeConnection): 所屬的連線
+        """
+        self.connection = connection
+        self.description: Optional[List[tuple]] = None
+        self._sets: Iterator[ResultSet] = iter(())
+        self._rows: List[tuple] = []
+
+    def execute(self, sql: str, *params: Any) -> "FakeCursor":
+        """執行 SQL, 產生結果集
+
+        Args:
+            sql (str): SQL 語句
+            params (Any): 綁定參數
+
+        Returns:
+            FakeCursor: self
+        """
+        self._sets = iter([(["ALIVE"], [(1,)])]) if sql == "SELECT 1" else iter(self.connection.results(sql, params))
+        self.nextset()
+        return self
+
+    def nextset(self) -> Optional[bool]:
+        """移到下一個結果集
+
+        Returns:
+            Optional[bool]: 有下一個結果集時為 True
+        """
+        result_set = next(self._sets, None)
+        if result_set is None:
+            self.description, self._rows = None, []
+            return None
+        columns, rows = result_set
+        self.description = [(column, None, None, None, None, None, True) for column in columns]
+        self._rows = list(rows)
+        return True
+
+    def fetchall(self) -> List[tuple]:
+        """取得剩餘的資料列
+
+        Returns:
+            List[tuple]: 資料列
+        """
+        rows, self._rows = self._rows, []
+        return rows
+
+    def fetchmany(self, size: int = 1) -> List[tuple]:
+        """取得最多 size 筆資料列
+
+        Args:
+            size (int, optional): 筆數. Defaults to 1.
+
+        Returns:
+            List[tuple]: 資料列
+        """
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def fetchone(self) -> Optional[tuple]:
+        """取得一筆資料列
+
+        Returns:
+            Optional[tuple]: 資料列, 沒有資料時為 None
+        """
+        return self._rows.pop(0) if self._rows else None
+
+    def close(self) -> None:
+        """關閉 cursor"""
+
+
+def default_results(sql: str, params: tuple) -> Iterator[ResultSet]:
+    """預設的 SP 結果: 10 筆資料列
+
+    Args:
+        sql (str): SQL 語句
+        params (tuple): 綁定參數
+
+    Yields:
+        ResultSet: 結果集
+    """
+    yield synthetic_rows(10)
+
+
+class FakeConnection:
+    """pyodbc.Connection 替身
+
+    Attributes:
+        results: 依 SQL 與參數產生結果集的函式, 可在 benchmark 中替換
+        closed: 是否已關閉
+    """
+
+    results: Callable[[str, tuple], Iterator[ResultSet]] = staticmethod(default_results)
+
+    def __init__(self, connection_string: str = "", **kwargs: Any) -> None:
+        """Init.
+
+        Args:
+            connection_string (str): 連線字串
+            kwargs (Any): 連線選項
+        """
+        self.connection_string = connection_string
+        self.closed = False
+
+    def cursor(self) -> FakeCursor:
+        """建立 cursor
+
+        Returns:
+            FakeCursor: cursor
+        """
+        return FakeCursor(self)
+
+    def commit(self) -> None:
+        """Commit"""
+
+    def rollback(self) -> None:
+        """Rollback"""
+
+    def close(self) -> None:
+        """關閉連線"""
+        self.closed = True
+
+
+class FakeDownloader:
+    """StorageStreamDownloader 替身
+
+    Attributes:
+        properties: 含 size, etag 與 content_range ("bytes <start>-<end>/<檔案 bytes>") 的屬性
+    """
+
+    def __init__(
+        self, data: bytes, offset: int = 0, file_size: Optional[int] = None, etag: Optional[str] = None
+    ) -> None:
+        """Init.
+
+        Args:
+            data (bytes): 下載的內容
+            offset (int, optional): 內容在檔案中的起始位置. Defaults to 0.
+            file_size (Optional[int], optional): 檔案 bytes, 未指定時為 len(data). Defaults to None.
+            etag (Optional[str], optional): 檔案的 ETag. Defaults to None.
+        """
+        self.data = data
+        self.size = len(data)
+        file_size = len(data) if file_size is None else file_size
+        self.properties = types.SimpleNamespace(
+            size=len(data), etag=etag, content_range=f"bytes {offset}-{offset + len(data) - 1}/{file_size}"
+        )
+
+    def readall(self) -> bytes:
+        """讀取全部內容
+
+        Returns:
+            bytes: 檔案內容
+        """
+        return self.data
+
+    def readinto(self, stream: BytesIO) -> int:
+        """寫入 stream
+
+        Args:
+            stream (BytesIO): 目的 stream
+
+        Returns:
+            int: 寫入的 bytes
+        """
+        return stream.write(self.data)
+
+    def chunks(self) -> Iterator[bytes]:
+        """分段讀取
+
+        Yields:
+            bytes: 4MB 一段的內容
+        """
+        for start in range(0, len(self.data), 4 * 1024 * 1024):
+            yield self.data[start : start + 4 * 1024 * 1024]
+
+
+class FakeShareFileClient:
+    """ShareFileClient 替身, 檔案存在記憶體的 FILES
+
+    Attributes:
+        FILES: (share, 路徑) 與檔案內容
+        ETAGS: (share, 路徑) 與 ETag, 每次寫入都會改變
+        CONTENT_MD5: (share, 路徑) 與建立檔案時設定的 Content-MD5
+    """
+
+    FILES: Dict[Tuple[str, str], bytearray] = {}
+    ETAGS: Dict[Tuple[str, str], str] = {}
+    CONTENT_MD5: Dict[Tuple[str, str], bytearray] = {}
+    _versions = itertools.count(1)
+
+    def __init__(self, share_name: str, file_path: str) -> None:
+        """Init.
+
+        Args:
+            share_name (str): file share 名稱
+            file_path (str): 檔案路徑
+        """
+        self.share_name = share_name
+        self.file_path = file_path
+
+    def _modified(self) -> None:
+        """寫入後更新 ETag"""
+        self.ETAGS[(self.share_name, self.file_path)] = f'"0x{next(self._versions):x}"'
+
+    @classmethod
+    def from_connection_string(
+        cls, conn_str: str, share_name: str, file_path: str, **kwargs: Any
+    ) -> "FakeShareFileClient":
+        """建立 client
+
+        Args:
+            conn_str (str): 連線字串
+            share_name (str): file share 名稱
+            file_path (str): 檔案路徑
+            kwargs (Any): client 選項
+
+        Returns:
+            FakeShareFileClient: client
+        """
+        return cls(share_name, file_path)
+
+    def upload_file(self, data: Any, **kwargs: Any) -> dict:
+        """上傳檔案
+
+        Args:
+            data (Any): bytes 或可讀取的 stream
+            kwargs (Any): 上傳選項
+
+        Returns:
+            dict: 上傳結果
+        """
+        self.FILES[(self.share_name, self.file_path)] = bytearray(data if isinstance(data, bytes) else data.read())
+        self.CONTENT_MD5.pop((self.share_name, self.file_path), None)
+        self._modified()
+        return {}
+
+    def create_file(self, size: int, **kwargs: Any) -> dict:
+        """建立指定大小的空檔案
+
+        Args:
+            size (int): bytes
+            kwargs (Any): 建立選項
+
+        Returns:
+            dict: 建立結果
+        """
+        key = (self.share_name, self.file_path)
+        self.FILES[key] = bytearray(size)
+        content_md5 = getattr(kwargs.get("content_settings"), "content_md5", None)
+        if content_md5 is None:
+            self.CONTENT_MD5.pop(key, None)
+        else:
+            self.CONTENT_MD5[key] = content_md5
+        self._modified()
+        return {}
+
+    def resize_file(self, size: int, **kwargs: Any) -> dict:
+        """調整檔案大小
+
+        Args:
+            size (int): bytes
+            kwargs (Any): 選項
+
+        Returns:
+            dict: 結果
+        """
+        data = self.FILES[(self.share_name, self.file_path)]
+        if size > len(data):
+            data.extend(bytes(size - len(data)))
+        else:
+            del data[size:]
+        self._modified()
+        return {}
+
+    def upload_range(self, data: bytes, offset: int, length: int, **kwargs: Any) -> dict:
+        """寫入一段
+
+        Args:
+            data (bytes): 內容
+            offset (int): 起始位置
+            length (int): bytes
+            kwargs (Any): 選項
+
+        Returns:
+            dict: 結果
+        """
+        self.FILES[(self.share_name, self.file_path)][offset : offset + length] = data[:length]
+        self._modified()
+        return {}
+
+    def delete_file(self, **kwargs: Any) -> None:
+        """刪除檔案
+
+        Args:
+            kwargs (Any): 選項
+
+        Raises:
+            ResourceNotFoundError: 檔案不存在
+        """
+        key = (self.share_name, self.file_path)
+        if self.FILES.pop(key, None) is None:
+            raise ResourceNotFoundError("The specified resource does not exist.")
+        self.ETAGS.pop(key, None)
+        self.CONTENT_MD5.pop(key, None)
+
+    def get_file_properties(self, **kwargs: Any) -> types.SimpleNamespace:
+        """取得檔案屬性
+
+        Args:
+            kwargs (Any): 選項
+
+        Raises:
+            ResourceNotFoundError: 檔案不存在
+
+        Returns:
+            types.SimpleNamespace: 含 size, etag 與 content_settings 的屬性
+        """
+        key = (self.share_name, self.file_path)
+        if key not in self.FILES:
+            raise ResourceNotFoundError("The specified resource does not exist.")
+        return types.SimpleNamespace(
+            size=len(self.FILES[key]),
+            etag=self.ETAGS.get(key),
+            content_settings=types.SimpleNamespace(content_md5=self.CONTENT_MD5.get(key)),
+        )
+
+    def download_file(
+        self, offset: Optional[int] = None, length: Optional[int] = None, **kwargs: Any
+    ) -> FakeDownloader:
+        """下載檔案
+
+        Args:
+            offset (Optional[int], optional): 起始位置. Defaults to None.
+            length (Optional[int], optional): 長度. Defaults to None.
+            kwargs (Any): 下載選項
+
+        Raises:
+            error: 指定的範圍超出檔案 (416 InvalidRange), 例如空檔案
+
+        Returns:
+            FakeDownloader: 下載內容
+        """
+        key = (self.share_name, self.file_path)
+        data = self.FILES[key]
+        start = offset or 0
+        if offset is not None and start >= len(data):
+            error = HttpResponseError("The range specified is invalid for the current size of the resource.")
+            error.status_code = 416
+            raise error
+        content = bytes(data[start : start + length] if length is not None else data[start:])
+        return FakeDownloader(content, start, len(data), self.ETAGS.get(key))
+
+    def close(self) -> None:
+        """關閉 client"""
+
+
+class FakeShareServiceClient:
+    """ShareServiceClient 替身"""
+
+    @classmethod
+    def from_connection_string(cls, conn_str: str, **kwargs: Any) -> "FakeShareServiceClient":
+        """建立 client
+
+        Args:
+            conn_str (str): 連線字串
+            kwargs (Any): client 選項
+
+        Returns:
+            FakeShareServiceClient: client
+        """
+        return cls()
+
+    def get_share_client(self, share: str) -> "FakeShareClient":
+        """取得 file share client
+
+        Args:
+            share (str): file share 名稱
+
+        Returns:
+            FakeShareClient: client
+        """
+        return FakeShareClient(share)
+
+    def close(self) -> None:
+        """關閉 client"""
+
+
+class FakeShareClient:
+    """ShareClient 替身"""
+
+    def __init__(self, share_name: str) -> None:
+        """Init.
+
+        Args:
+            share_name (str): file share 名稱
+        """
+        self.share_name = share_name
+
+    def get_directory_client(self, directory_path: Optional[str] = None) -> "FakeShareDirectoryClient":
+        """取得目錄 client
+
+        Args:
+            directory_path (Optional[str], optional): 目錄路徑. Defaults to None.
+
+        Returns:
+            FakeShareDirectoryClient: client
+        """
+        return FakeShareDirectoryClient(self.share_name, directory_path or "")
+
+    def get_file_client(self, file_path: str) -> FakeShareFileClient:
+        """取得檔案 client
+
+        Args:
+            file_path (str): 檔案路徑
+
+        Returns:
+            FakeShareFileClient: client
+        """
+        return FakeShareFileClient(self.share_name, file_path)
+
+
+class FakeShareDirectoryClient:
+    """ShareDirectoryClient 替身
+
+    Attributes:
+        DIRECTORIES: 已建立的 (share, 路徑)
+    """
+
+    DIRECTORIES: Set[Tuple[str, str]] = set()
+
+    def __init__(self, share_name: str, directory_path: str) -> None:
+        """Init.
+
+        Args:
+            share_name (str): file share 名稱
+            directory_path (str): 目錄路徑
+        """
+        self.share_name = share_name
+        self.directory_path = directory_path
+
+    def get_file_client(self, file_name: str) -> FakeShareFileClient:
+        """取得檔案 client
+
+        Args:
+            file_name (str): 檔案名稱
+
+        Returns:
+            FakeShareFileClient: client
+        """
+        path = f"{self.directory_path}/{file_name}" if self.directory_path else file_name
+        return FakeShareFileClient(self.share_name, path)
+
+    def create_directory(self, **kwargs: Any) -> dict:
+        """建立目錄
+
+        Args:
+            kwargs (Any): 選項
+
+        Raises:
+            ResourceExistsError: 目錄已存在
+
+        Returns:
+            dict: 結果
+        """
+        key = (self.share_name, self.directory_path)
+        if key in self.DIRECTORIES:
+            raise ResourceExistsError("The specified resource already exists.")
+        self.DIRECTORIES.add(key)
+        return {}
+
+    def list_directories_and_files(self, **kwargs: Any) -> Iterator[types.SimpleNamespace]:
+        """列出目錄下一層的目錄與檔案
+
+        Args:
+            kwargs (Any): 選項
+
+        Yields:
+            types.SimpleNamespace: 含 name, is_directory 與 size 的項目
+        """
+        prefix = f"{self.directory_path}/" if self.directory_path else ""
+        directories = set()
+        for share_name, path in list(FakeShareDirectoryClient.DIRECTORIES) + list(FakeShareFileClient.FILES):
+            if share_name == self.share_name and path.startswith(prefix) and path != self.directory_path:
+                name, _, rest = path[len(prefix) :].partition("/")
+                if rest or (share_name, path) in FakeShareDirectoryClient.DIRECTORIES:
+                    directories.add(name)
+        for name in sorted(directories):
+            yield types.SimpleNamespace(name=name, is_directory=True, size=0)
+        for (share_name, path), data in list(FakeShareFileClient.FILES.items()):
+            if share_name == self.share_name and path.startswith(prefix) and "/" not in path[len(prefix) :]:
+                yield types.SimpleNamespace(name=path[len(prefix) :], is_directory=False, size=len(data))
+
+
+class FakeAsyncDownloader(FakeDownloader):
+    """aio StorageStreamDownloader 替身"""
+
+    async def readall(self) -> bytes:  # type: ignore[override]
+        """讀取全部內容
+
+        Returns:
+            bytes: 檔案內容
+        """
+        return self.data
+
+
+class FakeAsyncShareFileClient(FakeShareFileClient):
+    """aio ShareFileClient 替身, 與 FakeShareFileClient 共用 FILES"""
+
+    async def create_file(self, size: int, **kwargs: Any) -> dict:  # type: ignore[override]
+        """建立指定大小的空檔案
+
+        Args:
+            size (int): bytes
+            kwargs (Any): 建立選項
+
+        Returns:
+            dict: 建立結果
+        """
+        return super().create_file(size, **kwargs)
+
+    async def resize_file(self, size: int, **kwargs: Any) -> dict:  # type: ignore[override]
+        """調整檔案大小
+
+        Args:
+            size (int): bytes
+            kwargs (Any): 選項
+
+        Returns:
+            dict: 結果
+        """
+        return super().resize_file(size, **kwargs)
+
+    async def upload_range(  # type: ignore[override]
+        self, data: bytes, offset: int, length: int, **kwargs: Any
+    ) -> dict:
+        """寫入一段
+
+        Args:
+            data (bytes): 內容
+            offset (int): 起始位置
+            length (int): bytes
+            kwargs (Any): 選項
+
+        Returns:
+            dict: 結果
+        """
+        return super().upload_range(data, offset, length, **kwargs)
+
+    async def delete_file(self, **kwargs: Any) -> None:  # type: ignore[override]
+        """刪除檔案
+
+        Args:
+            kwargs (Any): 選項
+        """
+        super().delete_file(**kwargs)
+
+    async def get_file_properties(self, **kwargs: Any) -> types.SimpleNamespace:  # type: ignore[override]
+        """取得檔案屬性
+
+        Args:
+            kwargs (Any): 選項
+
+        Returns:
+            types.SimpleNamespace: 含 size, etag 與 content_settings 的屬性
+        """
+        return super().get_file_properties(**kwargs)
+
+    async def download_file(  # type: ignore[override]
+        self, offset: Optional[int] = None, length: Optional[int] = None, **kwargs: Any
+    ) -> FakeAsyncDownloader:
+        """下載檔案
+
+        Args:
+            offset (Optional[int], optional): 起始位置. Defaults to None.
+            length (Optional[int], optional): 長度. Defaults to None.
+            kwargs (Any): 下載選項
+
+        Returns:
+            FakeAsyncDownloader: 下載內容
+        """
+        downloader = super().download_file(offset, length, **kwargs)
+        result = FakeAsyncDownloader(downloader.data)
+        result.properties = downloader.properties
+        return result
+
+    async def close(self) -> None:  # type: ignore[override]
+        """關閉 client"""
+
+
+class FakeAsyncShareServiceClient(FakeShareServiceClient):
+    """aio ShareServiceClient 替身"""
+
+    def get_share_client(self, share: str) -> "FakeAsyncShareClient":
+        """取得 file share client
+
+        Args:
+            share (str): file share 名稱
+
+        Returns:
+            FakeAsyncShareClient: client
+        """
+        return FakeAsyncShareClient(share)
+
+    async def close(self) -> None:  # type: ignore[override]
+        """關閉 client"""
+
+
+class FakeAsyncShareClient(FakeShareClient):
+    """aio ShareClient 替身"""
+
+    def get_directory_client(self, directory_path: Optional[str] = None) -> "FakeAsyncShareDirectoryClient":
+        """取得目錄 client
+
+        Args:
+            directory_path (Optional[str], optional): 目錄路徑. Defaults to None.
+
+        Returns:
+            FakeAsyncShareDirectoryClient: client
+        """
+        return FakeAsyncShareDirectoryClient(self.share_name, directory_path or "")
+
+    def get_file_client(self, file_path: str) -> FakeAsyncShareFileClient:
+        """取得檔案 client
+
+        Args:
+            file_path (str): 檔案路徑
+
+        Returns:
+            FakeAsyncShareFileClient: client
+        """
+        return FakeAsyncShareFileClient(self.share_name, file_path)
+
+
+class FakeAsyncShareDirectoryClient(FakeShareDirectoryClient):
+    """aio ShareDirectoryClient 替身"""
+
+    def get_file_client(self, file_name: str) -> FakeAsyncShareFileClient:
+        """取得檔案 client
+
+        Args:
+            file_name (str): 檔案名稱
+
+        Returns:
+            FakeAsyncShareFileClient: client
+        """
+        path = f"{self.directory_path}/{file_name}" if self.directory_path else file_name
+        return FakeAsyncShareFileClient(self.share_name, path)
+
+
+def install() -> None:
+    """以替身取代 pyodbc 與 azure.storage.fileshare (含 aio), 並套用測試用的設定"""
+    for key, value in BENCHMARK_ENV.items():
+        os.environ[key] = value
+
+    pyodbc = types.ModuleType("pyodbc")
+    pyodbc.Error = FakeError  # type: ignore[attr-defined]
+    pyodbc.Connection = FakeConnection  # type: ignore[attr-defined]
+    pyodbc.Cursor = FakeCursor  # type: ignore[attr-defined]
+    pyodbc.connect = FakeConnection  # type: ignore[attr-defined]
+    sys.modules["pyodbc"] = pyodbc
+
+    fileshare = types.ModuleType("azure.storage.fileshare")
+    fileshare.ShareServiceClient = FakeShareServiceClient  # type: ignore[attr-defined]
+    fileshare.ShareClient = FakeShareClient  # type: ignore[attr-defined]
+    fileshare.ShareDirectoryClient = FakeShareDirectoryClient  # type: ignore[attr-defined]
+    fileshare.ShareFileClient = FakeShareFileClient  # type: ignore[attr-defined]
+    fileshare.ContentSettings = types.SimpleNamespace  # type: ignore[attr-defined]
+    sys.modules["azure.storage.fileshare"] = fileshare
+
+    fileshare_aio = types.ModuleType("azure.storage.fileshare.aio")
+    fileshare_aio.ShareServiceClient = FakeAsyncShareServiceClient  # type: ignore[attr-defined]
+    fileshare_aio.ShareClient = FakeAsyncShareClient  # type: ignore[attr-defined]
+    fileshare_aio.ShareDirectoryClient = FakeAsyncShareDirectoryClient  # type: ignore[attr-defined]
+    fileshare_aio.ShareFileClient = FakeAsyncShareFileClient  # type: ignore[attr-defined]
+    fileshare.aio = fileshare_aio  # type: ignore[attr-defined]
+    sys.modules["azure.storage.fileshare.aio"] = fileshare_aio
@@ -0,0 +1,239 @@
+"""Request 熱路徑的 benchmark 項目.
+
+build_cases() 需在 fakes.install() 之後呼叫, 所有 DB / AFS 呼叫都由替身處理.
+"""
+
+import logging
+import os
+from functools import partial
+from typing import Any, Awaitable, Callable, List
+import httpx
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.types import ASGIApp
+from app.benchmark.fakes import FakeConnection, ResultSet, synthetic_rows
+from app.benchmark.runner import Case
+
+
+def cursor_factory(result_set: ResultSet) -> Callable[[], Any]:
+    """每次呼叫建立一個已執行完成、含指定結果集的 cursor
+
+    Args:
+        result_set (ResultSet): 結果集
+
+    Returns:
+        Callable[[], Any]: 建立 cursor 的函式
+    """
+    connection = FakeConnection()
+    connection.results = lambda sql, params: iter([result_set])  # type: ignore[assignment,method-assign]
+    return lambda: connection.cursor().execute("EXEC [dbo].[SP_BENCHMARK]")
+
+
+def _call_with_cursor(fetch: Callable[[Any], Any], make_cursor: Callable[[], Any]) -> Any:
+    """以新的 cursor 呼叫 fetch 函式
+
+    Args:
+        fetch (Callable[[Any], Any]): StoredProcedureHandler 的 fetch 函式
+        make_cursor (Callable[[], Any]): 建立 cursor 的函式
+
+    Returns:
+        Any: fetch 的結果
+    """
+    return fetch(make_cursor())
+
+
+def asgi_get(app: ASGIApp, path: str, **kwargs: Any) -> Callable[[], Awaitable[httpx.Response]]:
+    """透過 in-process ASGI client 送出 GET
+
+    Args:
+        app (ASGIApp): ASGI app
+        path (str): 路徑
+        kwargs (Any): httpx 的 request 參數
+
+    Returns:
+        Callable[[], Awaitable[httpx.Response]]: 送出 request 的 coroutine function
+    """
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark")
+    return lambda: client.get(path, **kwargs)
+
+
+def asgi_post(app: ASGIApp, path: str, **kwargs: Any) -> Callable[[], Awaitable[httpx.Response]]:
+    """透過 in-process ASGI client 送出 POST
+
+    Args:
+        app (ASGIApp): ASGI app
+        path (str): 路徑
+        kwargs (Any): httpx 的 request 參數
+
+    Returns:
+        Callable[[], Awaitable[httpx.Response]]: 送出 request 的 coroutine function
+    """
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark")
+    return lambda: client.post(path, **kwargs)
+
+
+def debug_logging() -> Callable[[], None]:
+    """讓 app logger 以 JSON 格式輸出 DEBUG 到 os.devnull, 測量 APILog 實際寫 log 的成本
+
+    Returns:
+        Callable[[], None]: 還原設定的函式
+    """
+    from app import log
+    from app.logic.core.logging import JSONFormatter
+
+    handler = logging.StreamHandler(open(os.devnull, "w"))
+    handler.setFormatter(JSONFormatter())
+    level, propagate = log.level, log.propagate
+    log.addHandler(handler)
+    log.setLevel(logging.DEBUG)
+    log.propagate = False
+
+    def restore() -> None:
+        """還原 logger 設定"""
+        log.removeHandler(handler)
+        handler.close()
+        log.setLevel(level)
+        log.propagate = propagate
+
+    return restore
+
+
+def build_cases() -> List[Case]:  # noqa: CFQ001
+    """建立所有 benchmark 項目
+
+    Returns:
+        List[Case]: benchmark 項目
+    """
+    import main
+    from app.logic.core.afs_manager import get_afs_manager
+    from app.logic.core.logging import APILog
+    from app.logic.core.metrics import MetricsMiddleware
+    from app.logic.utilities.jwt_handler import JWTHandler
+    from app.logic.utilities.stored_procedure_handler import StoredProcedureHandler, build_sql_template
+    from app.schema.auth import PayloadDataSchema
+    from app.schema.base_response import BaseSPAPIResponse, BaseSPResponse
+
+    cases: List[Case] = []
+
+    # Stored procedure
+    handler = StoredProcedureHandler(FakeConnection())
+    input_params = {"DRIVERID": "T123", "CAR_NO": "ABC-1234", "DATE": "2024-01-01"}
+    output_params = {"O_MSG": "", "O_CODE": ""}
+    cases.append(Case("sp.build_sql", lambda: handler.build_sql("SP_FAKE1", input_params, output_params), 100_000))
+    cases.append(
+        Case(
+            "sp.build_sql_template.uncached",
+            lambda: build_sql_template.__wrapped__("SP_FAKE1", tuple(input_params), tuple(output_params)),
+            20_000,
+        )
+    )
+    for row_count in (100, 1000):
+        make_cursor = cursor_factory(synthetic_rows(row_count))
+        cases.append(
+            Case(
+                f"sp.fetchall_as_dict[{row_count}]",
+                partial(_call_with_cursor, handler.fetchall_as_dict, make_cursor),
+                100_000 // row_count,
+            )
+        )
+        cases.append(
+            Case(
+                f"sp.fetchall_as_columns[{row_count}]",
+                partial(_call_with_cursor, handler.fetchall_as_columns, make_cursor),
+                100_000 // row_count,
+            )
+        )
+    cases.append(Case("sp.execute", lambda: handler.execute("SP_FAKE1", input_params), 5_000))
+
+    # Pydantic schema
+    result = BaseSPResponse(result_set=handler.fetchall_as_dict(cursor_factory(synthetic_rows(100))()))
+    cases.append(Case("schema.sp_response.model_dump_json[100]", result.model_dump_json, 2_000))
+    cases.append(
+        Case(
+            "schema.sp_api_response.dump_json[100]",
+            lambda: BaseSPAPIResponse.from_sp_response(result).dump_json(),
+            2_000,
+        )
+    )
+
+    # JWT
+    jwt = JWTHandler()
+    data = PayloadDataSchema(
+        token_time="2024-01-01 00:00:00",
+        user_info={"user_name": "benchmark"},
+        token_expire_minutes=jwt.expire_minutes,
+        re_token_expire_minutes=jwt.re_expire_minutes,
+    )
+    claims = data.model_dump()
+    access_token = jwt.create_token(claims)
+    refresh_token = jwt.create_token(claims, is_access_token=False)
+    cases.append(Case("jwt.create_token", lambda: jwt.create_token(claims), 5_000))
+    verify = partial(jwt.verify_token, None, access_token)  # type: ignore[arg-type]
+    cases.append(Case("jwt.verify_token", verify, 20_000))
+    cases.append(Case("jwt.decode_access_token", lambda: jwt.decode_access_token(access_token), 5_000))
+    cases.append(Case("jwt.refresh_token", lambda: jwt.refresh_token(refresh_token), 2_000))
+
+    # AFS
+    afs = get_afs_manager()
+    content = os.urandom(1024 * 1024)
+    afs.upload_file(content, "benchmark/download.bin")
+    cases.append(Case("afs.upload_file[1MB]", lambda: afs.upload_file(content, "benchmark/upload.bin"), 200))
+    cases.append(Case("afs.download_file[1MB]", lambda: afs.download_file("benchmark/download.bin"), 200))
+
+    # API endpoints (in-process ASGI)
+    login_form = {"username": "benchmark", "password": "JCTech"}
+    cases.append(Case("api.root", asgi_get(main.app, "/"), 1_000, True))
+    cases.append(Case("api.login", asgi_post(main.app, "/api/login", data=login_form), 500, True))
+    cases.append(
+        Case(
+            "api.refresh_token",
+            asgi_post(main.app, "/api/refresh_token", headers={"Authorization": f"Bearer {refresh_token}"}),
+            500,
+            True,
+        )
+    )
+    cases.append(
+        Case(
+            "api.say_my_name",
+            asgi_get(main.app, "/api/say_my_name", headers={"Authorization": f"Bearer {access_token}"}),
+            1_000,
+            True,
+        )
+    )
+
+    # Middleware overhead, 與沒有 middleware 的相同 app 比較
+    async def hello(request: Request) -> PlainTextResponse:
+        """回傳固定內容
+
+        Args:
+            request (Request): Request
+
+        Returns:
+            PlainTextResponse: 固定內容
+        """
+        return PlainTextResponse("hello")
+
+    routes = [Route("/api/hello", hello)]
+    bare = Starlette(routes=routes)
+    api_log = Starlette(routes=routes)
+    api_log.add_middleware(APILog)
+    metrics = Starlette(routes=routes)
+    metrics.add_middleware(MetricsMiddleware)
+    restore_logging: List[Callable[[], None]] = []
+
+    cases.append(Case("middleware.none", asgi_get(bare, "/api/hello"), 2_000, True))
+    cases.append(Case("middleware.api_log", asgi_get(api_log, "/api/hello"), 2_000, True))
+    cases.append(
+        Case(
+            "middleware.api_log.debug",
+            asgi_get(api_log, "/api/hello"),
+            2_000,
+            True,
+            setup=lambda: restore_logging.append(debug_logging()),
+            teardown=lambda: restore_logging.pop()(),
+        )
+    )
+    cases.append(Case("middleware.metrics", asgi_get(metrics, "/api/hello"), 2_000, True))
+    return cases
@@ -0,0 +1,117 @@
+"""JWT 簽章演算法的 micro-benchmark.
+
+比較 HS256 / RS256 / ES256 簽章與驗證的成本, 以及每次重新解析金鑰與使用已解析金鑰的差異.
+不需要 .env, 金鑰在執行時產生.
+
+    python -m app.benchmark.jwt_signing [--number 2000]
+"""
+
+import argparse
+import secrets
+import time
+import timeit
+from typing import Any, Callable, Dict, List
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from jose import jwk, jwt
+
+CLAIMS = {
+    "token_time": "2024-01-01 00:00:00",
+    "user_info": {"user_name": "benchmark"},
+    "token_expire_minutes": 15,
+    "re_token_expire_minutes": 60,
+}
+
+
+def generate_keys() -> Dict[str, Any]:
+    """產生各演算法的金鑰
+
+    Returns:
+        Dict[str, Any]: 演算法與 (簽章金鑰, 驗證金鑰) 的原始格式 (secret 或 PEM)
+    """
+    rsa_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    ec_key = ec.generate_private_key(ec.SECP256R1())
+    secret = secrets.token_hex(32)
+
+    def pem_pair(private_key: Any) -> tuple:
+        """轉成 PEM
+
+        Args:
+            private_key (Any): cryptography 私鑰
+
+        Returns:
+            tuple: (私鑰 PEM, 公鑰 PEM)
+        """
+        private_pem = private_key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        )
+        public_pem = private_key.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+        return private_pem, public_pem
+
+    return {"HS256": (secret, secret), "RS256": pem_pair(rsa_key), "ES256": pem_pair(ec_key)}
+
+
+def measure(func: Callable[[], Any], number: int) -> float:
+    """每次呼叫的平均微秒數, 取 3 輪中最快的一輪
+
+    Args:
+        func (Callable[[], Any]): 要測量的函式
+        number (int): 每輪呼叫次數
+
+    Returns:
+        float: 微秒
+    """
+    return min(timeit.repeat(func, number=number, repeat=3)) / number * 1_000_000
+
+
+def run(number: int) -> List[dict]:
+    """執行 benchmark
+
+    Args:
+        number (int): 每輪呼叫次數
+
+    Returns:
+        List[dict]: 各演算法的結果 (微秒)
+    """
+    results = []
+    claims = {**CLAIMS, "exp": int(time.time()) + 900}
+    for algorithm, (raw_private, raw_public) in generate_keys().items():
+        private_key = jwk.construct(raw_private, algorithm)
+        public_key = private_key if algorithm.startswith("HS") else jwk.construct(raw_public, algorithm)
+        token = jwt.encode(claims, private_key, algorithm=algorithm, headers={"kid": algorithm})
+
+        results.append(
+            {
+                "algorithm": algorithm,
+                "token_bytes": len(token),
+                "sign_us": measure(lambda: jwt.encode(claims, private_key, algorithm=algorithm), number),
+                "verify_us": measure(lambda: jwt.decode(token, public_key, algorithms=[algorithm]), number),
+                "sign_parse_key_us": measure(lambda: jwt.encode(claims, raw_private, algorithm=algorithm), number),
+                "verify_parse_key_us": measure(lambda: jwt.decode(token, raw_public, algorithms=[algorithm]), number),
+            }
+        )
+    return results
+
+
+def main() -> None:
+    """印出結果"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=2000, help="每輪呼叫次數")
+    args = parser.parse_args()
+
+    header = f"{'algorithm':<10}{'bytes':>7}{'sign':>12}{'verify':>12}{'sign*':>12}{'verify*':>12}"
+    print(header)
+    print("-" * len(header))
+    for result in run(args.number):
+        print(
+            f"{result['algorithm']:<10}{result['token_bytes']:>7}"
+            f"{result['sign_us']:>10.1f}us{result['verify_us']:>10.1f}us"
+            f"{result['sign_parse_key_us']:>10.1f}us{result['verify_parse_key_us']:>10.1f}us"
+        )
+    print("* 每次呼叫重新解析金鑰")
+
+
+if __name__ == "__main__":
+    main()
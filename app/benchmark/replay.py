@@ -0,0 +1,466 @@
+"""重播 APILog 記錄的 request (JSONL), 產生接近正式環境的流量.
+
+記錄檔由 APILog 寫入 (logging_config.json 的 api_capture logger 設為 INFO, 預設為 logs/traffic.jsonl),
+每行一個 request: {"method", "path", "query", "route", "headers", "auth", "body", ...}.
+auth 為 true 的 request 會帶上透過 /api/login 取得的 JWT, 收到 401 時重新登入.
+
+    # in-process, DB 與 AFS 使用替身
+    python -m app.benchmark.replay logs/traffic.jsonl --concurrency 20 --duration 30
+    # 對執行中的服務, 固定每秒 200 個 request, 並記錄 worker 的 RSS
+    python -m app.benchmark.replay logs/traffic.jsonl --target http://127.0.0.1:8000 --rate 200 --pid 1234
+"""
+
+import argparse
+import asyncio
+import base64
+import itertools
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, Iterator, List, NamedTuple, Optional
+from urllib.parse import urlencode
+import httpx
+import orjson
+
+
+class TrafficRecord(NamedTuple):
+    """一筆重播的 request
+
+    Attributes:
+        method: HTTP method
+        path: 路徑
+        query: query string
+        route: 路由, 統計時以此分組
+        headers: request headers (不含 Authorization / Cookie)
+        body: request body
+        auth: 是否需要 JWT
+    """
+
+    method: str
+    path: str
+    query: str
+    route: str
+    headers: Dict[str, str]
+    body: Optional[bytes]
+    auth: bool
+
+
+def load_records(path: str) -> List[TrafficRecord]:
+    """讀取 APILog 寫入的 JSONL
+
+    Args:
+        path (str): JSONL 檔路徑
+
+    Raises:
+        ValueError: 檔案中沒有任何 request
+
+    Returns:
+        List[TrafficRecord]: request 記錄
+    """
+    records = []
+    with open(path, "rb") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            entry = orjson.loads(line)
+            body = entry.get("body")
+            if body is not None:
+                body = base64.b64decode(body) if entry.get("body_encoding") == "base64" else body.encode()
+            records.append(
+                TrafficRecord(
+                    method=entry["method"],
+                    path=entry["path"],
+                    query=entry.get("query", ""),
+                    route=f"{entry['method']} {entry.get('route') or entry['path']}",
+                    headers=entry.get("headers", {}),
+                    body=body,
+                    auth=entry.get("auth", False),
+                )
+            )
+    if not records:
+        raise ValueError(f"No requests in {path}")
+    return records
+
+
+class TokenProvider:
+    """透過 /api/login 取得 access token, 過期前或收到 401 時重新登入
+
+    Attributes:
+        login_path: 登入路徑
+        credentials: 登入表單
+        max_age: token 使用的最長秒數
+    """
+
+    def __init__(self, login_path: str, credentials: Dict[str, str], max_age: float) -> None:
+        """Init.
+
+        Args:
+            login_path (str): 登入路徑
+            credentials (Dict[str, str]): 登入表單, 例如 {"username": ..., "password": ...}
+            max_age (float): token 使用的最長秒數
+        """
+        self.login_path = login_path
+        self.credentials = credentials
+        self.max_age = max_age
+        self.logins = 0
+        self._token: Optional[str] = None
+        self._issued_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def get(self, client: httpx.AsyncClient, stale: Optional[str] = None) -> str:
+        """取得 token, 所有 worker 共用, 同時只會有一個登入
+
+        Args:
+            client (httpx.AsyncClient): HTTP client
+            stale (Optional[str], optional): 收到 401 的 token, 與目前的相同時重新登入. Defaults to None.
+
+        Returns:
+            str: access token
+        """
+        async with self._lock:
+            expired = time.monotonic() - self._issued_at > self.max_age
+            if self._token is None or expired or self._token == stale:
+                response = await client.post(self.login_path, data=self.credentials)
+                response.raise_for_status()
+                self._token = response.json()["access_token"]
+                self._issued_at = time.monotonic()
+                self.logins += 1
+            return self._token  # type: ignore[return-value]
+
+
+class RouteStats:
+    """單一路由的統計
+
+    Attributes:
+        latencies: 每個 request 的秒數
+        statuses: 狀態碼與次數
+        failures: 連線錯誤等沒有回應的次數
+    """
+
+    def __init__(self) -> None:
+        """Init."""
+        self.latencies: List[float] = []
+        self.statuses: Dict[int, int] = defaultdict(int)
+        self.failures = 0
+
+    def summary(self, elapsed: float) -> dict:
+        """統計結果
+
+        Args:
+            elapsed (float): 重播總秒數
+
+        Returns:
+            dict: 次數, 每秒次數, 錯誤率與延遲百分位數 (毫秒)
+        """
+        count = len(self.latencies) + self.failures
+        server_errors = sum(count for status, count in self.statuses.items() if status >= 500) + self.failures
+        client_errors = sum(count for status, count in self.statuses.items() if 400 <= status < 500)
+        latencies = sorted(self.latencies)
+        return {
+            "requests": count,
+            "throughput": count / elapsed if elapsed else 0.0,
+            "error_rate": server_errors / count if count else 0.0,
+            "client_error_rate": client_errors / count if count else 0.0,
+            "statuses": {str(status): count for status, count in sorted(self.statuses.items())},
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+        }
+
+
+def percentile(sorted_values: List[float], percent: float) -> float:
+    """Nearest-rank 百分位數
+
+    Args:
+        sorted_values (List[float]): 已排序的值
+        percent (float): 百分位 (0~100)
+
+    Returns:
+        float: 百分位數, 沒有值時為 0
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(len(sorted_values) * percent / 100 + 0.999999))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def read_rss(pid: int) -> Optional[int]:
+    """讀取 process 的 RSS (Linux /proc)
+
+    Args:
+        pid (int): process ID
+
+    Returns:
+        Optional[int]: RSS bytes, 無法讀取時為 None
+    """
+    try:
+        with open(f"/proc/{pid}/status", "rb") as file:
+            for line in file:
+                if line.startswith(b"VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+async def sample_rss(pids: List[int], interval: float, timeline: List[dict], started_at: float) -> None:
+    """定期記錄各 worker 的 RSS, 直到被取消
+
+    Args:
+        pids (List[int]): worker 的 process ID
+        interval (float): 記錄間隔秒數
+        timeline (List[dict]): 記錄寫入的 list
+        started_at (float): 重播開始時間 (monotonic)
+    """
+    while True:
+        timeline.append(
+            {
+                "elapsed": round(time.monotonic() - started_at, 3),
+                "rss_mb": {str(pid): round((read_rss(pid) or 0) / 1024 / 1024, 1) for pid in pids},
+            }
+        )
+        await asyncio.sleep(interval)
+
+
+class Replayer:
+    """依固定速率 (open loop) 或固定並行數 (closed loop) 重播 request
+
+    Attributes:
+        stats: 各路由的統計
+    """
+
+    def __init__(
+        self, client: httpx.AsyncClient, records: List[TrafficRecord], tokens: TokenProvider, timeout: float
+    ) -> None:
+        """Init.
+
+        Args:
+            client (httpx.AsyncClient): HTTP client
+            records (List[TrafficRecord]): 要重播的 request, 依序循環使用
+            tokens (TokenProvider): JWT 來源
+            timeout (float): 每個 request 的逾時秒數
+        """
+        self.client = client
+        self.records: Iterator[TrafficRecord] = itertools.cycle(records)
+        self.tokens = tokens
+        self.timeout = timeout
+        self.stats: Dict[str, RouteStats] = defaultdict(RouteStats)
+
+    async def send(self, record: TrafficRecord) -> None:
+        """送出一個 request 並記錄結果
+
+        Args:
+            record (TrafficRecord): request
+        """
+        headers = dict(record.headers)
+        body = record.body
+        if body is None and record.method == "POST" and record.path == self.tokens.login_path:
+            body = urlencode(self.tokens.credentials).encode()
+            headers["content-type"] = "application/x-www-form-urlencoded"
+        url = f"{record.path}?{record.query}" if record.query else record.path
+
+        stats = self.stats[record.route]
+        started_at = time.perf_counter()
+        try:
+            token = None
+            for _ in range(2):
+                if record.auth:
+                    token = await self.tokens.get(self.client, stale=token)
+                    headers["authorization"] = f"Bearer {token}"
+                started_at = time.perf_counter()
+                response = await self.client.request(
+                    record.method, url, headers=headers, content=body, timeout=self.timeout
+                )
+                if response.status_code != 401 or not record.auth:
+                    break
+        except (httpx.HTTPError, OSError):
+            stats.failures += 1
+            return
+        stats.latencies.append(time.perf_counter() - started_at)
+        stats.statuses[response.status_code] += 1
+
+    async def run_concurrency(self, concurrency: int, deadline: float, total: Optional[int]) -> None:
+        """固定並行數: 每個 worker 送完一個再送下一個
+
+        Args:
+            concurrency (int): worker 數
+            deadline (float): 結束時間 (monotonic)
+            total (Optional[int]): 最多送出的 request 數
+        """
+        remaining = itertools.count() if total is None else iter(range(total))
+
+        async def worker() -> None:
+            """持續送出 request 直到時間或數量用完"""
+            while time.monotonic() < deadline and next(remaining, None) is not None:
+                await self.send(next(self.records))
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    async def run_rate(self, rate: float, deadline: float, total: Optional[int], max_in_flight: int) -> None:
+        """固定速率: 依排程送出, 不等待前一個完成, 服務變慢時不會降低送出速率
+
+        Args:
+            rate (float): 每秒 request 數
+            deadline (float): 結束時間 (monotonic)
+            total (Optional[int]): 最多送出的 request 數
+            max_in_flight (int): 同時未完成的 request 上限, 超過時等待
+        """
+        slots = asyncio.Semaphore(max_in_flight)
+        tasks = set()
+        started_at = time.monotonic()
+
+        async def send_and_release(record: TrafficRecord) -> None:
+            """送出 request 後釋放名額
+
+            Args:
+                record (TrafficRecord): request
+            """
+            try:
+                await self.send(record)
+            finally:
+                slots.release()
+
+        for index in itertools.count() if total is None else range(total):
+            scheduled_at = started_at + index / rate
+            if scheduled_at >= deadline:
+                break
+            await asyncio.sleep(max(0.0, scheduled_at - time.monotonic()))
+            await slots.acquire()
+            task = asyncio.create_task(send_and_release(next(self.records)))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+
+
+def build_report(replayer: Replayer, elapsed: float, timeline: List[dict]) -> dict:
+    """組成重播結果
+
+    Args:
+        replayer (Replayer): 重播完成的 Replayer
+        elapsed (float): 重播總秒數
+        timeline (List[dict]): RSS 記錄
+
+    Returns:
+        dict: 整體與各路由的統計, RSS 記錄
+    """
+    overall = RouteStats()
+    for stats in replayer.stats.values():
+        overall.latencies.extend(stats.latencies)
+        overall.failures += stats.failures
+        for status, count in stats.statuses.items():
+            overall.statuses[status] += count
+    return {
+        "elapsed": elapsed,
+        "logins": replayer.tokens.logins,
+        "overall": overall.summary(elapsed),
+        "routes": {route: stats.summary(elapsed) for route, stats in sorted(replayer.stats.items())},
+        "rss": timeline,
+    }
+
+
+def format_report(report: dict) -> str:
+    """組成文字報表
+
+    Args:
+        report (dict): build_report 的結果
+
+    Returns:
+        str: 報表
+    """
+    rows = [("TOTAL", report["overall"])] + list(report["routes"].items())
+    width = max(len(name) for name, _ in rows)
+    lines = [
+        f"{report['elapsed']:.1f}s, {report['overall']['requests']} requests, {report['logins']} logins",
+        f"{'route':<{width}}  {'req/s':>8}  {'p50':>8}  {'p95':>8}  {'p99':>8}  {'5xx':>6}  {'4xx':>6}",
+    ]
+    for name, summary in rows:
+        lines.append(
+            f"{name:<{width}}  {summary['throughput']:>8.1f}  {summary['p50_ms']:>6.1f}ms  {summary['p95_ms']:>6.1f}ms"
+            f"  {summary['p99_ms']:>6.1f}ms  {summary['error_rate']:>6.1%}  {summary['client_error_rate']:>6.1%}"
+        )
+    for sample in report["rss"]:
+        rss = ", ".join(f"{pid}={mb}MB" for pid, mb in sample["rss_mb"].items())
+        lines.append(f"rss @{sample['elapsed']:>7.1f}s  {rss}")
+    return "\n".join(lines)
+
+
+async def replay(args: argparse.Namespace) -> dict:
+    """依參數重播
+
+    Args:
+        args (argparse.Namespace): 命令列參數
+
+    Returns:
+        dict: build_report 的結果
+    """
+    records = load_records(args.file)
+    if args.target:
+        client = httpx.AsyncClient(base_url=args.target, limits=httpx.Limits(max_connections=None))
+        pids = args.pid or []
+    else:
+        from app.benchmark import fakes
+
+        fakes.install()
+        import main
+
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://replay")
+        pids = args.pid or [os.getpid()]
+
+    tokens = TokenProvider(
+        args.login_path, {"username": args.username, "password": args.password}, args.token_max_age
+    )
+    replayer = Replayer(client, records, tokens, args.timeout)
+    timeline: List[dict] = []
+    started_at = time.monotonic()
+    sampler = asyncio.create_task(sample_rss(pids, args.rss_interval, timeline, started_at)) if pids else None
+    deadline = started_at + args.duration
+    try:
+        if args.rate:
+            await replayer.run_rate(args.rate, deadline, args.count, args.max_in_flight)
+        else:
+            await replayer.run_concurrency(args.concurrency, deadline, args.count)
+    finally:
+        elapsed = time.monotonic() - started_at
+        if sampler:
+            sampler.cancel()
+        await client.aclose()
+    return build_report(replayer, elapsed, timeline)
+
+
+def main() -> int:
+    """執行重播並印出結果
+
+    Returns:
+        int: exit code
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("file", help="APILog 寫入的 JSONL")
+    parser.add_argument("--target", help="服務網址, 未指定時在 process 內以替身執行 app")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--rate", type=float, help="固定每秒 request 數 (open loop)")
+    mode.add_argument("--concurrency", type=int, default=10, help="固定並行數 (closed loop)")
+    parser.add_argument("--duration", type=float, default=10.0, help="最長秒數")
+    parser.add_argument("--count", type=int, help="最多送出的 request 數")
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="--rate 時同時未完成的 request 上限")
+    parser.add_argument("--timeout", type=float, default=30.0, help="每個 request 的逾時秒數")
+    parser.add_argument("--login-path", default="/api/login", help="取得 JWT 的路徑")
+    parser.add_argument("--username", default="replay", help="登入帳號")
+    parser.add_argument("--password", default=os.getenv("REPLAY_PASSWORD", ""), help="登入密碼, 預設讀取 REPLAY_PASSWORD")
+    parser.add_argument("--token-max-age", type=float, default=600.0, help="token 使用的最長秒數")
+    parser.add_argument("--pid", type=int, action="append", help="記錄 RSS 的 worker process ID, 可重複指定")
+    parser.add_argument("--rss-interval", type=float, default=1.0, help="記錄 RSS 的間隔秒數")
+    parser.add_argument("--output", help="結果存成 json")
+    args = parser.parse_args()
+
+    report = asyncio.run(replay(args))
+    print(format_report(report))
+    if args.output:
+        with open(args.output, "wb") as file:
+            file.write(orjson.dumps(report, option=orjson.OPT_INDENT_2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
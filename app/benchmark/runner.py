@@ -0,0 +1,213 @@
+"""Benchmark 執行、結果保存與比較."""
+
+import asyncio
+import os
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+import orjson
+
+
+class Case(NamedTuple):
+    """一個 benchmark 項目
+
+    Attributes:
+        name: 名稱, 比較時以名稱對應
+        func: 要測量的函式, is_async 時為 coroutine function
+        number: 每輪呼叫次數
+        is_async: 是否為 coroutine function
+        setup: 測量前呼叫, 例如調整 log level
+        teardown: 測量後呼叫, 還原 setup 的設定
+    """
+
+    name: str
+    func: Callable[[], Any]
+    number: int = 1000
+    is_async: bool = False
+    setup: Optional[Callable[[], Any]] = None
+    teardown: Optional[Callable[[], Any]] = None
+
+
+def _time_sync(case: Case) -> float:
+    """執行一輪同步函式
+
+    Args:
+        case (Case): benchmark 項目
+
+    Returns:
+        float: 這一輪的秒數
+    """
+    func = case.func
+    started_at = time.perf_counter()
+    for _ in range(case.number):
+        func()
+    return time.perf_counter() - started_at
+
+
+async def _time_async(case: Case) -> float:
+    """執行一輪 coroutine function
+
+    Args:
+        case (Case): benchmark 項目
+
+    Returns:
+        float: 這一輪的秒數
+    """
+    func = case.func
+    started_at = time.perf_counter()
+    for _ in range(case.number):
+        await func()
+    return time.perf_counter() - started_at
+
+
+def run_case(case: Case, rounds: int, loop: asyncio.AbstractEventLoop) -> dict:
+    """執行一個 benchmark 項目, 先暖身一輪再測量
+
+    Args:
+        case (Case): benchmark 項目
+        rounds (int): 測量輪數
+        loop (asyncio.AbstractEventLoop): 執行 coroutine function 的 event loop
+
+    Returns:
+        dict: 每次呼叫的微秒數統計
+    """
+    samples = []
+    if case.setup:
+        case.setup()
+    try:
+        for index in range(rounds + 1):
+            elapsed = loop.run_until_complete(_time_async(case)) if case.is_async else _time_sync(case)
+            if index:
+                samples.append(elapsed / case.number * 1_000_000)
+    finally:
+        if case.teardown:
+            case.teardown()
+    return {
+        "number": case.number,
+        "rounds": rounds,
+        "min_us": min(samples),
+        "median_us": statistics.median(samples),
+        "mean_us": statistics.fmean(samples),
+        "stdev_us": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+    }
+
+
+def run(cases: List[Case], rounds: int = 5, only: Optional[str] = None) -> dict:
+    """執行 benchmark
+
+    Args:
+        cases (List[Case]): benchmark 項目
+        rounds (int, optional): 每個項目的測量輪數. Defaults to 5.
+        only (Optional[str], optional): 只執行名稱包含此字串的項目. Defaults to None.
+
+    Returns:
+        dict: {"meta": 執行環境, "results": 各項目的結果}
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        results = {case.name: run_case(case, rounds, loop) for case in cases if not only or only in case.name}
+    finally:
+        loop.close()
+    return {"meta": environment(), "results": results}
+
+
+def environment() -> dict:
+    """執行環境, 比較不同機器的結果時參考
+
+    Returns:
+        dict: 時間, Python 版本, 平台與 git commit
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5, check=False
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "git_commit": commit,
+    }
+
+
+def save(report: dict, path: str) -> None:
+    """保存結果
+
+    Args:
+        report (dict): run 的結果
+        path (str): json 檔路徑
+    """
+    with open(path, "wb") as file:
+        file.write(orjson.dumps(report, option=orjson.OPT_INDENT_2))
+
+
+def load(path: str) -> dict:
+    """讀取保存的結果
+
+    Args:
+        path (str): json 檔路徑
+
+    Returns:
+        dict: run 的結果
+    """
+    with open(path, "rb") as file:
+        return orjson.loads(file.read())
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.1) -> List[dict]:
+    """以中位數比較兩次結果
+
+    Args:
+        baseline (dict): 基準結果
+        current (dict): 本次結果
+        threshold (float, optional): 變慢超過此比例視為退步. Defaults to 0.1.
+
+    Returns:
+        List[dict]: 兩次都有的項目, 含變化比例與是否退步
+    """
+    rows = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        change = result["median_us"] / base["median_us"] - 1 if base["median_us"] else 0.0
+        rows.append(
+            {
+                "name": name,
+                "baseline_us": base["median_us"],
+                "current_us": result["median_us"],
+                "change": change,
+                "regression": change > threshold,
+            }
+        )
+    return rows
+
+
+def format_report(report: dict, comparison: Optional[List[dict]] = None) -> str:
+    """組成文字報表
+
+    Args:
+        report (dict): run 的結果
+        comparison (Optional[List[dict]], optional): compare 的結果. Defaults to None.
+
+    Returns:
+        str: 報表
+    """
+    changes: Dict[str, dict] = {row["name"]: row for row in comparison or []}
+    width = max([len(name) for name in report["results"]] + [4])
+    lines = [f"{'case':<{width}}  {'median':>12}  {'min':>12}  {'stdev':>10}  change"]
+    for name, result in report["results"].items():
+        line = (
+            f"{name:<{width}}  {result['median_us']:>10.2f}us  {result['min_us']:>10.2f}us"
+            f"  {result['stdev_us']:>8.2f}us"
+        )
+        row = changes.get(name)
+        if row:
+            line += f"  {row['change']:+.1%}{'  REGRESSION' if row['regression'] else ''}"
+        lines.append(line)
+    return "\n".join(lines)
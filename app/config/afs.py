@@ -1,11 +1,7 @@
 """取得env之AzureFileStorage連線字串."""
 
-import os
 from enum import Enum
-import dotenv
-
-
-dotenv.load_dotenv()
+from app.config.settings import settings
 
 
 class AFSENV(Enum):
@@ -15,8 +11,36 @@ class AFSENV(Enum):
         CONNECTION_STRING: 預設的 AFS 連線字串
         SHARE_NAME: MongoDB 連線字串
         QR_CODE_SHARE_NAME: QR code share name
+        POOL_CONNECTIONS: 共用 HTTP 連線池快取的 host 數
+        POOL_MAXSIZE: 每個 host 保留 (keep-alive) 的最大連線數, 應不小於同時上傳 / 下載的執行緒數
+        CONNECTION_TIMEOUT: 建立連線的逾時秒數
+        READ_TIMEOUT: 讀取回應的逾時秒數
+        DIRECTORY_CLIENT_CACHE_SIZE: 快取的 directory client 數
+        CHUNK_SIZE: 分段上傳 / 下載每段的 bytes, 上傳最大 4MB (Put Range 上限)
+        MAX_CONCURRENCY: 每個檔案同時傳輸的段數, 記憶體用量約為 CHUNK_SIZE x MAX_CONCURRENCY
+        TRANSFER_THREADS: 所有檔案共用的傳輸執行緒數
+        DISK_CACHE_DIR: download_file 的本機磁碟快取目錄, 空字串為不使用快取
+        DISK_CACHE_MAX_BYTES: 磁碟快取的容量上限
+        DISK_CACHE_REVALIDATE_SECONDS: 快取的檔案超過此秒數後, 使用前先向 AFS 確認 ETag
+        BULK_WORKERS: 批次傳輸時同時傳輸的檔案數
+        BULK_RETRIES: 批次傳輸時每個檔案失敗後最多重試次數 (Azure SDK 的 HTTP 重試之外)
+        BULK_RETRY_BACKOFF: 批次傳輸第一次重試前等待的秒數, 之後每次加倍
     """
 
-    CONNECTION_STRING = os.getenv("AFS_CONNECTION_STRING")
-    SHARE_NAME = os.getenv("AFS_SHARE_NAME")
-    QR_CODE_SHARE_NAME = os.getenv("AFS_QR_CODE_SHARE_NAME", "qr-code")
+    CONNECTION_STRING = settings.get("AFS_CONNECTION_STRING")
+    SHARE_NAME = settings.get("AFS_SHARE_NAME")
+    QR_CODE_SHARE_NAME = settings.get("AFS_QR_CODE_SHARE_NAME", "qr-code")
+    POOL_CONNECTIONS = settings.get_int("AFS_POOL_CONNECTIONS", 10)
+    POOL_MAXSIZE = settings.get_int("AFS_POOL_MAXSIZE", 32)
+    CONNECTION_TIMEOUT = settings.get_float("AFS_CONNECTION_TIMEOUT", 20.0)
+    READ_TIMEOUT = settings.get_float("AFS_READ_TIMEOUT", 300.0)
+    DIRECTORY_CLIENT_CACHE_SIZE = settings.get_int("AFS_DIRECTORY_CLIENT_CACHE_SIZE", 1024)
+    CHUNK_SIZE = settings.get_int("AFS_CHUNK_SIZE", 4 * 1024 * 1024)
+    MAX_CONCURRENCY = settings.get_int("AFS_MAX_CONCURRENCY", 4)
+    TRANSFER_THREADS = settings.get_int("AFS_TRANSFER_THREADS", 16)
+    DISK_CACHE_DIR = settings.get("AFS_DISK_CACHE_DIR", "")
+    DISK_CACHE_MAX_BYTES = settings.get_int("AFS_DISK_CACHE_MAX_BYTES", 1024 * 1024 * 1024)
+    DISK_CACHE_REVALIDATE_SECONDS = settings.get_float("AFS_DISK_CACHE_REVALIDATE_SECONDS", 60.0)
+    BULK_WORKERS = settings.get_int("AFS_BULK_WORKERS", 8)
+    BULK_RETRIES = settings.get_int("AFS_BULK_RETRIES", 2)
+    BULK_RETRY_BACKOFF = settings.get_float("AFS_BULK_RETRY_BACKOFF", 1.0)
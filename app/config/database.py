@@ -1,10 +1,7 @@
 """取得env之DB連線字串."""
 
-import os
 from enum import Enum
-import dotenv
-
-dotenv.load_dotenv()
+from app.config.settings import settings
 
 
 class DBENV(Enum):
@@ -17,12 +14,30 @@ class DBENV(Enum):
         DB_PASSWORD: DB Password
         DB_FIX_DB1: DB1
         DB_FIX_DB2: DB2
+        DB_POOL_MIN_SIZE: 每個DB連線池保留的最少連線數(啟動時預先建立)
+        DB_POOL_MAX_SIZE: 每個DB連線池的最大連線數
+        DB_POOL_TIMEOUT: 連線池已滿時, 等待可用連線的秒數
+        DB_POOL_MAX_LIFETIME: 連線最長存活秒數, 超過後歸還時關閉
+        DB_POOL_IDLE_TIMEOUT: 連線閒置秒數上限, 超過後關閉(仍保留最少連線數)
+        DB_POOL_PING_INTERVAL: 連線閒置超過此秒數, 借出前先以 SELECT 1 檢查連線
+        DB_EXECUTOR_MAX_WORKERS: 每個DB執行 SP 的專用執行緒數(預設同連線池最大連線數)
+        DB_EXECUTOR_MAX_QUEUE: 每個DB可排隊等待執行緒的呼叫數, 超過時呼叫端需等待
+        DB_EXECUTOR_QUEUE_TIMEOUT: 排隊已滿時呼叫端最多等待的秒數, 逾時則拒絕
 
     """
 
-    DB_SERVER = os.getenv("DB_SERVER", "")
-    DB_DATABASE = os.getenv("DB_DATABASE", "LIMO")
-    DB_USER = os.getenv("DB_USER", "")
-    DB_PASSWORD = os.getenv("DB_PASSWORD", "")
+    DB_SERVER = settings.get("DB_SERVER", "")
+    DB_DATABASE = settings.get("DB_DATABASE", "LIMO")
+    DB_USER = settings.get("DB_USER", "")
+    DB_PASSWORD = settings.get("DB_PASSWORD", "")
     DB_FIX_DB1 = "DB1"
     DB_FIX_DB2 = "DB2"
+    DB_POOL_MIN_SIZE = settings.get_int("DB_POOL_MIN_SIZE", 1)
+    DB_POOL_MAX_SIZE = settings.get_int("DB_POOL_MAX_SIZE", 10)
+    DB_POOL_TIMEOUT = settings.get_int("DB_POOL_TIMEOUT", 30)
+    DB_POOL_MAX_LIFETIME = settings.get_int("DB_POOL_MAX_LIFETIME", 1800)
+    DB_POOL_IDLE_TIMEOUT = settings.get_int("DB_POOL_IDLE_TIMEOUT", 300)
+    DB_POOL_PING_INTERVAL = settings.get_int("DB_POOL_PING_INTERVAL", 30)
+    DB_EXECUTOR_MAX_WORKERS = settings.get_int("DB_EXECUTOR_MAX_WORKERS", settings.get_int("DB_POOL_MAX_SIZE", 10))
+    DB_EXECUTOR_MAX_QUEUE = settings.get_int("DB_EXECUTOR_MAX_QUEUE", 100)
+    DB_EXECUTOR_QUEUE_TIMEOUT = settings.get_float("DB_EXECUTOR_QUEUE_TIMEOUT", 10.0)
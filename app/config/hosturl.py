@@ -1,10 +1,7 @@
 """取得env之Host連線字串."""
 
-import os
 from enum import Enum
-import dotenv
-
-dotenv.load_dotenv()
+from app.config.settings import settings
 
 
 class HOSTENV(Enum):
@@ -14,4 +11,4 @@ class HOSTENV(Enum):
         HOST_URL: Host Url
     """
 
-    HOST_URL = os.getenv("HOST_URL", "")
+    HOST_URL = settings.get("HOST_URL", "")
@@ -1,8 +1,5 @@
-import os
-import dotenv
 from enum import Enum
-
-dotenv.load_dotenv()
+from app.config.settings import settings
 
 
 class JWTEnvs(Enum):
@@ -17,10 +14,28 @@ class JWTEnvs(Enum):
         JWT_EXPIRE_MINUTES: Token 過期分鐘
         JWT_RE_SECRET_KEY: Refresh Token secret key
         JWT_RE_EXPIRE_MINUTES: Refresh Token 過期分鐘
+        JWT_TOKEN_CACHE_MAX_ENTRIES: 已驗證 Token 快取的最大筆數, 0 為不快取
+        JWT_TOKEN_CACHE_TTL: 已驗證 Token 快取的最長秒數 (不會超過 Token 的 exp)
+        JWT_KEYS_FILE: Access Token 的非對稱金鑰 JWKS 檔案 (RS256 / ES256 等), 未設定時使用 JWT_SECRET_KEY
+        JWT_SIGNING_KID: 簽章用的金鑰 ID, 未設定時使用 JWKS 中第一個含私鑰的金鑰
+        JWT_KEYS_RELOAD_INTERVAL: 檢查 JWKS 檔案是否修改的間隔秒數
+        JWT_REVOCATION_FILE: Token 撤銷清單的快照檔, 未設定時只保存在記憶體
+        JWT_REVOCATION_CAPACITY: 撤銷清單 Bloom filter 預期的數量
+        JWT_REVOCATION_FALSE_POSITIVE_RATE: 撤銷清單 Bloom filter 誤判率
+        JWT_REVOCATION_RELOAD_INTERVAL: 檢查快照檔是否修改及移除過期 jti 的間隔秒數
     """
 
-    JWT_ALGORITHM = os.getenv("JWT_ALGORITHM")
-    JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
-    JWT_EXPIRE_MINUTES = os.getenv("JWT_EXPIRE_MINUTES", "0")
-    JWT_RE_SECRET_KEY = os.getenv("JWT_RE_SECRET_KEY")
-    JWT_RE_EXPIRE_MINUTES = os.getenv("JWT_RE_EXPIRE_MINUTES", "0")
+    JWT_ALGORITHM = settings.get("JWT_ALGORITHM")
+    JWT_SECRET_KEY = settings.get("JWT_SECRET_KEY")
+    JWT_EXPIRE_MINUTES = settings.get_int("JWT_EXPIRE_MINUTES", 0)
+    JWT_RE_SECRET_KEY = settings.get("JWT_RE_SECRET_KEY")
+    JWT_RE_EXPIRE_MINUTES = settings.get_int("JWT_RE_EXPIRE_MINUTES", 0)
+    JWT_TOKEN_CACHE_MAX_ENTRIES = settings.get_int("JWT_TOKEN_CACHE_MAX_ENTRIES", 10000)
+    JWT_TOKEN_CACHE_TTL = settings.get_float("JWT_TOKEN_CACHE_TTL", 900.0)
+    JWT_KEYS_FILE = settings.get("JWT_KEYS_FILE")
+    JWT_SIGNING_KID = settings.get("JWT_SIGNING_KID")
+    JWT_KEYS_RELOAD_INTERVAL = settings.get_float("JWT_KEYS_RELOAD_INTERVAL", 60.0)
+    JWT_REVOCATION_FILE = settings.get("JWT_REVOCATION_FILE")
+    JWT_REVOCATION_CAPACITY = settings.get_int("JWT_REVOCATION_CAPACITY", 100000)
+    JWT_REVOCATION_FALSE_POSITIVE_RATE = settings.get_float("JWT_REVOCATION_FALSE_POSITIVE_RATE", 0.001)
+    JWT_REVOCATION_RELOAD_INTERVAL = settings.get_float("JWT_REVOCATION_RELOAD_INTERVAL", 10.0)
@@ -0,0 +1,68 @@
+"""API Log 的路由設定."""
+
+from enum import Enum
+from typing import NamedTuple, Tuple
+
+
+class LogPolicy(NamedTuple):
+    """單一路由的 API Log 設定
+
+    Attributes:
+        enabled: 是否記錄
+        capture_body: 是否記錄 request / response body
+        max_body_size: body 最多記錄幾個 bytes
+        sample_rate: 狀態碼 < 400 的記錄比例 (0~1)
+        client_error_sample_rate: 狀態碼 4xx 的記錄比例 (0~1)
+        server_error_sample_rate: 狀態碼 5xx 或執行錯誤的記錄比例 (0~1)
+        skip_content_types: 不記錄 body 的 content-type 前綴
+    """
+
+    enabled: bool = True
+    capture_body: bool = True
+    max_body_size: int = 1000
+    sample_rate: float = 1.0
+    client_error_sample_rate: float = 1.0
+    server_error_sample_rate: float = 1.0
+    skip_content_types: Tuple[str, ...] = (
+        "multipart/",
+        "application/octet-stream",
+        "application/zip",
+        "application/pdf",
+        "image/",
+        "audio/",
+        "video/",
+    )
+
+
+class APILogPolicyMapping(Enum):
+    """路由與 API Log 設定的對應
+
+    [路由比對]
+    "/api/login": 只比對完全相同的路徑
+    "/api/*": 比對 /api 底下所有路徑
+    同時符合多個時, 以最長的設定為準; 都不符合時使用 DEFAULT
+
+    Attributes:
+        DEFAULT: 預設設定
+        ROOT: 首頁 (health check), 只抽樣 1% 的成功請求且不記錄 body
+        METRICS: Prometheus 監控指標, 不記錄
+        LOGIN: 登入, 不記錄含密碼的 request body
+        path: 路由
+        policy: API Log 設定
+
+    """
+
+    DEFAULT = ("*", LogPolicy())
+    ROOT = ("/", LogPolicy(capture_body=False, sample_rate=0.01))
+    METRICS = ("/metrics", LogPolicy(enabled=False))
+    LOGIN = ("/api/login", LogPolicy(capture_body=False))
+
+    @property
+    def path(self) -> str:
+        """路由"""
+        return self.value[0]
+
+    @property
+    def policy(self) -> LogPolicy:
+        """API Log 設定"""
+        return self.value[1]
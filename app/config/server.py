@@ -0,0 +1,30 @@
+from enum import Enum
+from app.config.settings import settings
+
+
+class ServerEnvs(Enum):
+    """正式環境啟動設定 (server.py), 命令列參數優先
+
+    Attributes:
+        SERVER_HOST: 綁定的 host
+        SERVER_PORT: 綁定的 port
+        SERVER_WORKERS: worker process 數, 未設定時依可用的 CPU 數 (含 cgroup 限制)
+        SERVER_BACKLOG: socket listen backlog
+        SERVER_PRELOAD: 是否在 fork worker 前先載入 app, worker 啟動較快且共用記憶體, 但 SIGHUP 不會載入新的程式碼
+        SERVER_MAX_REQUESTS: worker 處理多少個 request 後重啟, 0 為不重啟
+        SERVER_MAX_REQUESTS_JITTER: 重啟的 request 數加上 0 ~ 此值的亂數, 避免所有 worker 同時重啟
+        SERVER_MAX_RSS_MB: worker 的 RSS 超過此值 (MB) 時重啟, 0 為不限制
+        SERVER_GRACEFUL_TIMEOUT: worker 結束時等待處理中 request 的秒數
+        SERVER_KEEPALIVE: HTTP keep-alive 秒數
+    """
+
+    SERVER_HOST = settings.get("SERVER_HOST", "0.0.0.0")
+    SERVER_PORT = settings.get_int("SERVER_PORT", 8000)
+    SERVER_WORKERS = settings.get_int("SERVER_WORKERS", 0)
+    SERVER_BACKLOG = settings.get_int("SERVER_BACKLOG", 2048)
+    SERVER_PRELOAD = settings.get_bool("SERVER_PRELOAD", True)
+    SERVER_MAX_REQUESTS = settings.get_int("SERVER_MAX_REQUESTS", 0)
+    SERVER_MAX_REQUESTS_JITTER = settings.get_int("SERVER_MAX_REQUESTS_JITTER", 0)
+    SERVER_MAX_RSS_MB = settings.get_int("SERVER_MAX_RSS_MB", 0)
+    SERVER_GRACEFUL_TIMEOUT = settings.get_int("SERVER_GRACEFUL_TIMEOUT", 30)
+    SERVER_KEEPALIVE = settings.get_int("SERVER_KEEPALIVE", 5)
@@ -0,0 +1,93 @@
+"""讀取 .env 與環境變數, 整個 process 只讀取一次, 所有 config 共用."""
+
+import os
+from functools import lru_cache
+from typing import Dict, Optional, overload
+import dotenv
+
+
+class Settings:
+    """.env 與環境變數的快照, 提供型態轉換
+
+    環境變數優先於 .env (與 dotenv.load_dotenv 相同), .env 的值也會寫入 os.environ,
+    讓第三方套件 (例如 Azure SDK) 讀得到.
+    """
+
+    def __init__(self, values: Dict[str, str]) -> None:
+        """Init.
+
+        Args:
+            values (Dict[str, str]): 環境變數
+        """
+        self._values = values
+
+    @overload
+    def get(self, name: str) -> Optional[str]: ...
+
+    @overload
+    def get(self, name: str, default: str) -> str: ...
+
+    def get(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        """取得字串設定
+
+        Args:
+            name (str): 名稱
+            default (Optional[str], optional): 未設定時的值. Defaults to None.
+
+        Returns:
+            Optional[str]: 設定值
+        """
+        return self._values.get(name, default)
+
+    def get_int(self, name: str, default: int) -> int:
+        """取得整數設定
+
+        Args:
+            name (str): 名稱
+            default (int): 未設定或為空字串時的值
+
+        Returns:
+            int: 設定值
+        """
+        value = self._values.get(name)
+        return int(value) if value else default
+
+    def get_float(self, name: str, default: float) -> float:
+        """取得浮點數設定
+
+        Args:
+            name (str): 名稱
+            default (float): 未設定或為空字串時的值
+
+        Returns:
+            float: 設定值
+        """
+        value = self._values.get(name)
+        return float(value) if value else default
+
+    def get_bool(self, name: str, default: bool) -> bool:
+        """取得布林設定, true / 1 / yes / on (不分大小寫) 為 True
+
+        Args:
+            name (str): 名稱
+            default (bool): 未設定或為空字串時的值
+
+        Returns:
+            bool: 設定值
+        """
+        value = self._values.get(name)
+        return value.strip().lower() in ("true", "1", "yes", "on") if value else default
+
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """讀取 .env 並建立設定快照, 只在第一次呼叫時讀取檔案
+
+    Returns:
+        Settings: 設定
+    """
+    dotenv.load_dotenv()
+    return Settings(dict(os.environ))
+
+
+settings = get_settings()
@@ -1,22 +1,45 @@
 from enum import Enum
+from typing import NamedTuple, Optional, Tuple
 from app.config.database import DBENV
 
 db1 = DBENV.DB_FIX_DB1.value
 db2 = DBENV.DB_FIX_DB2.value
 
 
+class SPCachePolicy(NamedTuple):
+    """Stored procedure 結果快取設定
+
+    快取的結果交給呼叫端時會複製 result_set 與 output_parameters, 呼叫端修改資料列不會影響其他呼叫端.
+
+    Attributes:
+        ttl: 快取秒數
+        max_entries: 最多快取幾組參數的結果, 超過時淘汰最久未使用的
+        key_params: 組成快取 key 的輸入參數名稱, None 表示使用所有輸入參數
+    """
+
+    ttl: float
+    max_entries: int = 1000
+    key_params: Optional[Tuple[str, ...]] = None
+
+
 class StoredProcedureMapping(Enum):
     """Stored procedure 名稱與DB對應
 
     [使用方式]
     取得SP名稱: StoredProcedureMapping.SP_FAKE1.name
     取得對應的DB名稱: StoredProcedureMapping.SP_FAKE1.db
+    取得快取設定: StoredProcedureMapping.SP_FAKE1.cache_policy
+
+    [結果快取]
+    讀多寫少的查詢 SP 可以在第三個值宣告快取設定, simple_sp_execution 會直接回傳快取結果, 例如:
+    SP_QUERY = ("SP_QUERY", db1, SPCachePolicy(ttl=60, max_entries=500, key_params=("DRIVERID",)))
 
     Attributes:
         SP_FAKE1: 假的SP 1
         SP_FAKE2: 假的SP 2
         name: SP名稱
         db: SP所對應的DB名稱
+        cache_policy: SP的結果快取設定, 未設定為 None
 
     """
 
@@ -32,3 +55,8 @@ class StoredProcedureMapping(Enum):
     def db(self) -> str:
         """SP所對應的DB名稱"""
         return self.value[1]
+
+    @property
+    def cache_policy(self) -> Optional[SPCachePolicy]:
+        """SP的結果快取設定"""
+        return next(iter(self.value[2:]), None)
@@ -0,0 +1,604 @@
+"""Azure File Storage Manager (asyncio).
+
+使用 Azure SDK 的 aio client 與共用的 aiohttp session, 傳輸在 event loop 上進行, 不佔用執行緒.
+與 AzureFileStorageManager 相同, Azure SDK 與 aiohttp 在第一次使用時才 import.
+"""
+
+import asyncio
+import itertools
+import math
+import os
+from collections import deque
+from contextlib import aclosing, asynccontextmanager
+from typing import Any, AsyncGenerator, AsyncIterator, BinaryIO, Deque, Dict, Optional, Set, Tuple
+from app import log
+from app.config.afs import AFSENV
+from app.logic.core.afs_disk_cache import AFSDiskCache
+from app.logic.core.afs_manager import MAX_RANGE_SIZE, file_size_from_download, is_empty_file_range_error
+from app.logic.core.metrics import AFS_OPERATION_SECONDS, observe_duration
+from app.logic.utilities.ttl_cache import TTLCache
+
+
+class AsyncAzureFileStorageManager:
+    """AzureFileStorageManager 的 asyncio 版本, 方法相同但皆為 coroutine.
+
+    所有 client 都由同一個 aio ShareServiceClient 建立, 共用一個 aiohttp session 與它的 keep-alive 連線池.
+    session 與 service client 在第一次使用時 (或呼叫 open 時) 於目前的 event loop 建立, app 結束時由
+    lifespan 呼叫 close_async_afs_manager 關閉. 整個 app 請透過 get_async_afs_manager() 共用同一個 instance.
+
+    大檔案以 chunk_size 分段, 每個檔案最多 concurrency 段同時傳輸, 記憶體用量約為 chunk_size x concurrency.
+
+    設定 AFS_DISK_CACHE_DIR 時與 AzureFileStorageManager 使用同一個磁碟快取目錄, 透過這個 manager 上傳 (含失敗) 後
+    刪除快取的檔案, AzureFileStorageManager 之後的下載會重新由 AFS 取得.
+
+    Attributes:
+        session: 共用的 aiohttp.ClientSession, 外部傳入時不會由 close 關閉
+        disk_cache: 本機磁碟快取, 未設定時為 None
+    """
+
+    def __init__(
+        self,
+        connection_string: Optional[str] = AFSENV.CONNECTION_STRING.value,
+        pool_maxsize: int = int(AFSENV.POOL_MAXSIZE.value),
+        session: Any = None,
+        disk_cache_dir: Optional[str] = AFSENV.DISK_CACHE_DIR.value,
+    ) -> None:
+        """Initialize AsyncAzureFileStorageManager with connection settings from AFSENV.
+
+        Args:
+            connection_string (Optional[str]): AFS 連線字串
+            pool_maxsize (int): aiohttp 連線池的最大連線數
+            session (Any, optional): 共用既有的 aiohttp.ClientSession. Defaults to None.
+            disk_cache_dir (Optional[str]): 本機磁碟快取目錄, 空字串或 None 為不使用快取
+        """
+        self.connection_string = connection_string
+        self.share_name = AFSENV.SHARE_NAME.value
+        self.qr_code_share_name = AFSENV.QR_CODE_SHARE_NAME.value
+        self.pool_maxsize = pool_maxsize
+        self.session = session
+        self._session_owner = session is None
+        self._share_clients: Dict[str, Any] = {}
+        self._directory_clients = TTLCache(int(AFSENV.DIRECTORY_CLIENT_CACHE_SIZE.value), math.inf)
+        self.chunk_size = int(AFSENV.CHUNK_SIZE.value)
+        self.max_concurrency = int(AFSENV.MAX_CONCURRENCY.value)
+        self._lock = asyncio.Lock()
+        self._service_client: Any = None
+        self.disk_cache = (
+            AFSDiskCache(
+                disk_cache_dir,
+                int(AFSENV.DISK_CACHE_MAX_BYTES.value),
+                float(AFSENV.DISK_CACHE_REVALIDATE_SECONDS.value),
+            )
+            if disk_cache_dir
+            else None
+        )
+
+    async def __aenter__(self) -> "AsyncAzureFileStorageManager":
+        """Open.
+
+        Returns:
+            AsyncAzureFileStorageManager: self
+        """
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        """Close.
+
+        Args:
+            exc_info (Any): 例外資訊
+        """
+        await self.close()
+
+    async def open(self) -> Any:
+        """建立 aiohttp session 與 aio ShareServiceClient, 已建立時直接回傳
+
+        Returns:
+            Any: aio ShareServiceClient
+        """
+        if self._service_client is None:
+            async with self._lock:
+                if self._service_client is None:
+                    from azure.storage.fileshare.aio import ShareServiceClient
+
+                    self._service_client = ShareServiceClient.from_connection_string(
+                        self.connection_string, transport=self._build_transport()
+                    )
+        return self._service_client
+
+    def _build_transport(self) -> Any:
+        """建立共用 aiohttp session 的 transport, 連線逾時與 AzureFileStorageManager 相同
+
+        Returns:
+            Any: azure.core AioHttpTransport
+        """
+        import aiohttp
+        from azure.core.pipeline.transport import AioHttpTransport
+
+        if self.session is None:
+            # 與 AioHttpTransport 自行建立的 session 設定相同, 由 SDK 處理解壓縮
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_maxsize),
+                cookie_jar=aiohttp.DummyCookieJar(),
+                auto_decompress=False,
+                trust_env=True,
+            )
+        return AioHttpTransport(
+            session=self.session,
+            session_owner=False,
+            connection_timeout=AFSENV.CONNECTION_TIMEOUT.value,
+            read_timeout=AFSENV.READ_TIMEOUT.value,
+        )
+
+    async def get_share_client(self, share_name: Optional[str] = None) -> Any:
+        """取得 aio share client, 依名稱快取
+
+        Args:
+            share_name (Optional[str], optional): file share 名稱. Defaults to AFS_SHARE_NAME.
+
+        Returns:
+            Any: ShareClient
+        """
+        name = share_name or self.share_name or ""
+        share_client = self._share_clients.get(name)
+        if share_client is None:
+            share_client = self._share_clients.setdefault(name, (await self.open()).get_share_client(name))
+        return share_client
+
+    async def get_directory_client(self, directory_path: str, share_name: Optional[str] = None) -> Any:
+        """取得 aio directory client, 依 (share, 路徑) 快取
+
+        Args:
+            directory_path (str): 目錄路徑, 空字串為 share 根目錄
+            share_name (Optional[str], optional): file share 名稱. Defaults to AFS_SHARE_NAME.
+
+        Returns:
+            Any: ShareDirectoryClient
+        """
+        share_client = await self.get_share_client(share_name)
+        directory_path = directory_path.strip("/")
+        return self._directory_clients.get_or_load(
+            (share_client.share_name, directory_path),
+            lambda: share_client.get_directory_client(directory_path or None),
+        )
+
+    async def get_file_client(self, file_path: str, share_name: Optional[str] = None) -> Any:
+        """取得 aio file client, 由快取的 directory client 建立
+
+        Args:
+            file_path (str): 檔案路徑
+            share_name (Optional[str], optional): file share 名稱. Defaults to AFS_SHARE_NAME.
+
+        Returns:
+            Any: ShareFileClient
+        """
+        directory_path, _, file_name = file_path.strip("/").rpartition("/")
+        return (await self.get_directory_client(directory_path, share_name)).get_file_client(file_name)
+
+    async def upload_file(self, file_bytes: bytes, dest_file_path: str) -> None:
+        """Upload a file to Azure File Storage.
+
+        Args:
+            file_bytes (bytes): The content of the file in bytes.
+            dest_file_path (str): The destination path in Azure File Storage.
+        """
+        with observe_duration(AFS_OPERATION_SECONDS, "upload_file"):
+            async with self._invalidating_cache(dest_file_path, None):
+                await self._upload_ranges(
+                    self._iter_bytes(file_bytes), await self.get_file_client(dest_file_path), len(file_bytes)
+                )
+
+    async def download_file(self, file_path: str) -> bytes:
+        """Download a file from Azure File Storage.
+
+        整個檔案放在記憶體, 大檔案請使用 iter_file 或 download_to_stream.
+
+        Args:
+            file_path (str): The path of the file in Azure File Storage.
+
+        Returns:
+            bytes: The content of the downloaded file.
+        """
+        with observe_duration(AFS_OPERATION_SECONDS, "download_file"):
+            file_client = await self.get_file_client(file_path)
+            async with aclosing(self._download_ranges(file_client)) as chunks:
+                return b"".join([chunk async for chunk in chunks])
+
+    async def upload_image(self, local_image_path: str, dest_file_path: str, file_share: str) -> None:
+        """Upload a QR code image to Azure file Storage.
+
+        Args:
+            local_image_path (bytes): The QR code image path.
+            dest_file_path (str): The destination path in Azure file Storage.
+            file_share: azure file share name.
+
+        """
+        with observe_duration(AFS_OPERATION_SECONDS, "upload_image"):
+            source_file = await asyncio.to_thread(open, local_image_path, "rb")
+            try:
+                async with self._invalidating_cache(dest_file_path, file_share):
+                    await self._upload_stream(source_file, await self.get_file_client(dest_file_path, file_share))
+            finally:
+                source_file.close()
+
+    async def upload_stream(  # noqa: CFQ002
+        self,
+        stream: BinaryIO,
+        dest_file_path: str,
+        length: Optional[int] = None,
+        share_name: Optional[str] = None,
+        chunk_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+    ) -> int:
+        """由 file-like object 分段並行上傳, 讀取在執行緒進行, 記憶體用量約為 chunk_size x concurrency
+
+        Args:
+            stream (BinaryIO): 來源, 例如 UploadFile.file 或開啟的檔案
+            dest_file_path (str): 目的路徑
+            length (Optional[int], optional): 上傳的 bytes, 未指定時由可 seek 的 stream 計算. Defaults to None.
+            share_name (Optional[str], optional): file share 名稱. Defaults to AFS_SHARE_NAME.
+            chunk_size (Optional[int], optional): 每段 bytes. Defaults to AFS_CHUNK_SIZE.
+            concurrency (Optional[int], optional): 同時上傳的段數. Defaults to AFS_MAX_CONCURRENCY.
+
+        Returns:
+            int: 上傳的 bytes
+        """
+        with observe_duration(AFS_OPERATION_SECONDS, "upload_stream"):
+            file_client = await self.get_file_client(dest_file_path, share_name)
+            async with self._invalidating_cache(dest_file_path, share_name):
+                return await self._upload_stream(stream, file_client, length, chunk_size, concurrency)
+
+    async def upload_async_iterator(  # noqa: CFQ002
+        self,
+        chunks: AsyncIterator[bytes],
+        dest_file_path: str,
+        length: Optional[int] = None,
+        share_name: Optional[str] = None,
+        chunk_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+    ) -> int:
+        """由 async iterator (例如 request.stream()) 分段並行上傳, 不會把整個檔案放進記憶體
+
+        Args:
+            chunks (AsyncIterator[bytes]): 來源
+            dest_file_path (str): 目的路徑
+            length (Optional[int], optional): 總 bytes (例如 Content-Length), 未指定時邊上傳邊調整檔案大小.
+                Defaults to None.
+            share_name (Optional[str], optional): file share 名稱. Defaults to AFS_SHARE_NAME.
+            chunk_size (Optional[int], optional): 每段 bytes. Defaults to AFS_CHUNK_SIZE.
+            concurrency (Optional[int], optional): 同時上傳的段數. Defaults to AFS_MAX_CONCURRENCY.
+
+        Returns:
+            int: 上傳的 bytes
+        """
+        with observe_duration(AFS_OPERATION_SECONDS, "upload_async_iterator"):
+            file_client = await self.get_file_client(dest_file_path, share_name)
+            async with self._invalidating_cache(dest_file_path, share_name):
+                return await self._upload_ranges(chunks, file_client, length, chunk_size, concurrency)
+
+    async def iter_file(
+        self,
+        file_path: str,
+        share_name: Optional[str] = None,
+        chunk_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+    ) -> AsyncGenerator[bytes, None]:
+        """依序產生檔案內容, 同時預先下載後面幾段, 可直接交給 StreamingResponse
+
+            return StreamingResponse(get_async_afs_manager().iter_file(path), media_type="application/octet-stream")
+
+        Args:
+            file_path (str): 檔案路徑
+            share_name (Optional[str], optional): file share 名稱. Defaults to AFS_SHARE_NAME.
+            chunk_size (Optional[int], optional): 每段 bytes. Defaults to AFS_CHUNK_SIZE.
+            concurrency (Optional[int], optional): 同時下載的段數. Defaults to AFS_MAX_CONCURRENCY.
+
+        Yields:
+            bytes: 一段內容, 最大 chunk_size
+        """
+        with observe_duration(AFS_OPERATION_SECONDS, "iter_file"):
+            file_client = await self.get_file_client(file_path, share_name)
+            # 提前結束時立即關閉 _download_ranges, 取消預先下載中的段 (async for 不會關閉來源)
+            async with aclosing(self._download_ranges(file_client, chunk_size, concurrency)) as chunks:
+                async for chunk in chunks:
+                    yield chunk
+
+    async def download_to_stream(  # noqa: CFQ002
+        self,
+        file_path: str,
+        stream: BinaryIO,
+        share_name: Optional[str] = None,
+        chunk_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+    ) -> int:
+        """分段並行下載並依序寫入 stream (寫入在執行緒進行), 記憶體用量約為 chunk_size x concurrency
+
+        Args:
+            file_path (str): 檔案路徑
+            stream (BinaryIO): 目的 stream
+            share_name (Optional[str], optional): file share 名稱. Defaults to AFS_SHARE_NAME.
+            chunk_size (Optional[int], optional): 每段 bytes. Defaults to AFS_CHUNK_SIZE.
+            concurrency (Optional[int], optional): 同時下載的段數. Defaults to AFS_MAX_CONCURRENCY.
+
+        Returns:
+            int: 下載的 bytes
+        """
+        written = 0
+        with observe_duration(AFS_OPERATION_SECONDS, "download_to_stream"):
+            file_client = await self.get_file_client(file_path, share_name)
+            async with aclosing(self._download_ranges(file_client, chunk_size, concurrency)) as chunks:
+                async for chunk in chunks:
+                    await asyncio.to_thread(stream.write, chunk)
+                    written += len(chunk)
+        return written
+
+    @asynccontextmanager
+    async def _invalidating_cache(self, file_path: str, share_name: Optional[str]) -> AsyncIterator[None]:
+        """上傳結束後 (含失敗) 在執行緒刪除磁碟快取的檔案, 之後的下載重新由 AFS 取得
+
+        Args:
+            file_path (str): 檔案路徑
+            share_name (Optional[str]): file share 名稱
+        """
+        try:
+            yield
+        finally:
+            if self.disk_cache is not None:
+                await asyncio.to_thread(self.disk_cache.invalidate, share_name or self.share_name or "", file_path)
+
+    def _upload_chunk_size(self, chunk_size: Optional[int]) -> int:
+        """上傳每段的 bytes, 不超過 Put Range 的上限
+
+        Args:
+            chunk_size (Optional[int]): 指定的 bytes
+
+        Returns:
+            int: 每段 bytes
+        """
+        return min(chunk_size or self.chunk_size, MAX_RANGE_SIZE)
+
+    async def _iter_bytes(self, data: bytes) -> AsyncIterator[bytes]:
+        """把 bytes 切成上傳的段
+
+        Args:
+            data (bytes): 內容
+
+        Yields:
+            bytes: 一段內容
+        """
+        chunk_size = self._upload_chunk_size(None)
+        for offset in range(0, len(data), chunk_size):
+            yield data[offset : offset + chunk_size]
+
+    async def _upload_stream(  # noqa: CFQ002
+        self,
+        stream: BinaryIO,
+        file_client: Any,
+        length: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+    ) -> int:
+        """在執行緒讀取 stream 並分段上傳
+
+        Args:
+            stream (BinaryIO): 來源
+            file_client (Any): aio ShareFileClient
+            length (Optional[int], optional): 上傳的 bytes, 未指定時由可 seek 的 stream 計算. Defaults to None.
+            chunk_size (Optional[int], optional): 每段 bytes. Defaults to AFS_CHUNK_SIZE.
+            concurrency (Optional[int], optional): 同時上傳的段數. Defaults to AFS_MAX_CONCURRENCY.
+
+        Returns:
+            int: 上傳的 bytes
+        """
+        chunk_size = self._upload_chunk_size(chunk_size)
+        if length is None and stream.seekable():
+            position = stream.tell()
+            length = stream.seek(0, os.SEEK_END) - position
+            stream.seek(position)
+
+        async def read() -> AsyncIterator[bytes]:
+            """依序讀取各段
+
+            Yields:
+                bytes: 一段內容
+            """
+            remaining = length
+            while remaining is None or remaining > 0:
+                data = await asyncio.to_thread(
+                    stream.read, chunk_size if remaining is None else min(chunk_size, remaining)
+                )
+                if not data:
+                    break
+                if remaining is not None:
+                    remaining -= len(data)
+                yield data
+
+        return await self._upload_ranges(read(), file_client, length, chunk_size, concurrency)
+
+    async def _upload_ranges(  # noqa: CFQ002
+        self,
+        chunks: AsyncIterator[bytes],
+        file_client: Any,
+        length: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+    ) -> int:
+        """建立檔案後依 chunk_size 重新分段, 最多 concurrency 段同時上傳, 超過時暫停讀取來源, 失敗時刪除檔案
+
+        Args:
+            chunks (AsyncIterator[bytes]): 來源, 每次的大小不限
+            file_client (Any): aio ShareFileClient
+            length (Optional[int], optional): 總 bytes, 未指定時邊上傳邊調整檔案大小. Defaults to None.
+            chunk_size (Optional[int], optional): 每段 bytes. Defaults to AFS_CHUNK_SIZE.
+            concurrency (Optional[int], optional): 同時上傳的段數. Defaults to AFS_MAX_CONCURRENCY.
+
+        Raises:
+            BaseException: 上傳失敗, 刪除檔案後重新拋出
+
+        Returns:
+            int: 上傳的 bytes
+        """
+        chunk_size = self._upload_chunk_size(chunk_size)
+        concurrency = concurrency or self.max_concurrency
+        await file_client.create_file(length or 0)
+
+        pending: Set[asyncio.Task] = set()
+        offset = 0
+        buffer = bytearray()
+
+        async def submit(data: bytes) -> None:
+            """上傳一段, 同時上傳的段數已滿時先等待
+
+            Args:
+                data (bytes): 這一段的內容
+            """
+            nonlocal offset
+            while len(pending) >= concurrency:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # 其他已完成的段留在 pending, 失敗時一起取消並取回結果
+                for task in done:
+                    pending.discard(task)
+                    task.result()
+            if length is None:
+                await file_client.resize_file(offset + len(data))
+            pending.add(asyncio.create_task(file_client.upload_range(data, offset=offset, length=len(data))))
+            offset += len(data)
+
+        try:
+            async for chunk in chunks:
+                if not buffer and len(chunk) == chunk_size:
+                    await submit(chunk)
+                    continue
+                buffer += chunk
+                while len(buffer) >= chunk_size:
+                    data = bytes(buffer[:chunk_size])
+                    del buffer[:chunk_size]
+                    await submit(data)
+            if buffer:
+                await submit(bytes(buffer))
+            if pending:
+                await asyncio.gather(*pending)
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            # create_file 已先建立指定大小的空檔案, 留著會被當成完整的檔案下載
+            try:
+                await file_client.delete_file()
+            except Exception as ex:
+                log.error(f"刪除上傳失敗的 AFS 檔案失敗: {ex!r}")
+            raise
+        return offset
+
+    async def _download_ranges(
+        self, file_client: Any, chunk_size: Optional[int] = None, concurrency: Optional[int] = None
+    ) -> AsyncGenerator[bytes, None]:
+        """依序產生各段內容, 最多 concurrency 段同時下載 (含已下載但尚未取用的段)
+
+        先下載第一段, 由回應的 Content-Range 取得檔案大小後再並行下載其餘的段,
+        不另外查詢檔案屬性, 小於 chunk_size 的檔案只需要一次往返.
+
+        Args:
+            file_client (Any): aio ShareFileClient
+            chunk_size (Optional[int], optional): 每段 bytes. Defaults to AFS_CHUNK_SIZE.
+            concurrency (Optional[int], optional): 同時下載的段數. Defaults to AFS_MAX_CONCURRENCY.
+
+        Yields:
+            bytes: 一段內容
+        """
+        chunk_size = chunk_size or self.chunk_size
+        concurrency = concurrency or self.max_concurrency
+        first, size = await self._download_first_range(file_client, chunk_size)
+        offsets = iter(range(len(first), size, chunk_size))
+        pending: Deque[asyncio.Task] = deque()
+        try:
+            for offset in itertools.islice(offsets, concurrency):
+                pending.append(asyncio.create_task(self._download_range(file_client, offset, chunk_size)))
+            if first:
+                yield first
+            while pending:
+                data = await pending.popleft()
+                for offset in itertools.islice(offsets, 1):
+                    pending.append(asyncio.create_task(self._download_range(file_client, offset, chunk_size)))
+                yield data
+        finally:
+            # 呼叫端提前結束 (例如 client 中斷連線) 時不再下載後面的段
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    @staticmethod
+    async def _download_first_range(file_client: Any, length: int) -> Tuple[bytes, int]:
+        """下載第一段, 並由回應取得檔案大小
+
+        Args:
+            file_client (Any): aio ShareFileClient
+            length (int): 最多 bytes
+
+        Raises:
+            HttpResponseError: 下載失敗
+
+        Returns:
+            Tuple[bytes, int]: (內容, 檔案 bytes)
+        """
+        from azure.core.exceptions import HttpResponseError
+
+        try:
+            downloader = await file_client.download_file(offset=0, length=length)
+        except HttpResponseError as ex:
+            if not is_empty_file_range_error(ex):
+                raise
+            return b"", 0
+        return await downloader.readall(), file_size_from_download(downloader)
+
+    @staticmethod
+    async def _download_range(file_client: Any, offset: int, length: int) -> bytes:
+        """下載一段
+
+        Args:
+            file_client (Any): aio ShareFileClient
+            offset (int): 起始位置
+            length (int): 最多 bytes
+
+        Returns:
+            bytes: 內容
+        """
+        downloader = await file_client.download_file(offset=offset, length=length)
+        return await downloader.readall()
+
+    async def close(self) -> None:
+        """關閉 service client 與自行建立的 aiohttp session"""
+        async with self._lock:
+            service_client, self._service_client = self._service_client, None
+            self._share_clients.clear()
+            self._directory_clients.clear()
+            session = self.session if self._session_owner else None
+            if session is not None:
+                self.session = None
+        if service_client is not None:
+            await service_client.close()
+        if session is not None:
+            await session.close()
+
+
+_async_afs_manager: Optional[AsyncAzureFileStorageManager] = None
+
+
+def get_async_afs_manager() -> AsyncAzureFileStorageManager:
+    """取得整個 app 共用的 AsyncAzureFileStorageManager, 只能在 event loop 中使用
+
+    Returns:
+        AsyncAzureFileStorageManager: AFS manager
+    """
+    global _async_afs_manager
+    if _async_afs_manager is None:
+        _async_afs_manager = AsyncAzureFileStorageManager()
+    return _async_afs_manager
+
+
+async def close_async_afs_manager() -> None:
+    """關閉共用的 AsyncAzureFileStorageManager (app 結束時), 未使用過時不做任何事"""
+    global _async_afs_manager
+    manager, _async_afs_manager = _async_afs_manager, None
+    if manager is not None:
+        await manager.close()
@@ -0,0 +1,173 @@
+"""AFS 批次傳輸的結果統計與重試, 由 AzureFileStorageManager 的 upload_files / download_files 等方法使用."""
+
+import hashlib
+import random
+import time
+from typing import Any, Callable, List, NamedTuple, Optional, Tuple
+from app import log
+
+# 會重試的 4xx 狀態碼, 其他 4xx (例如 403 / 404) 重試也不會成功
+RETRYABLE_CLIENT_STATUS = (408, 429)
+
+# 略過未變更檔案的比對方式: size 只比對大小, hash 再比對 Content-MD5
+SKIP_UNCHANGED_MODES = ("size", "hash")
+
+
+class TransferResult(NamedTuple):
+    """一個檔案的傳輸結果
+
+    Attributes:
+        local_path: 本機檔案路徑
+        remote_path: AFS 檔案路徑
+        status: transferred / skipped / failed
+        bytes: 傳輸的 bytes
+        attempts: 嘗試次數
+        error: 失敗原因
+    """
+
+    local_path: str
+    remote_path: str
+    status: str
+    bytes: int
+    attempts: int
+    error: Optional[str] = None
+
+
+class TransferReport(NamedTuple):
+    """批次傳輸的結果
+
+    Attributes:
+        results: 各檔案的結果, 順序與輸入相同
+        seconds: 總秒數
+        failures: 失敗的檔案
+    """
+
+    results: List[TransferResult]
+    seconds: float
+
+    @property
+    def failures(self) -> List[TransferResult]:
+        """失敗的檔案
+
+        Returns:
+            List[TransferResult]: 失敗的檔案
+        """
+        return [result for result in self.results if result.status == "failed"]
+
+    def summary(self) -> dict:
+        """統計: 檔案數, bytes, 每秒檔案數與失敗的檔案
+
+        Returns:
+            dict: 統計
+        """
+        counts = {"transferred": 0, "skipped": 0, "failed": 0}
+        for result in self.results:
+            counts[result.status] += 1
+        transferred_bytes = sum(result.bytes for result in self.results)
+        return {
+            "files": len(self.results),
+            **counts,
+            "bytes": transferred_bytes,
+            "seconds": self.seconds,
+            "files_per_second": counts["transferred"] / self.seconds if self.seconds else 0.0,
+            "bytes_per_second": transferred_bytes / self.seconds if self.seconds else 0.0,
+            "failures": [
+                {"local_path": result.local_path, "remote_path": result.remote_path, "error": result.error}
+                for result in self.failures
+            ],
+        }
+
+
+def check_skip_unchanged(skip_unchanged: Optional[str]) -> None:
+    """檢查略過未變更檔案的比對方式
+
+    Args:
+        skip_unchanged (Optional[str]): size / hash, None 為不略過
+
+    Raises:
+        ValueError: 不支援的比對方式
+    """
+    if skip_unchanged is not None and skip_unchanged not in SKIP_UNCHANGED_MODES:
+        raise ValueError(f"skip_unchanged must be one of {SKIP_UNCHANGED_MODES} or None, got {skip_unchanged!r}")
+
+
+def file_md5(path: str, block_size: int = 1024 * 1024) -> bytes:
+    """計算本機檔案的 MD5 (Azure File Storage 的 Content-MD5)
+
+    Args:
+        path (str): 檔案路徑
+        block_size (int, optional): 每次讀取的 bytes. Defaults to 1MB.
+
+    Returns:
+        bytes: MD5
+    """
+    digest = hashlib.md5(usedforsecurity=False)
+    with open(path, "rb") as source_file:
+        while block := source_file.read(block_size):
+            digest.update(block)
+    return digest.digest()
+
+
+def is_unchanged(skip_unchanged: str, local_size: int, local_md5: Callable[[], bytes], properties: Any) -> bool:
+    """本機檔案與 AFS 檔案是否相同, hash 模式下 AFS 檔案沒有 Content-MD5 時視為不同
+
+    Args:
+        skip_unchanged (str): size / hash
+        local_size (int): 本機檔案 bytes
+        local_md5 (Callable[[], bytes]): 計算本機檔案的 MD5, 大小相同時才呼叫
+        properties (Any): AFS 的檔案屬性
+
+    Returns:
+        bool: 相同時為 True
+    """
+    if properties.size != local_size:
+        return False
+    if skip_unchanged == "size":
+        return True
+    remote_md5 = getattr(properties.content_settings, "content_md5", None)
+    return remote_md5 is not None and bytes(remote_md5) == local_md5()
+
+
+def is_retryable(error: Exception) -> bool:
+    """是否值得重試: 本機檔案不存在 / 權限不足, 以及 408 / 429 以外的 4xx 不重試
+
+    Args:
+        error (Exception): 例外
+
+    Returns:
+        bool: 值得重試時為 True
+    """
+    if isinstance(error, (FileNotFoundError, IsADirectoryError, PermissionError)):
+        return False
+    status = getattr(error, "status_code", None)
+    return not (status and 400 <= status < 500 and status not in RETRYABLE_CLIENT_STATUS)
+
+
+def with_retry(
+    local_path: str, remote_path: str, transfer: Callable[[], Tuple[str, int]], retries: int, backoff: float
+) -> TransferResult:
+    """傳輸一個檔案, 失敗時以指數退避 (含 jitter) 重試, 不拋出例外
+
+    Args:
+        local_path (str): 本機檔案路徑
+        remote_path (str): AFS 檔案路徑
+        transfer (Callable[[], Tuple[str, int]]): 傳輸, 回傳 (transferred / skipped, bytes)
+        retries (int): 失敗後最多重試次數
+        backoff (float): 第一次重試前等待的秒數, 之後每次加倍
+
+    Returns:
+        TransferResult: 結果
+    """
+    attempts = 0
+    while True:
+        attempts += 1
+        try:
+            status, transferred = transfer()
+            return TransferResult(local_path, remote_path, status, transferred, attempts)
+        except Exception as ex:
+            if attempts > retries or not is_retryable(ex):
+                log.error(f"AFS 傳輸失敗 {local_path} <-> {remote_path} (嘗試 {attempts} 次): {ex!r}")
+                return TransferResult(local_path, remote_path, "failed", 0, attempts, repr(ex))
+            delay = backoff * 2 ** (attempts - 1) * random.uniform(0.5, 1.0)  # nosec B311
+            log.warning(f"AFS 傳輸失敗 {local_path} <-> {remote_path}, {delay:.1f} 秒後重試: {ex!r}")
+            time.sleep(delay)
@@ -0,0 +1,289 @@
+"""AFS 下載的本機磁碟快取.
+
+檔案以 (share, 路徑) 的 sha256 命名, 內容存在 <key>.bin, ETag 等資訊存在 <key>.json. 檔案系統本身就是索引,
+同一台機器的多個 worker 可以共用同一個目錄:
+
+- 寫入先寫到暫存檔再 os.replace, 讀取到的一定是完整的檔案
+- .bin 的 mtime 為最近使用時間, 超過容量時刪除最久沒有使用的檔案 (LRU)
+- .json 的 mtime 為上次向 AFS 確認 ETag 的時間
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from contextlib import suppress
+from typing import Callable, Iterable, List, NamedTuple, Optional, Tuple
+import orjson
+
+# 超過此秒數沒有更新的暫存檔視為寫入中斷
+STALE_TEMPORARY_SECONDS = 3600
+
+
+class CacheEntry(NamedTuple):
+    """快取的檔案
+
+    Attributes:
+        path: 本機檔案路徑
+        etag: 下載時 AFS 檔案的 ETag
+        size: bytes
+        validated_at: 上次確認 ETag 的時間 (epoch 秒)
+    """
+
+    path: str
+    etag: Optional[str]
+    size: int
+    validated_at: float
+
+
+class AFSDiskCache:
+    """容量上限的 AFS 磁碟快取, 由 AzureFileStorageManager 使用
+
+    Attributes:
+        directory: 快取目錄
+        max_bytes: 容量上限
+        revalidate_seconds: 超過此秒數的項目使用前需要向 AFS 確認 ETag
+    """
+
+    def __init__(self, directory: str, max_bytes: int, revalidate_seconds: float) -> None:
+        """Init.
+
+        Args:
+            directory (str): 快取目錄, 不存在時建立
+            max_bytes (int): 容量上限
+            revalidate_seconds (float): 超過此秒數的項目使用前需要向 AFS 確認 ETag
+
+        Raises:
+            ValueError: 容量上限不是正數
+        """
+        if max_bytes < 1:
+            raise ValueError(f"max_bytes must be positive, got {max_bytes}")
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.revalidate_seconds = revalidate_seconds
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._total = sum(size for _, size, _ in self._scan())
+
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _base_path(self, share_name: str, file_path: str) -> str:
+        """快取檔案的路徑 (不含副檔名)
+
+        Args:
+            share_name (str): file share 名稱
+            file_path (str): AFS 檔案路徑
+
+        Returns:
+            str: 路徑
+        """
+        digest = hashlib.sha256(f"{share_name}\0{file_path.strip('/')}".encode()).hexdigest()
+        return os.path.join(self.directory, digest)
+
+    def get(self, share_name: str, file_path: str, remote_etag: Callable[[], Optional[str]]) -> Optional[CacheEntry]:
+        """取得可以使用的快取檔案, 超過確認間隔時先以 remote_etag 向 AFS 確認 ETag
+
+        Args:
+            share_name (str): file share 名稱
+            file_path (str): AFS 檔案路徑
+            remote_etag (Callable[[], Optional[str]]): 取得 AFS 檔案目前的 ETag
+
+        Returns:
+            Optional[CacheEntry]: 快取的檔案, 沒有或已過期時為 None
+        """
+        entry = self._lookup(self._base_path(share_name, file_path))
+        if entry is not None and time.time() - entry.validated_at >= self.revalidate_seconds:
+            if remote_etag() == entry.etag:
+                with suppress(OSError):
+                    os.utime(f"{entry.path[:-len('.bin')]}.json")
+                with self._lock:
+                    self.revalidations += 1
+            else:
+                entry = None
+        if entry is not None:
+            try:
+                # .bin 的 mtime 為最近使用時間 (LRU)
+                os.utime(entry.path)
+            except OSError:
+                # 其他 worker 剛好淘汰了這個檔案
+                entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def _lookup(self, base_path: str) -> Optional[CacheEntry]:
+        """讀取快取檔案的資訊, 不檢查是否過期
+
+        Args:
+            base_path (str): 快取檔案的路徑 (不含副檔名)
+
+        Returns:
+            Optional[CacheEntry]: 快取的檔案, 沒有時為 None
+        """
+        try:
+            with open(f"{base_path}.json", "rb") as meta_file:
+                meta = orjson.loads(meta_file.read())
+                validated_at = os.fstat(meta_file.fileno()).st_mtime
+            size = os.stat(f"{base_path}.bin").st_size
+        except (OSError, orjson.JSONDecodeError):
+            return None
+        return CacheEntry(f"{base_path}.bin", meta.get("etag"), size, validated_at)
+
+    @staticmethod
+    def read(entry: CacheEntry) -> Optional[bytes]:
+        """讀取快取的內容
+
+        Args:
+            entry (CacheEntry): 快取的檔案
+
+        Returns:
+            Optional[bytes]: 內容, 檔案已被刪除時為 None
+        """
+        try:
+            with open(entry.path, "rb") as data_file:
+                return data_file.read()
+        except OSError:
+            return None
+
+    def write(self, share_name: str, file_path: str, chunks: Iterable[bytes], etag: Optional[str]) -> CacheEntry:
+        """依序寫入內容, 完成後才取代快取的檔案, 寫入失敗時不留下任何檔案
+
+        Args:
+            share_name (str): file share 名稱
+            file_path (str): AFS 檔案路徑
+            chunks (Iterable[bytes]): 內容
+            etag (Optional[str]): AFS 檔案的 ETag
+
+        Raises:
+            BaseException: 讀取內容或寫入失敗, 刪除暫存檔後重新拋出
+
+        Returns:
+            CacheEntry: 快取的檔案
+        """
+        base_path = self._base_path(share_name, file_path)
+        previous_size = 0
+        with suppress(OSError):
+            previous_size = os.stat(f"{base_path}.bin").st_size
+
+        size = 0
+        descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "wb") as data_file:
+                for chunk in chunks:
+                    data_file.write(chunk)
+                    size += len(chunk)
+            os.replace(temporary_path, f"{base_path}.bin")
+            self._write_meta(base_path, {"share": share_name, "path": file_path.strip("/"), "etag": etag})
+        except BaseException:
+            with suppress(OSError):
+                os.unlink(temporary_path)
+            raise
+
+        with self._lock:
+            self._total += size - previous_size
+            over_capacity = self._total > self.max_bytes
+        if over_capacity:
+            self.evict()
+        return CacheEntry(f"{base_path}.bin", etag, size, time.time())
+
+    def _write_meta(self, base_path: str, meta: dict) -> None:
+        """寫入 .json (同樣先寫暫存檔)
+
+        Args:
+            base_path (str): 快取檔案的路徑 (不含副檔名)
+            meta (dict): 內容
+
+        Raises:
+            BaseException: 寫入失敗, 刪除暫存檔後重新拋出
+        """
+        descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "wb") as meta_file:
+                meta_file.write(orjson.dumps(meta))
+            os.replace(temporary_path, f"{base_path}.json")
+        except BaseException:
+            with suppress(OSError):
+                os.unlink(temporary_path)
+            raise
+
+    def invalidate(self, share_name: str, file_path: str) -> None:
+        """刪除快取的檔案 (上傳新內容時)
+
+        Args:
+            share_name (str): file share 名稱
+            file_path (str): AFS 檔案路徑
+        """
+        base_path = self._base_path(share_name, file_path)
+        size = 0
+        with suppress(OSError):
+            size = os.stat(f"{base_path}.bin").st_size
+        # 先刪除 .json, 其他 worker 不會再查到這個項目
+        for extension in (".json", ".bin"):
+            with suppress(FileNotFoundError):
+                os.unlink(f"{base_path}{extension}")
+        with self._lock:
+            self._total -= size
+            self.invalidations += 1
+
+    def _scan(self) -> List[Tuple[float, int, str]]:
+        """列出目錄中所有快取的檔案, 並刪除寫入中斷 (例如 process 被終止) 留下的暫存檔
+
+        Returns:
+            List[Tuple[float, int, str]]: (最近使用時間, bytes, 路徑)
+        """
+        entries = []
+        stale_before = time.time() - STALE_TEMPORARY_SECONDS
+        with os.scandir(self.directory) as iterator:
+            for entry in iterator:
+                with suppress(FileNotFoundError):
+                    if entry.name.endswith(".bin"):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    elif entry.name.endswith(".tmp") and entry.stat().st_mtime < stale_before:
+                        os.unlink(entry.path)
+        return entries
+
+    def evict(self) -> None:
+        """重新掃描目錄 (含其他 worker 寫入的檔案), 刪除最久沒有使用的檔案直到低於容量上限"""
+        entries = sorted(self._scan())
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            for extension in (".json", ".bin"):
+                with suppress(FileNotFoundError):
+                    os.unlink(f"{path[:-len('.bin')]}{extension}")
+            total -= size
+            evicted += 1
+        with self._lock:
+            self._total = total
+            self.evictions += evicted
+
+    def stats(self) -> dict:
+        """快取的計數
+
+        Returns:
+            dict: 容量與命中 / 未命中 / 淘汰計數
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "bytes": self._total,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidations": self.revalidations,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -1,19 +1,217 @@
-"""Azure File Storage Manager."""
+"""Azure File Storage Manager.
 
-from azure.storage.fileshare import ShareServiceClient, ShareFileClient
+Azure SDK 載入需要數百毫秒, 在第一次使用時才 import, 沒有使用 AFS 的 worker 啟動不受影響.
+"""
+
+import asyncio
+import itertools
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager, suppress
+from functools import partial
 from io import BytesIO
+from typing import Any, AsyncIterator, BinaryIO, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from app import log
 from app.config.afs import AFSENV
+from app.logic.core.afs_bulk import (
+    TransferReport,
+    TransferResult,
+    check_skip_unchanged,
+    file_md5,
+    is_unchanged,
+    with_retry,
+)
+from app.logic.core.afs_disk_cache import AFSDiskCache, CacheEntry
+from app.logic.core.metrics import AFS_OPERATION_SECONDS, observe_duration
+from app.logic.utilities.ttl_cache import TTLCache
+
+# Put Range 每次最多 4MB
+MAX_RANGE_SIZE = 4 * 1024 * 1024
+
+
+def file_size_from_download(downloader: Any) -> int:
+    """由指定範圍下載的回應 (StorageStreamDownloader) 取得整個檔案的 bytes
+
+    Args:
+        downloader (Any): StorageStreamDownloader, properties.content_range 為 "bytes <start>-<end>/<size>"
+
+    Returns:
+        int: 檔案 bytes
+    """
+    return int(downloader.properties.content_range.rsplit("/", 1)[1])
+
+
+def is_empty_file_range_error(ex: Exception) -> bool:
+    """是否為空檔案無法指定範圍下載的錯誤 (416 InvalidRange)
+
+    Args:
+        ex (Exception): 下載第一段 (offset=0) 時的錯誤
+
+    Returns:
+        bool: 檔案為空
+    """
+    return getattr(ex, "status_code", None) == 416
 
 
 class AzureFileStorageManager:
-    """Manages file storage operations on Azure, including uploading and downloading files."""
+    """Manages file storage operations on Azure, including uploading and downloading files.
+
+    所有 share / directory / file client 都由同一個 ShareServiceClient 建立, 共用它的 HTTP pipeline 與
+    keep-alive 連線池, 不會每個檔案重新解析連線字串與建立連線. share client 依名稱快取,
+    directory client 依 (share, 路徑) 快取 (LRU). 整個 app 請透過 get_afs_manager() 共用同一個 instance.
+
+    大檔案以 chunk_size 分段, 每個檔案最多 concurrency 段同時傳輸 (共用 transfer_threads 個執行緒),
+    記憶體用量約為 chunk_size x concurrency, 與檔案大小無關.
+
+    多個檔案或整個目錄使用 upload_files / upload_directory / download_files / download_directory,
+    同時最多 AFS_BULK_WORKERS 個檔案, 每個檔案失敗時各自重試, 完成後回傳 TransferReport.
+
+    設定 AFS_DISK_CACHE_DIR 時, download_file 與 download_to_cache 下載的檔案會存在本機磁碟 (LRU),
+    透過這個 manager 上傳時更新或刪除快取的檔案.
 
-    def __init__(self) -> None:
-        """Initialize AzureFileStorageManager with connection settings from AFSENV."""
-        self.connection_string = AFSENV.CONNECTION_STRING.value
+    Attributes:
+        service_client: 共用 HTTP 連線池的 ShareServiceClient
+        executor: 所有檔案共用的傳輸執行緒
+        disk_cache: 本機磁碟快取, 未設定時為 None
+    """
+
+    def __init__(
+        self,
+        connection_string: Optional[str] = AFSENV.CONNECTION_STRING.value,
+        pool_connections: int = int(AFSENV.POOL_CONNECTIONS.value),
+        pool_maxsize: int = int(AFSENV.POOL_MAXSIZE.value),
+        disk_cache_dir: Optional[str] = AFSENV.DISK_CACHE_DIR.value,
+    ) -> None:
+        """Initialize AzureFileStorageManager with connection settings from AFSENV.
+
+        Args:
+            connection_string (Optional[str]): AFS 連線字串
+            pool_connections (int): 連線池快取的 host 數
+            pool_maxsize (int): 每個 host 保留的最大連線數
+            disk_cache_dir (Optional[str]): 本機磁碟快取目錄, 空字串或 None 為不使用快取
+        """
+        self.connection_string = connection_string
         self.share_name = AFSENV.SHARE_NAME.value
         self.qr_code_share_name = AFSENV.QR_CODE_SHARE_NAME.value
-        self.service_client = ShareServiceClient.from_connection_string(self.connection_string)
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self._share_clients: Dict[str, Any] = {}
+        self._directory_clients = TTLCache(int(AFSENV.DIRECTORY_CLIENT_CACHE_SIZE.value), math.inf)
+        self.chunk_size = int(AFSENV.CHUNK_SIZE.value)
+        self.max_concurrency = int(AFSENV.MAX_CONCURRENCY.value)
+        self.transfer_threads = int(AFSENV.TRANSFER_THREADS.value)
+        self.bulk_workers = int(AFSENV.BULK_WORKERS.value)
+        self.bulk_retries = int(AFSENV.BULK_RETRIES.value)
+        self.bulk_retry_backoff = float(AFSENV.BULK_RETRY_BACKOFF.value)
+        self._lock = threading.Lock()
+        self._service_client: Any = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.disk_cache = (
+            AFSDiskCache(
+                disk_cache_dir,
+                int(AFSENV.DISK_CACHE_MAX_BYTES.value),
+                float(AFSENV.DISK_CACHE_REVALIDATE_SECONDS.value),
+            )
+            if disk_cache_dir
+            else None
+        )
+
+    @property
+    def service_client(self) -> Any:
+        """第一次使用時建立 ShareServiceClient 與共用的 HTTP 連線池
+
+        Returns:
+            Any: ShareServiceClient
+        """
+        if self._service_client is None:
+            with self._lock:
+                if self._service_client is None:
+                    from azure.storage.fileshare import ShareServiceClient
+
+                    self._service_client = ShareServiceClient.from_connection_string(
+                        self.connection_string, transport=self._build_transport()
+                    )
+        return self._service_client
+
+    def _build_transport(self) -> Any:
+        """建立共用的 HTTP transport: keep-alive 連線池大小可調整, 重試由 Azure SDK 的 retry policy 處理
+
+        Returns:
+            Any: azure.core RequestsTransport
+        """
+        import requests
+        from azure.core.pipeline.transport import RequestsTransport
+        from urllib3.util.retry import Retry
+
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=Retry(total=False, redirect=False, raise_on_status=False),
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return RequestsTransport(
+            session=session,
+            session_owner=True,
+            connection_timeout=AFSENV.CONNECTION_TIMEOUT.value,
+            read_timeout=AFSENV.READ_TIMEOUT.value,
+        )
+
+    def get_share_client(self, share_name: Optional[str] = None) -> Any:
+        """取得 share client, 依名稱快取
+
+        Args:
+            share_name (Optional[str], optional): file share 名稱. Defaults to AFS_SHARE_NAME.
+
+        Returns:
+            Any: ShareClient
+        """
+        name = share_name or self.share_name or ""
+        share_client = self._share_clients.get(name)
+        if share_client is None:
+            service_client = self.service_client
+            with self._lock:
+                share_client = self._share_clients.get(name)
+                if share_client is None:
+                    share_client = service_client.get_share_client(name)
+                    self._share_clients[name] = share_client
+        return share_client
+
+    def get_directory_client(self, directory_path: str, share_name: Optional[str] = None) -> Any:
+        """取得 directory client, 依 (share, 路徑) 快取
+
+        Args:
+            directory_path (str): 目錄路徑, 空字串為 share 根目錄
+            share_name (Optional[str], optional): file share 名稱. Defaults to AFS_SHARE_NAME.
+
+        Returns:
+            Any: ShareDirectoryClient
+        """
+        share_client = self.get_share_client(share_name)
+        directory_path = directory_path.strip("/")
+        return self._directory_clients.get_or_load(
+            (share_client.share_name, directory_path),
+            lambda: share_client.get_directory_client(directory_path or None),
+        )
+
+    def get_file_client(self, file_path: str, share_name: Optional[str] = None) -> Any:
+        """取得 file client, 由快取的 directory client 建立
+
+        Args:
+            file_path (str): 檔案路徑
+            share_name (Optional[str], optional): file share 名稱. Defaults to AFS_SHARE_NAME.
+
+        Returns:
+            Any: ShareFileClient
+        """
+        directory_path, _, file_name = file_path.strip("/").rpartition("/")
+        return self.get_directory_client(directory_path, share_name).get_file_client(file_name)
 
     def upload_file(self, file_bytes: bytes, dest_file_path: str) -> None:
         """Upload a file to Azure File Storage.
@@ -22,25 +220,70 @@ class AzureFileStorageManager:
             file_bytes (bytes): The content of the file in bytes.
             dest_file_path (str): The destination path in Azure File Storage.
         """
-        file_client = ShareFileClient.from_connection_string(self.connection_string, self.share_name, dest_file_path)
-        file_client.upload_file(file_bytes)
+        with observe_duration(AFS_OPERATION_SECONDS, "upload_file"):
+            file_client = self.get_file_client(dest_file_path)
+            with self._updating_cache(file_client, dest_file_path, None, file_bytes):
+                self._upload_ranges(BytesIO(file_bytes), file_client, len(file_bytes))
 
     def download_file(self, file_path: str) -> bytes:
         """Download a file from Azure File Storage.
 
+        整個檔案放在記憶體, 大檔案請使用 iter_file 或 download_to_stream.
+        有磁碟快取時, 快取的檔案在確認間隔內直接由磁碟讀取, 超過間隔時先比對 ETag.
+
         Args:
             file_path (str): The path of the file in Azure File Storage.
 
         Returns:
             bytes: The content of the downloaded file.
         """
-        file_client = ShareFileClient.from_connection_string(self.connection_string, self.share_name, file_path)
+        with observe_duration(AFS_OPERATION_SECONDS, "download_file"):
+            file_client = self.get_file_client(file_path)
+            if self.disk_cache is None:
+                return b"".join(self._download_ranges(file_client))
+
+            entry, properties = self._cached_entry(self.disk_cache, file_client, file_path, None)
+            if entry is not None:
+                data = self.disk_cache.read(entry)
+                if data is not None:
+                    return data
+                properties = file_client.get_file_properties()
+            data = b"".join(self._download_ranges(file_client, size=properties.size))
+            if len(data) <= self.disk_cache.max_bytes:
+                self.disk_cache.write(self._cache_share_name(None), file_path, [data], properties.etag)
+            return data
+
+    def download_to_cache(self, file_path: str, share_name: Optional[str] = None) -> str:
+        """下載到磁碟快取 (已快取且未變更時不下載), 回傳本機檔案路徑
 
-        downloaded_file = file_client.download_file()
-        stream = BytesIO()
-        downloaded_file.readinto(stream)
+        不經過記憶體, 適合較大的檔案, 例如交給 FileResponse 由磁碟分段送出:
+
+            return FileResponse(get_afs_manager().download_to_cache(path))
+
+        Args:
+            file_path (str): 檔案路徑
+            share_name (Optional[str], optional): file share 名稱. Defaults to AFS_SHARE_NAME.
+
+        Raises:
+            RuntimeError: 未設定 AFS_DISK_CACHE_DIR
+
+        Returns:
+            str: 快取的本機檔案路徑
+        """
+        if self.disk_cache is None:
+            raise RuntimeError("AFS disk cache is disabled, set AFS_DISK_CACHE_DIR")
 
-        return stream.getvalue()
+        with observe_duration(AFS_OPERATION_SECONDS, "download_to_cache"):
+            file_client = self.get_file_client(file_path, share_name)
+            entry, properties = self._cached_entry(self.disk_cache, file_client, file_path, share_name)
+            if entry is None:
+                entry = self.disk_cache.write(
+                    self._cache_share_name(share_name),
+                    file_path,
+                    self._download_ranges(file_client, size=properties.size),
+                    properties.etag,
+                )
+            return entry.path
 
     def upload_image(self, local_image_path: str, dest_file_path: str, file_share: str) -> None:
         """Upload a QR code image to Azure file Storage.
@@ -51,7 +294,755 @@ class AzureFileStorageManager:
             file_share: azure file share name.
 
         """
-        file_client = ShareFileClient.from_connection_string(self.connection_string, file_share, dest_file_path)
-        source_file = open(local_image_path, "rb")
-        data = source_file.read()
-        file_client.upload_file(data)
+        with observe_duration(AFS_OPERATION_SECONDS, "upload_image"):
+            file_client = self.get_file_client(dest_file_path, file_share)
+            with self._updating_cache(file_client, dest_file_path, file_share):
+                with open(local_image_path, "rb") as source_file:
+                    self._upload_ranges(source_file, file_client)
+
+    def upload_stream(  # noqa: CFQ002
+        self,
+        stream: BinaryIO,
+        dest_file_path: str,
+        length: Optional[int] = None,
+        share_name: Optional[str] = None,
+        chunk_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+    ) -> int:
+        """由 file-like object 分段並行上傳, 記憶體用量約為 chunk_size x concurrency
+
+        Args:
+            stream (BinaryIO): 來源, 例如 UploadFile.file 或開啟的檔案
+            dest_file_path (str): 目的路徑
+            length (Optional[int], optional): 上傳的 bytes, 未指定時由可 seek 的 stream 計算. Defaults to None.
+            share_name (Optional[str], optional): file share 名稱. Defaults to AFS_SHARE_NAME.
+            chunk_size (Optional[int], optional): 每段 bytes. Defaults to AFS_CHUNK_SIZE.
+            concurrency (Optional[int], optional): 同時上傳的段數. Defaults to AFS_MAX_CONCURRENCY.
+
+        Returns:
+            int: 上傳的 bytes
+        """
+        with observe_duration(AFS_OPERATION_SECONDS, "upload_stream"):
+            file_client = self.get_file_client(dest_file_path, share_name)
+            with self._updating_cache(file_client, dest_file_path, share_name):
+                return self._upload_ranges(stream, file_client, length, chunk_size, concurrency)
+
+    async def upload_async_iterator(  # noqa: CFQ002
+        self,
+        chunks: AsyncIterator[bytes],
+        dest_file_path: str,
+        length: Optional[int] = None,
+        share_name: Optional[str] = None,
+        chunk_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+    ) -> int:
+        """由 async iterator (例如 request.stream()) 分段並行上傳, 不會把整個檔案放進記憶體
+
+        上傳在傳輸執行緒進行, 不會阻塞 event loop; 同時最多 concurrency 段在上傳, 超過時暫停讀取來源.
+
+        Args:
+            chunks (AsyncIterator[bytes]): 來源
+            dest_file_path (str): 目的路徑
+            length (Optional[int], optional): 總 bytes (例如 Content-Length), 未指定時邊上傳邊調整檔案大小.
+                Defaults to None.
+            share_name (Optional[str], optional): file share 名稱. Defaults to AFS_SHARE_NAME.
+            chunk_size (Optional[int], optional): 每段 bytes. Defaults to AFS_CHUNK_SIZE.
+            concurrency (Optional[int], optional): 同時上傳的段數. Defaults to AFS_MAX_CONCURRENCY.
+
+        Raises:
+            BaseException: 上傳失敗, 刪除檔案後重新拋出
+
+        Returns:
+            int: 上傳的 bytes
+        """
+        chunk_size = self._upload_chunk_size(chunk_size)
+        concurrency = concurrency or self.max_concurrency
+        loop = asyncio.get_running_loop()
+
+        with observe_duration(AFS_OPERATION_SECONDS, "upload_async_iterator"):
+            file_client = await loop.run_in_executor(self.executor, self.get_file_client, dest_file_path, share_name)
+            await loop.run_in_executor(self.executor, file_client.create_file, length or 0)
+
+            pending: Set[asyncio.Future] = set()
+            offset = 0
+            buffer = bytearray()
+
+            async def submit(data: bytes) -> None:
+                """上傳一段, 同時上傳的段數已滿時先等待
+
+                Args:
+                    data (bytes): 這一段的內容
+                """
+                nonlocal offset
+                while len(pending) >= concurrency:
+                    done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    # 其他已完成的段留在 pending, 失敗時一起取消並取回結果
+                    for future in done:
+                        pending.discard(future)
+                        future.result()
+                if length is None:
+                    await loop.run_in_executor(self.executor, file_client.resize_file, offset + len(data))
+                pending.add(loop.run_in_executor(self.executor, self._upload_range, file_client, data, offset))
+                offset += len(data)
+
+            try:
+                async for chunk in chunks:
+                    buffer += chunk
+                    while len(buffer) >= chunk_size:
+                        data = bytes(buffer[:chunk_size])
+                        del buffer[:chunk_size]
+                        await submit(data)
+                if buffer:
+                    await submit(bytes(buffer))
+                if pending:
+                    await asyncio.gather(*pending)
+            except BaseException:
+                for future in pending:
+                    future.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+                await loop.run_in_executor(self.executor, self._delete_incomplete, file_client)
+                raise
+            finally:
+                if self.disk_cache is not None:
+                    await loop.run_in_executor(
+                        self.executor, self.disk_cache.invalidate, self._cache_share_name(share_name), dest_file_path
+                    )
+        return offset
+
+    def iter_file(
+        self,
+        file_path: str,
+        share_name: Optional[str] = None,
+        chunk_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+    ) -> Iterator[bytes]:
+        """依序產生檔案內容, 同時預先下載後面幾段, 可直接交給 StreamingResponse
+
+            return StreamingResponse(get_afs_manager().iter_file(path), media_type="application/octet-stream")
+
+        Args:
+            file_path (str): 檔案路徑
+            share_name (Optional[str], optional): file share 名稱. Defaults to AFS_SHARE_NAME.
+            chunk_size (Optional[int], optional): 每段 bytes. Defaults to AFS_CHUNK_SIZE.
+            concurrency (Optional[int], optional): 同時下載的段數. Defaults to AFS_MAX_CONCURRENCY.
+
+        Yields:
+            bytes: 一段內容, 最大 chunk_size
+        """
+        with observe_duration(AFS_OPERATION_SECONDS, "iter_file"):
+            yield from self._download_ranges(self.get_file_client(file_path, share_name), chunk_size, concurrency)
+
+    def download_to_stream(  # noqa: CFQ002
+        self,
+        file_path: str,
+        stream: BinaryIO,
+        share_name: Optional[str] = None,
+        chunk_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+    ) -> int:
+        """分段並行下載並依序寫入 stream (例如本機檔案), 記憶體用量約為 chunk_size x concurrency
+
+        Args:
+            file_path (str): 檔案路徑
+            stream (BinaryIO): 目的 stream
+            share_name (Optional[str], optional): file share 名稱. Defaults to AFS_SHARE_NAME.
+            chunk_size (Optional[int], optional): 每段 bytes. Defaults to AFS_CHUNK_SIZE.
+            concurrency (Optional[int], optional): 同時下載的段數. Defaults to AFS_MAX_CONCURRENCY.
+
+        Returns:
+            int: 下載的 bytes
+        """
+        written = 0
+        with observe_duration(AFS_OPERATION_SECONDS, "download_to_stream"):
+            for chunk in self._download_ranges(self.get_file_client(file_path, share_name), chunk_size, concurrency):
+                stream.write(chunk)
+                written += len(chunk)
+        return written
+
+    def upload_files(  # noqa: CFQ002
+        self,
+        files: Iterable[Tuple[str, str]],
+        share_name: Optional[str] = None,
+        workers: Optional[int] = None,
+        retries: Optional[int] = None,
+        skip_unchanged: Optional[str] = "hash",
+    ) -> TransferReport:
+        """批次上傳多個本機檔案, 先建立需要的遠端目錄, 上傳時設定 Content-MD5 供之後比對
+
+        Args:
+            files (Iterable[Tuple[str, str]]): (本機路徑, AFS 路徑)
+            share_name (Optional[str], optional): file share 名稱. Defaults to AFS_SHARE_NAME.
+            workers (Optional[int], optional): 同時上傳的檔案數. Defaults to AFS_BULK_WORKERS.
+            retries (Optional[int], optional): 每個檔案失敗後最多重試次數. Defaults to AFS_BULK_RETRIES.
+            skip_unchanged (Optional[str], optional): 略過 AFS 上相同的檔案, size 只比對大小, hash 再比對
+                Content-MD5, None 為全部上傳. Defaults to "hash".
+
+        Returns:
+            TransferReport: 各檔案的結果與統計
+        """
+        check_skip_unchanged(skip_unchanged)
+        files = list(files)
+        transfers = [
+            (local_path, remote_path, partial(self._upload_one, local_path, remote_path, share_name, skip_unchanged))
+            for local_path, remote_path in files
+        ]
+        remote_paths = [remote_path for _, remote_path in files]
+        with observe_duration(AFS_OPERATION_SECONDS, "upload_files"):
+            return self._run_bulk(
+                transfers,
+                workers,
+                retries,
+                lambda executor: self._create_directories(remote_paths, share_name, executor),
+            )
+
+    def upload_directory(  # noqa: CFQ002
+        self,
+        local_directory: str,
+        remote_directory: str,
+        share_name: Optional[str] = None,
+        workers: Optional[int] = None,
+        retries: Optional[int] = None,
+        skip_unchanged: Optional[str] = "hash",
+    ) -> TransferReport:
+        """批次上傳整個本機目錄 (含子目錄), 目錄結構相同
+
+        Args:
+            local_directory (str): 本機目錄
+            remote_directory (str): AFS 目錄, 空字串為 share 根目錄
+            share_name (Optional[str], optional): file share 名稱. Defaults to AFS_SHARE_NAME.
+            workers (Optional[int], optional): 同時上傳的檔案數. Defaults to AFS_BULK_WORKERS.
+            retries (Optional[int], optional): 每個檔案失敗後最多重試次數. Defaults to AFS_BULK_RETRIES.
+            skip_unchanged (Optional[str], optional): 略過 AFS 上相同的檔案, 見 upload_files. Defaults to "hash".
+
+        Returns:
+            TransferReport: 各檔案的結果與統計
+        """
+        remote_directory = remote_directory.strip("/")
+        files = []
+        for directory, _, file_names in os.walk(local_directory):
+            relative_directory = os.path.relpath(directory, local_directory).replace(os.sep, "/")
+            for file_name in sorted(file_names):
+                relative_path = file_name if relative_directory == "." else f"{relative_directory}/{file_name}"
+                remote_path = f"{remote_directory}/{relative_path}" if remote_directory else relative_path
+                files.append((os.path.join(directory, file_name), remote_path))
+        return self.upload_files(files, share_name, workers, retries, skip_unchanged)
+
+    def download_files(  # noqa: CFQ002
+        self,
+        files: Iterable[Tuple[str, str]],
+        share_name: Optional[str] = None,
+        workers: Optional[int] = None,
+        retries: Optional[int] = None,
+        skip_unchanged: Optional[str] = "hash",
+    ) -> TransferReport:
+        """批次下載多個 AFS 檔案, 先寫入暫存檔, 完成後才取代本機檔案
+
+        Args:
+            files (Iterable[Tuple[str, str]]): (AFS 路徑, 本機路徑)
+            share_name (Optional[str], optional): file share 名稱. Defaults to AFS_SHARE_NAME.
+            workers (Optional[int], optional): 同時下載的檔案數. Defaults to AFS_BULK_WORKERS.
+            retries (Optional[int], optional): 每個檔案失敗後最多重試次數. Defaults to AFS_BULK_RETRIES.
+            skip_unchanged (Optional[str], optional): 略過本機已相同的檔案, size 只比對大小, hash 再比對
+                Content-MD5, None 為全部下載. Defaults to "hash".
+
+        Returns:
+            TransferReport: 各檔案的結果與統計
+        """
+        check_skip_unchanged(skip_unchanged)
+        transfers = [
+            (local_path, remote_path, partial(self._download_one, remote_path, local_path, share_name, skip_unchanged))
+            for remote_path, local_path in files
+        ]
+        with observe_duration(AFS_OPERATION_SECONDS, "download_files"):
+            return self._run_bulk(transfers, workers, retries)
+
+    def download_directory(  # noqa: CFQ002
+        self,
+        remote_directory: str,
+        local_directory: str,
+        share_name: Optional[str] = None,
+        workers: Optional[int] = None,
+        retries: Optional[int] = None,
+        skip_unchanged: Optional[str] = "hash",
+    ) -> TransferReport:
+        """批次下載整個 AFS 目錄 (含子目錄), 目錄結構相同
+
+        Args:
+            remote_directory (str): AFS 目錄, 空字串為 share 根目錄
+            local_directory (str): 本機目錄, 不存在時建立
+            share_name (Optional[str], optional): file share 名稱. Defaults to AFS_SHARE_NAME.
+            workers (Optional[int], optional): 同時下載的檔案數. Defaults to AFS_BULK_WORKERS.
+            retries (Optional[int], optional): 每個檔案失敗後最多重試次數. Defaults to AFS_BULK_RETRIES.
+            skip_unchanged (Optional[str], optional): 略過本機已相同的檔案, 見 download_files. Defaults to "hash".
+
+        Returns:
+            TransferReport: 各檔案的結果與統計
+        """
+        remote_directory = remote_directory.strip("/")
+        files = []
+        for remote_path in self._walk_directory(remote_directory, share_name):
+            relative_path = remote_path[len(remote_directory) :].lstrip("/")
+            files.append((remote_path, os.path.join(local_directory, *relative_path.split("/"))))
+        return self.download_files(files, share_name, workers, retries, skip_unchanged)
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """所有檔案共用的傳輸執行緒, 第一次使用時建立
+
+        Returns:
+            ThreadPoolExecutor: 傳輸執行緒
+        """
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.transfer_threads, thread_name_prefix="afs-transfer")
+        return self._executor
+
+    def _cache_share_name(self, share_name: Optional[str]) -> str:
+        """磁碟快取使用的 share 名稱, 與 get_share_client 的預設值相同
+
+        Args:
+            share_name (Optional[str]): 指定的 file share 名稱
+
+        Returns:
+            str: file share 名稱
+        """
+        return share_name or self.share_name or ""
+
+    def _cached_entry(
+        self, disk_cache: AFSDiskCache, file_client: Any, file_path: str, share_name: Optional[str]
+    ) -> Tuple[Optional[CacheEntry], Any]:
+        """查詢磁碟快取, 超過確認間隔時以 AFS 的檔案屬性比對 ETag
+
+        Args:
+            disk_cache (AFSDiskCache): 磁碟快取
+            file_client (Any): ShareFileClient
+            file_path (str): 檔案路徑
+            share_name (Optional[str]): file share 名稱
+
+        Returns:
+            Tuple[Optional[CacheEntry], Any]: 可以使用的快取檔案 (沒有時為 None), 與 AFS 的檔案屬性 (不需要詢問 AFS 時為 None)
+        """
+        properties = None
+
+        def remote_etag() -> Optional[str]:
+            """取得 AFS 檔案目前的 ETag
+
+            Returns:
+                Optional[str]: ETag
+            """
+            nonlocal properties
+            properties = file_client.get_file_properties()
+            return properties.etag
+
+        entry = disk_cache.get(self._cache_share_name(share_name), file_path, remote_etag)
+        if entry is None and properties is None:
+            properties = file_client.get_file_properties()
+        return entry, properties
+
+    @contextmanager
+    def _updating_cache(
+        self, file_client: Any, file_path: str, share_name: Optional[str], data: Optional[bytes] = None
+    ) -> Iterator[None]:
+        """上傳完成後更新磁碟快取: 有完整內容時寫入快取, 沒有內容或上傳失敗時刪除快取的檔案
+
+        Args:
+            file_client (Any): ShareFileClient
+            file_path (str): 檔案路徑
+            share_name (Optional[str]): file share 名稱
+            data (Optional[bytes], optional): 上傳的內容. Defaults to None.
+
+        Raises:
+            BaseException: 上傳失敗, 刪除快取的檔案後重新拋出
+        """
+        if self.disk_cache is None:
+            yield
+            return
+
+        cache_share_name = self._cache_share_name(share_name)
+        try:
+            yield
+        except BaseException:
+            self.disk_cache.invalidate(cache_share_name, file_path)
+            raise
+        if data is not None and len(data) <= self.disk_cache.max_bytes:
+            self.disk_cache.write(cache_share_name, file_path, [data], file_client.get_file_properties().etag)
+        else:
+            self.disk_cache.invalidate(cache_share_name, file_path)
+
+    def _upload_chunk_size(self, chunk_size: Optional[int]) -> int:
+        """上傳每段的 bytes, 不超過 Put Range 的上限
+
+        Args:
+            chunk_size (Optional[int]): 指定的 bytes
+
+        Returns:
+            int: 每段 bytes
+        """
+        return min(chunk_size or self.chunk_size, MAX_RANGE_SIZE)
+
+    @staticmethod
+    def _upload_range(file_client: Any, data: bytes, offset: int) -> None:
+        """上傳一段
+
+        Args:
+            file_client (Any): ShareFileClient
+            data (bytes): 內容
+            offset (int): 起始位置
+        """
+        file_client.upload_range(data, offset=offset, length=len(data))
+
+    def _upload_ranges(  # noqa: CFQ002
+        self,
+        stream: BinaryIO,
+        file_client: Any,
+        length: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        content_settings: Any = None,
+    ) -> int:
+        """建立檔案後依序讀取 stream, 最多 concurrency 段同時上傳, 失敗時刪除檔案後重新拋出
+
+        Args:
+            stream (BinaryIO): 來源
+            file_client (Any): ShareFileClient
+            length (Optional[int], optional): 上傳的 bytes, 未指定時由可 seek 的 stream 計算. Defaults to None.
+            chunk_size (Optional[int], optional): 每段 bytes. Defaults to AFS_CHUNK_SIZE.
+            concurrency (Optional[int], optional): 同時上傳的段數. Defaults to AFS_MAX_CONCURRENCY.
+            content_settings (Any, optional): 建立檔案時設定的 ContentSettings (例如 Content-MD5). Defaults to None.
+
+        Raises:
+            BaseException: 上傳失敗, 刪除檔案後重新拋出
+
+        Returns:
+            int: 上傳的 bytes
+        """
+        chunk_size = self._upload_chunk_size(chunk_size)
+        concurrency = concurrency or self.max_concurrency
+        if length is None and stream.seekable():
+            position = stream.tell()
+            length = stream.seek(0, os.SEEK_END) - position
+            stream.seek(position)
+        file_client.create_file(length or 0, content_settings=content_settings)
+
+        pending: Set[Future] = set()
+        offset = 0
+        try:
+            while length is None or offset < length:
+                data = stream.read(chunk_size if length is None else min(chunk_size, length - offset))
+                if not data:
+                    break
+                if len(pending) >= concurrency:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                if length is None:
+                    file_client.resize_file(offset + len(data))
+                pending.add(self.executor.submit(self._upload_range, file_client, data, offset))
+                offset += len(data)
+            for future in pending:
+                future.result()
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            # 等待已開始的段結束後再刪除, 不留下內容不完整的檔案
+            wait(pending)
+            self._delete_incomplete(file_client)
+            raise
+        return offset
+
+    @staticmethod
+    def _delete_incomplete(file_client: Any) -> None:
+        """上傳失敗時刪除已建立的檔案, create_file 已先建立指定大小的空檔案, 留著會被當成完整的檔案下載
+
+        Args:
+            file_client (Any): ShareFileClient
+        """
+        try:
+            file_client.delete_file()
+        except Exception as ex:
+            log.error(f"刪除上傳失敗的 AFS 檔案失敗: {ex!r}")
+
+    def _download_ranges(
+        self,
+        file_client: Any,
+        chunk_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        size: Optional[int] = None,
+    ) -> Iterator[bytes]:
+        """依序產生各段內容, 最多 concurrency 段同時下載 (含已下載但尚未取用的段)
+
+        未指定 size 時先下載第一段, 由回應的 Content-Range 取得檔案大小後再並行下載其餘的段,
+        不另外查詢檔案屬性, 小於 chunk_size 的檔案只需要一次往返.
+
+        Args:
+            file_client (Any): ShareFileClient
+            chunk_size (Optional[int], optional): 每段 bytes. Defaults to AFS_CHUNK_SIZE.
+            concurrency (Optional[int], optional): 同時下載的段數. Defaults to AFS_MAX_CONCURRENCY.
+            size (Optional[int], optional): 檔案 bytes, 未指定時由第一段的回應取得. Defaults to None.
+
+        Yields:
+            bytes: 一段內容
+        """
+        chunk_size = chunk_size or self.chunk_size
+        concurrency = concurrency or self.max_concurrency
+        first = b""
+        if size is None:
+            first, size = self._download_first_range(file_client, chunk_size)
+        offsets = iter(range(len(first), size, chunk_size))
+        pending: Deque[Future] = deque()
+        try:
+            for offset in itertools.islice(offsets, concurrency):
+                pending.append(self.executor.submit(self._download_range, file_client, offset, chunk_size))
+            if first:
+                yield first
+            while pending:
+                data = pending.popleft().result()
+                for offset in itertools.islice(offsets, 1):
+                    pending.append(self.executor.submit(self._download_range, file_client, offset, chunk_size))
+                yield data
+        finally:
+            # 呼叫端提前結束 (例如 client 中斷連線) 時不再下載後面的段
+            for future in pending:
+                future.cancel()
+
+    @staticmethod
+    def _download_first_range(file_client: Any, length: int) -> Tuple[bytes, int]:
+        """下載第一段, 並由回應取得檔案大小
+
+        Args:
+            file_client (Any): ShareFileClient
+            length (int): 最多 bytes
+
+        Raises:
+            HttpResponseError: 下載失敗
+
+        Returns:
+            Tuple[bytes, int]: (內容, 檔案 bytes)
+        """
+        from azure.core.exceptions import HttpResponseError
+
+        try:
+            downloader = file_client.download_file(offset=0, length=length)
+        except HttpResponseError as ex:
+            if not is_empty_file_range_error(ex):
+                raise
+            return b"", 0
+        return downloader.readall(), file_size_from_download(downloader)
+
+    @staticmethod
+    def _download_range(file_client: Any, offset: int, length: int) -> bytes:
+        """下載一段
+
+        Args:
+            file_client (Any): ShareFileClient
+            offset (int): 起始位置
+            length (int): 最多 bytes
+
+        Returns:
+            bytes: 內容
+        """
+        return file_client.download_file(offset=offset, length=length).readall()
+
+    def _run_bulk(
+        self,
+        transfers: Iterable[Tuple[str, str, Callable[[], Tuple[str, int]]]],
+        workers: Optional[int],
+        retries: Optional[int],
+        prepare: Optional[Callable[[ThreadPoolExecutor], None]] = None,
+    ) -> TransferReport:
+        """以獨立的執行緒 (與分段傳輸的執行緒分開, 避免互相等待) 同時傳輸多個檔案
+
+        Args:
+            transfers (Iterable[Tuple[str, str, Callable[[], Tuple[str, int]]]]): (本機路徑, AFS 路徑, 傳輸)
+            workers (Optional[int]): 同時傳輸的檔案數. Defaults to AFS_BULK_WORKERS.
+            retries (Optional[int]): 每個檔案失敗後最多重試次數. Defaults to AFS_BULK_RETRIES.
+            prepare (Optional[Callable[[ThreadPoolExecutor], None]], optional): 傳輸前的準備 (例如建立目錄).
+                Defaults to None.
+
+        Returns:
+            TransferReport: 各檔案的結果與統計
+        """
+        retries = self.bulk_retries if retries is None else retries
+        started_at = time.perf_counter()
+        with ThreadPoolExecutor(workers or self.bulk_workers, thread_name_prefix="afs-bulk") as executor:
+            if prepare is not None:
+                prepare(executor)
+            futures = [
+                executor.submit(with_retry, local_path, remote_path, transfer, retries, self.bulk_retry_backoff)
+                for local_path, remote_path, transfer in transfers
+            ]
+            results: List[TransferResult] = [future.result() for future in futures]
+        return TransferReport(results, time.perf_counter() - started_at)
+
+    def _create_directories(
+        self, file_paths: Iterable[str], share_name: Optional[str], executor: ThreadPoolExecutor
+    ) -> None:
+        """建立檔案所在的遠端目錄 (含上層目錄), 由上而下逐層並行建立, 已存在時略過
+
+        建立失敗時只記錄, 該目錄下的檔案會在上傳時失敗並列在結果中.
+
+        Args:
+            file_paths (Iterable[str]): AFS 檔案路徑
+            share_name (Optional[str]): file share 名稱
+            executor (ThreadPoolExecutor): 建立目錄的執行緒
+        """
+        from azure.core.exceptions import ResourceExistsError
+
+        directories: Set[str] = set()
+        for file_path in file_paths:
+            directory = file_path.strip("/").rpartition("/")[0]
+            while directory and directory not in directories:
+                directories.add(directory)
+                directory = directory.rpartition("/")[0]
+
+        def create(directory: str) -> None:
+            """建立一個目錄
+
+            Args:
+                directory (str): 目錄路徑
+            """
+            try:
+                self.get_directory_client(directory, share_name).create_directory()
+            except ResourceExistsError:
+                pass
+            except Exception as ex:
+                log.warning(f"AFS 建立目錄失敗 {directory}: {ex!r}")
+
+        for depth in sorted({directory.count("/") for directory in directories}):
+            list(executor.map(create, sorted(directory for directory in directories if directory.count("/") == depth)))
+
+    def _walk_directory(self, directory: str, share_name: Optional[str]) -> Iterator[str]:
+        """列出目錄下 (含子目錄) 所有檔案
+
+        Args:
+            directory (str): AFS 目錄, 空字串為 share 根目錄
+            share_name (Optional[str]): file share 名稱
+
+        Yields:
+            str: AFS 檔案路徑
+        """
+        pending = [directory]
+        while pending:
+            directory = pending.pop()
+            for item in self.get_directory_client(directory, share_name).list_directories_and_files():
+                path = f"{directory}/{item.name}" if directory else item.name
+                if item.is_directory:
+                    pending.append(path)
+                else:
+                    yield path
+
+    def _upload_one(
+        self, local_path: str, remote_path: str, share_name: Optional[str], skip_unchanged: Optional[str]
+    ) -> Tuple[str, int]:
+        """上傳一個本機檔案並設定 Content-MD5, AFS 上已相同時略過
+
+        Args:
+            local_path (str): 本機檔案路徑
+            remote_path (str): AFS 檔案路徑
+            share_name (Optional[str]): file share 名稱
+            skip_unchanged (Optional[str]): size / hash, None 為不略過
+
+        Returns:
+            Tuple[str, int]: (transferred / skipped, 上傳的 bytes)
+        """
+        from azure.core.exceptions import ResourceNotFoundError
+        from azure.storage.fileshare import ContentSettings
+
+        file_client = self.get_file_client(remote_path, share_name)
+        size = os.path.getsize(local_path)
+        md5 = file_md5(local_path)
+        if skip_unchanged is not None:
+            try:
+                if is_unchanged(skip_unchanged, size, lambda: md5, file_client.get_file_properties()):
+                    return "skipped", 0
+            except ResourceNotFoundError:
+                pass
+
+        with self._updating_cache(file_client, remote_path, share_name):
+            with open(local_path, "rb") as source_file:
+                uploaded = self._upload_ranges(
+                    source_file, file_client, size, content_settings=ContentSettings(content_md5=bytearray(md5))
+                )
+        return "transferred", uploaded
+
+    def _download_one(
+        self, remote_path: str, local_path: str, share_name: Optional[str], skip_unchanged: Optional[str]
+    ) -> Tuple[str, int]:
+        """下載一個 AFS 檔案, 本機已相同時略過
+
+        Args:
+            remote_path (str): AFS 檔案路徑
+            local_path (str): 本機檔案路徑
+            share_name (Optional[str]): file share 名稱
+            skip_unchanged (Optional[str]): size / hash, None 為不略過
+
+        Raises:
+            BaseException: 下載失敗, 刪除暫存檔後重新拋出
+
+        Returns:
+            Tuple[str, int]: (transferred / skipped, 下載的 bytes)
+        """
+        file_client = self.get_file_client(remote_path, share_name)
+        properties = file_client.get_file_properties()
+        if (
+            skip_unchanged is not None
+            and os.path.isfile(local_path)
+            and is_unchanged(skip_unchanged, os.path.getsize(local_path), lambda: file_md5(local_path), properties)
+        ):
+            return "skipped", 0
+
+        directory = os.path.dirname(local_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temporary_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(local_path)}.")
+        downloaded = 0
+        try:
+            with os.fdopen(descriptor, "wb") as target_file:
+                for chunk in self._download_ranges(file_client, size=properties.size):
+                    target_file.write(chunk)
+                    downloaded += len(chunk)
+            os.replace(temporary_path, local_path)
+        except BaseException:
+            with suppress(OSError):
+                os.unlink(temporary_path)
+            raise
+        return "transferred", downloaded
+
+    def close(self) -> None:
+        """等待傳輸中的段完成後關閉傳輸執行緒與共用的 HTTP 連線池"""
+        with self._lock:
+            service_client, self._service_client = self._service_client, None
+            executor, self._executor = self._executor, None
+            self._share_clients.clear()
+            self._directory_clients.clear()
+        if executor is not None:
+            executor.shutdown(wait=True)
+        if service_client is not None:
+            service_client.close()
+
+
+_afs_manager: Optional[AzureFileStorageManager] = None
+_afs_manager_lock = threading.Lock()
+
+
+def get_afs_manager() -> AzureFileStorageManager:
+    """取得整個 app 共用的 AzureFileStorageManager
+
+    Returns:
+        AzureFileStorageManager: AFS manager
+    """
+    global _afs_manager
+    if _afs_manager is None:
+        with _afs_manager_lock:
+            if _afs_manager is None:
+                _afs_manager = AzureFileStorageManager()
+    return _afs_manager
+
+
+def close_afs_manager() -> None:
+    """關閉共用的 AzureFileStorageManager (app 結束時), 未使用過時不做任何事"""
+    global _afs_manager
+    with _afs_manager_lock:
+        manager, _afs_manager = _afs_manager, None
+    if manager is not None:
+        manager.close()
@@ -0,0 +1,291 @@
+"""Dedicated per-database thread pools for running blocking pyodbc calls from async code."""
+
+import asyncio
+import pyodbc
+import threading
+import time
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, MutableMapping, TypeVar
+from app import log
+from app.config.database import DBENV
+from app.logic.core.metrics import REGISTRY, MetricFamily, Sample
+
+T = TypeVar("T")
+
+
+class ExecutorBusyError(pyodbc.Error):
+    """Raised when the wait queue of a DB executor stays full for longer than the queue timeout."""
+
+
+class DBExecutor:
+    """A size-limited thread pool with a bounded wait queue for one database.
+
+    At most ``max_workers`` calls run at once and at most ``max_queue`` more wait inside the pool. Further callers are
+    suspended (without blocking the event loop) until a slot frees up, and are rejected with ``ExecutorBusyError``
+    after ``queue_timeout`` seconds. Queue-wait time (from the call to the start in a worker thread) and execution
+    time are measured separately.
+    """
+
+    def __init__(
+        self,
+        database: str,
+        max_workers: int = int(DBENV.DB_EXECUTOR_MAX_WORKERS.value),
+        max_queue: int = int(DBENV.DB_EXECUTOR_MAX_QUEUE.value),
+        queue_timeout: float = float(DBENV.DB_EXECUTOR_QUEUE_TIMEOUT.value),
+    ) -> None:
+        """Initialize the executor; threads are started on demand.
+
+        Args:
+            database (str): The database name, used for thread names and logs.
+            max_workers (int): Number of worker threads.
+            max_queue (int): Number of calls allowed to wait for a worker thread.
+            queue_timeout (float): Seconds a caller may wait for a queue slot before being rejected.
+
+        Raises:
+            ValueError: Invalid executor size.
+        """
+        if max_workers < 1 or max_queue < 0:
+            raise ValueError(f"Invalid executor size for {database}: workers={max_workers}, queue={max_queue}")
+
+        self.database = database
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"db-{database}")
+        # asyncio.Semaphore 綁定 event loop, 每個 loop 各自一份(正式環境每個 worker 只有一個 loop)
+        self._slots: MutableMapping[asyncio.AbstractEventLoop, asyncio.Semaphore] = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+        self._pending = 0
+        self._calls = 0
+        self._rejected = 0
+        self._queue_wait_total = 0.0
+        self._queue_wait_max = 0.0
+        self._execution_total = 0.0
+        self._execution_max = 0.0
+
+    def _get_slots(self, loop: asyncio.AbstractEventLoop) -> asyncio.Semaphore:
+        """Get the slot semaphore of an event loop.
+
+        Args:
+            loop (asyncio.AbstractEventLoop): The running event loop.
+
+        Returns:
+            asyncio.Semaphore: Semaphore sized ``max_workers + max_queue``.
+        """
+        slots = self._slots.get(loop)
+        if slots is None:
+            slots = asyncio.Semaphore(self.max_workers + self.max_queue)
+            self._slots[loop] = slots
+        return slots
+
+    def _record(self, queue_wait: float, execution: float) -> None:
+        """Add one finished call to the stats.
+
+        Args:
+            queue_wait (float): Seconds spent waiting for a worker thread.
+            execution (float): Seconds spent running in the worker thread.
+        """
+        with self._lock:
+            self._calls += 1
+            self._queue_wait_total += queue_wait
+            self._queue_wait_max = max(self._queue_wait_max, queue_wait)
+            self._execution_total += execution
+            self._execution_max = max(self._execution_max, execution)
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        """Run a blocking function on this database's worker threads.
+
+        Args:
+            func (Callable[..., T]): The blocking function.
+            args (Any): Positional arguments for ``func``.
+
+        Returns:
+            T: The return value of ``func``.
+
+        Raises:
+            ExecutorBusyError: No queue slot became free within ``queue_timeout`` seconds.
+            BaseException: The call could not be submitted (e.g. after ``shutdown``); the slot is released first.
+        """
+        loop = asyncio.get_running_loop()
+        slots = self._get_slots(loop)
+        submitted_at = time.perf_counter()
+
+        try:
+            await asyncio.wait_for(slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._rejected += 1
+            raise ExecutorBusyError(
+                f"DB executor for {self.database} is busy: {self.max_workers} running, {self.max_queue} queued"
+            )
+
+        timing: Dict[str, float] = {}
+
+        def job() -> T:
+            """Run ``func`` in a worker thread and time it.
+
+            Returns:
+                T: The return value of ``func``.
+            """
+            started_at = time.perf_counter()
+            timing["queue_wait"] = started_at - submitted_at
+            try:
+                return func(*args)
+            finally:
+                timing["execution"] = time.perf_counter() - started_at
+
+        def on_done(_: Future) -> None:
+            """Free the slot once the worker thread has really finished.
+
+            Args:
+                _ (Future): The finished future.
+            """
+            with self._lock:
+                self._pending -= 1
+            if "execution" in timing:
+                self._record(timing["queue_wait"], timing["execution"])
+            # 呼叫端被取消時執行緒仍在跑, 所以不在 await 結束時釋放名額
+            try:
+                loop.call_soon_threadsafe(slots.release)
+            except RuntimeError:
+                pass
+
+        with self._lock:
+            self._pending += 1
+        try:
+            future = self._executor.submit(job)
+        except BaseException:
+            # 例如 shutdown 之後 (lifespan 結束時) 才送出, on_done 不會執行, 在這裡歸還名額
+            with self._lock:
+                self._pending -= 1
+            slots.release()
+            raise
+        future.add_done_callback(on_done)
+        result = await asyncio.wrap_future(future)
+
+        log.debug(
+            "DB executor [%s] %s queue_wait=%.2fms execution=%.2fms",
+            self.database,
+            getattr(func, "__name__", func),
+            timing["queue_wait"] * 1000,
+            timing["execution"] * 1000,
+        )
+        return result
+
+    def shutdown(self) -> None:
+        """Stop accepting work and wait for running calls to finish."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self) -> dict:
+        """Snapshot of the executor usage.
+
+        Returns:
+            dict: Call counts and queue-wait / execution time statistics (seconds).
+        """
+        with self._lock:
+            return {
+                "database": self.database,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "pending": self._pending,
+                "calls": self._calls,
+                "rejected": self._rejected,
+                "queue_wait_total": self._queue_wait_total,
+                "queue_wait_avg": self._queue_wait_total / self._calls if self._calls else 0.0,
+                "queue_wait_max": self._queue_wait_max,
+                "execution_total": self._execution_total,
+                "execution_avg": self._execution_total / self._calls if self._calls else 0.0,
+                "execution_max": self._execution_max,
+            }
+
+
+_executors: Dict[str, DBExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(database: str = DBENV.DB_DATABASE.value) -> DBExecutor:
+    """
+    Get the executor of a database, creating it on first use.
+
+    Args:
+        database (str): The database name.
+
+    Returns:
+        DBExecutor: The executor shared by every caller of this process.
+    """
+    executor = _executors.get(database)
+    if executor is None:
+        with _executors_lock:
+            executor = _executors.get(database)
+            if executor is None:
+                executor = DBExecutor(database)
+                _executors[database] = executor
+    return executor
+
+
+async def run_in_db_executor(database: str, func: Callable[..., T], *args: Any) -> T:
+    """
+    Run a blocking DB function on the executor of a database.
+
+    Args:
+        database (str): The database name.
+        func (Callable[..., T]): The blocking function.
+        args (Any): Positional arguments for ``func``.
+
+    Returns:
+        T: The return value of ``func``.
+    """
+    return await get_executor(database).run(func, *args)
+
+
+def shutdown_executors() -> None:
+    """Shut down every executor, used at shutdown."""
+    with _executors_lock:
+        executors = list(_executors.values())
+        _executors.clear()
+
+    for executor in executors:
+        executor.shutdown()
+
+
+def executor_stats() -> Dict[str, dict]:
+    """
+    Stats of every executor.
+
+    Returns:
+        Dict[str, dict]: Executor stats by database name.
+    """
+    return {database: executor.stats() for database, executor in list(_executors.items())}
+
+
+@REGISTRY.register_collector
+def collect_executor_metrics() -> List[MetricFamily]:
+    """
+    Build the executor gauges and counters for ``/metrics``, read from the executor stats at scrape time.
+
+    Returns:
+        List[MetricFamily]: Executor metrics labelled by database.
+    """
+    stats = executor_stats()
+    return [
+        MetricFamily(
+            "db_executor_pending",
+            "gauge",
+            "DB calls running or queued on the executor.",
+            [Sample("", {"database": database}, executor["pending"]) for database, executor in stats.items()],
+        ),
+        MetricFamily(
+            "db_executor_rejected_total",
+            "counter",
+            "DB calls rejected because the executor queue was full.",
+            [Sample("", {"database": database}, executor["rejected"]) for database, executor in stats.items()],
+        ),
+        MetricFamily(
+            "db_executor_queue_wait_seconds_total",
+            "counter",
+            "Time DB calls spent waiting for a worker thread.",
+            [Sample("", {"database": database}, executor["queue_wait_total"]) for database, executor in stats.items()],
+        ),
+    ]
@@ -1,8 +1,14 @@
 """PYODBC DB Manager."""
 
+from app import log
 from app.config.database import DBENV
+from app.logic.core.metrics import REGISTRY, MetricFamily, Sample
 import pyodbc
+import threading
+import time
+from collections import deque
 from contextlib import contextmanager
+from typing import Deque, Dict, Iterable, Iterator, List, Optional
 
 
 def create_connection_string(
@@ -31,9 +37,449 @@ def create_connection_string(
     )
 
 
-def create_connection(database: str = DBENV.DB_DATABASE.value) -> pyodbc.Connection:
+class PoolTimeoutError(pyodbc.Error):
+    """Raised when no pooled connection becomes available within the pool timeout."""
+
+
+class _PooledConnection:
+    """A physical connection plus the bookkeeping the pool needs."""
+
+    __slots__ = ("connection", "created_at", "last_used_at")
+
+    def __init__(self, connection: pyodbc.Connection) -> None:
+        """Wrap a freshly opened connection.
+
+        Args:
+            connection (pyodbc.Connection): The physical connection.
+        """
+        now = time.monotonic()
+        self.connection = connection
+        self.created_at = now
+        self.last_used_at = now
+
+
+class ConnectionPool:
+    """A bounded pool of pyodbc connections for a single database.
+
+    Connections are opened lazily up to ``max_size``. A checkout reuses the most recently returned idle connection,
+    discards connections past ``max_lifetime``, and runs a ``SELECT 1`` only when the connection
+    has been idle longer than ``ping_interval``, so a hot connection costs no extra round trip.
+
+    Attributes:
+        REAP_INTERVAL: 歸還連線時, 檢查並關閉閒置過久連線的最短間隔(秒)
     """
-    Create a database connection.
+
+    REAP_INTERVAL = 10.0
+
+    def __init__(  # noqa: CFQ002
+        self,
+        database: str,
+        min_size: int = int(DBENV.DB_POOL_MIN_SIZE.value),
+        max_size: int = int(DBENV.DB_POOL_MAX_SIZE.value),
+        timeout: float = float(DBENV.DB_POOL_TIMEOUT.value),
+        max_lifetime: float = float(DBENV.DB_POOL_MAX_LIFETIME.value),
+        idle_timeout: float = float(DBENV.DB_POOL_IDLE_TIMEOUT.value),
+        ping_interval: float = float(DBENV.DB_POOL_PING_INTERVAL.value),
+    ) -> None:
+        """Initialize the pool without opening any connection.
+
+        Args:
+            database (str): The database name.
+            min_size (int): Connections kept open by ``warm_up`` and never reaped for idleness.
+            max_size (int): Upper bound of open connections (in use + idle).
+            timeout (float): Seconds to wait for a free connection before raising ``PoolTimeoutError``.
+            max_lifetime (float): Seconds after which a connection is closed instead of reused.
+            idle_timeout (float): Seconds an idle connection may sit in the pool before it is closed.
+            ping_interval (float): Idle seconds after which a connection is pinged on checkout.
+
+        Raises:
+            ValueError: Invalid pool size.
+        """
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError(f"Invalid pool size for {database}: min={min_size}, max={max_size}")
+
+        self.database = database
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.idle_timeout = idle_timeout
+        self.ping_interval = ping_interval
+        self.connection_string = create_connection_string(database=database)
+
+        self._idle: Deque[_PooledConnection] = deque()
+        self._in_use: Dict[int, _PooledConnection] = {}
+        self._opening = 0
+        self._closed = False
+        self._condition = threading.Condition(threading.Lock())
+
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._timeouts = 0
+        self._opened = 0
+        self._discarded = 0
+        self._last_reap_at = time.monotonic()
+
+    def _open(self) -> _PooledConnection:
+        """Open a new physical connection.
+
+        Returns:
+            _PooledConnection: The new pooled connection.
+        """
+        return _PooledConnection(pyodbc.connect(self.connection_string))
+
+    def _close(self, pooled: _PooledConnection) -> None:
+        """Close a physical connection, ignoring errors from an already broken link.
+
+        Args:
+            pooled (_PooledConnection): The connection to close.
+        """
+        try:
+            pooled.connection.close()
+        except pyodbc.Error:
+            pass
+
+    def _collect_expired(self, now: float) -> List[_PooledConnection]:
+        """Remove idle connections past their idle timeout or lifetime, keeping at least ``min_size`` open.
+
+        Must be called with the pool lock held; the caller closes the returned connections outside the lock.
+
+        Args:
+            now (float): Current monotonic time.
+
+        Returns:
+            List[_PooledConnection]: The removed connections.
+        """
+        self._last_reap_at = now
+        expired = []
+        keep: Deque[_PooledConnection] = deque()
+        total = len(self._idle) + len(self._in_use) + self._opening
+        # 最舊的在左側, 先淘汰
+        for pooled in self._idle:
+            too_old = self.max_lifetime > 0 and now - pooled.created_at >= self.max_lifetime
+            too_idle = self.idle_timeout > 0 and now - pooled.last_used_at >= self.idle_timeout
+            if too_old or (too_idle and total > self.min_size):
+                expired.append(pooled)
+                total -= 1
+            else:
+                keep.append(pooled)
+        self._idle = keep
+        self._discarded += len(expired)
+        return expired
+
+    def _is_alive(self, pooled: _PooledConnection, now: float) -> bool:
+        """Cheap liveness check, only pinging connections that have been idle for a while.
+
+        Args:
+            pooled (_PooledConnection): The connection to check.
+            now (float): Current monotonic time.
+
+        Returns:
+            bool: True if the connection looks usable.
+        """
+        if pooled.connection.closed:
+            return False
+        if now - pooled.last_used_at < self.ping_interval:
+            return True
+        try:
+            cursor = pooled.connection.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except pyodbc.Error:
+            return False
+
+    def acquire(self) -> pyodbc.Connection:
+        """Borrow a connection, opening a new one while below ``max_size``.
+
+        Returns:
+            pyodbc.Connection: A usable connection; give it back with ``release``.
+
+        Raises:
+            PoolTimeoutError: No connection became available within ``timeout`` seconds.
+            Error: The pool is closed.
+        """
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+
+        while True:
+            candidate: Optional[_PooledConnection] = None
+            with self._condition:
+                while True:
+                    if self._closed:
+                        raise pyodbc.Error(f"Connection pool for {self.database} is closed")
+                    if self._idle:
+                        candidate = self._idle.pop()
+                        break
+                    if len(self._in_use) + self._opening < self.max_size:
+                        self._opening += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeoutError(
+                            f"Timed out after {self.timeout}s waiting for a connection to {self.database}"
+                        )
+                    waited = True
+                    self._condition.wait(remaining)
+
+            now = time.monotonic()
+            if candidate is None:
+                candidate = self._open_reserved()
+            elif (
+                self.max_lifetime > 0 and now - candidate.created_at >= self.max_lifetime
+            ) or not self._is_alive(candidate, now):
+                self._discard(candidate)
+                continue
+
+            wait_time = now - started
+            with self._condition:
+                self._in_use[id(candidate.connection)] = candidate
+                self._checkouts += 1
+                if waited:
+                    self._waits += 1
+                self._wait_time_total += wait_time
+                self._wait_time_max = max(self._wait_time_max, wait_time)
+            return candidate.connection
+
+    def _open_reserved(self) -> _PooledConnection:
+        """Open a connection for a slot already reserved through ``_opening``.
+
+        Returns:
+            _PooledConnection: The new pooled connection.
+        """
+        try:
+            pooled = self._open()
+        finally:
+            with self._condition:
+                self._opening -= 1
+                self._condition.notify()
+        with self._condition:
+            self._opened += 1
+        return pooled
+
+    def _discard(self, pooled: _PooledConnection) -> None:
+        """Close a connection that will not come back to the pool and wake up a waiter.
+
+        Args:
+            pooled (_PooledConnection): The connection to close.
+        """
+        self._close(pooled)
+        with self._condition:
+            self._discarded += 1
+            self._condition.notify()
+
+    def release(self, connection: pyodbc.Connection, discard: bool = False) -> None:
+        """Give a borrowed connection back to the pool.
+
+        Args:
+            connection (pyodbc.Connection): The connection obtained from ``acquire``.
+            discard (bool): Close the connection instead of reusing it, e.g. after a failed rollback.
+        """
+        expired: List[_PooledConnection] = []
+        with self._condition:
+            pooled = self._in_use.pop(id(connection), None)
+            if pooled is None:
+                return
+            now = time.monotonic()
+            pooled.last_used_at = now
+            keep = not (discard or self._closed or connection.closed)
+            if keep and self.max_lifetime > 0 and now - pooled.created_at >= self.max_lifetime:
+                keep = False
+            if keep:
+                self._idle.append(pooled)
+            else:
+                self._discarded += 1
+            if now - self._last_reap_at >= self.REAP_INTERVAL:
+                expired = self._collect_expired(now)
+            self._condition.notify()
+
+        if not keep:
+            self._close(pooled)
+        for stale in expired:
+            self._close(stale)
+
+    def warm_up(self) -> None:
+        """Open connections until ``min_size`` are open, so the first requests skip the login handshake."""
+        with self._condition:
+            missing = max(self.min_size - len(self._idle) - len(self._in_use) - self._opening, 0)
+            self._opening += missing
+
+        opened = []
+        try:
+            for _ in range(missing):
+                opened.append(self._open())
+        finally:
+            with self._condition:
+                self._opening -= missing
+                self._opened += len(opened)
+                self._idle.extend(opened)
+                self._condition.notify_all()
+
+    def reap(self) -> None:
+        """Close idle connections past their idle timeout or lifetime, keeping at least ``min_size`` open."""
+        with self._condition:
+            expired = self._collect_expired(time.monotonic())
+
+        for pooled in expired:
+            self._close(pooled)
+
+    def close(self) -> None:
+        """Close all idle connections and refuse further checkouts; borrowed ones are closed on release."""
+        with self._condition:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._discarded += len(idle)
+            self._condition.notify_all()
+
+        for pooled in idle:
+            self._close(pooled)
+
+    def stats(self) -> dict:
+        """Snapshot of the pool usage.
+
+        Returns:
+            dict: Pool size, in-use / idle counts and checkout wait statistics (seconds).
+        """
+        with self._condition:
+            return {
+                "database": self.database,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "in_use": len(self._in_use),
+                "idle": len(self._idle),
+                "opening": self._opening,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "wait_time_total": self._wait_time_total,
+                "wait_time_avg": self._wait_time_total / self._checkouts if self._checkouts else 0.0,
+                "wait_time_max": self._wait_time_max,
+                "opened": self._opened,
+                "discarded": self._discarded,
+            }
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(database: str = DBENV.DB_DATABASE.value) -> ConnectionPool:
+    """
+    Get the connection pool of a database, creating it on first use.
+
+    Args:
+        database (str): The database name.
+
+    Returns:
+        ConnectionPool: The pool shared by every caller of this process.
+    """
+    pool = _pools.get(database)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(database)
+            if pool is None:
+                pool = ConnectionPool(database)
+                _pools[database] = pool
+    return pool
+
+
+def warm_up_pools(databases: Iterable[str]) -> None:
+    """
+    Open ``DB_POOL_MIN_SIZE`` connections for each database at startup.
+
+    A database that cannot be reached is logged and skipped, so the app still starts and connects on demand.
+
+    Args:
+        databases (Iterable[str]): The database names.
+    """
+    for database in dict.fromkeys(databases):
+        try:
+            get_pool(database).warm_up()
+        except pyodbc.Error as ex:
+            log.critical(f"DB connection pool warm-up failed [{database}]: {ex}")
+
+
+def reap_pools() -> None:
+    """Close idle or expired connections in every pool."""
+    for pool in list(_pools.values()):
+        pool.reap()
+
+
+def close_pools() -> None:
+    """Close every pool, used at shutdown."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+
+    for pool in pools:
+        pool.close()
+
+
+def pool_stats() -> Dict[str, dict]:
+    """
+    Stats of every pool.
+
+    Returns:
+        Dict[str, dict]: Pool stats by database name.
+    """
+    return {database: pool.stats() for database, pool in list(_pools.items())}
+
+
+@REGISTRY.register_collector
+def collect_pool_metrics() -> List[MetricFamily]:
+    """
+    Build the connection pool gauges and counters for ``/metrics``, read from the pool stats at scrape time.
+
+    Returns:
+        List[MetricFamily]: Pool metrics labelled by database.
+    """
+    stats = pool_stats()
+    connections = [
+        Sample("", {"database": database, "state": state}, pool[state])
+        for database, pool in stats.items()
+        for state in ("in_use", "idle", "opening")
+    ]
+    return [
+        MetricFamily("db_pool_connections", "gauge", "Pooled DB connections by state.", connections),
+        MetricFamily(
+            "db_pool_max_connections",
+            "gauge",
+            "Maximum size of the DB connection pool.",
+            [Sample("", {"database": database}, pool["max_size"]) for database, pool in stats.items()],
+        ),
+        MetricFamily(
+            "db_pool_checkouts_total",
+            "counter",
+            "DB connections handed out by the pool.",
+            [Sample("", {"database": database}, pool["checkouts"]) for database, pool in stats.items()],
+        ),
+        MetricFamily(
+            "db_pool_checkout_timeouts_total",
+            "counter",
+            "Checkouts that timed out waiting for a free connection.",
+            [Sample("", {"database": database}, pool["timeouts"]) for database, pool in stats.items()],
+        ),
+        MetricFamily(
+            "db_pool_checkout_wait_seconds_total",
+            "counter",
+            "Time spent waiting for a free connection.",
+            [Sample("", {"database": database}, pool["wait_time_total"]) for database, pool in stats.items()],
+        ),
+    ]
+
+
+def create_connection(database: str = DBENV.DB_DATABASE.value) -> Iterator[pyodbc.Connection]:
+    """
+    Borrow a database connection from the pool.
+
+    Commits when the caller finishes normally and rolls back on any error before the connection goes back to the pool,
+    so no open transaction leaks to the next borrower.
 
     Args:
         database (str): The database name.
@@ -44,26 +490,28 @@ def create_connection(database: str = DBENV.DB_DATABASE.value) -> pyodbc.Connect
     Raises:
         ex (pyodbc.Error): An error occurred while creating the connection.
     """
-    connection_string = create_connection_string(database=database)
-    conn = None
+    pool = get_pool(database)
+    conn = pool.acquire()
+    discard = False
     try:
-        conn = pyodbc.connect(connection_string)
         yield conn
         conn.commit()
-    except pyodbc.Error as ex:
-        if conn:
+    except BaseException as ex:
+        try:
             conn.rollback()
-        print(f"An error occurred: {ex}")
+        except pyodbc.Error:
+            discard = True
+        if isinstance(ex, pyodbc.Error):
+            print(f"An error occurred: {ex}")
         raise ex
     finally:
-        if conn:
-            conn.close()
+        pool.release(conn, discard=discard)
 
 
 @contextmanager
-def use_with_create_connection(database: str = DBENV.DB_DATABASE.value) -> pyodbc.Connection:
+def use_with_create_connection(database: str = DBENV.DB_DATABASE.value) -> Iterator[pyodbc.Connection]:
     """
-    Context manager for creating a database connection and using it.
+    Context manager for borrowing a pooled database connection and using it.
 
     Args:
         database (str): The database name.
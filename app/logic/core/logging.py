@@ -1,108 +1,351 @@
 from app import log
+from app.config.log_policy import APILogPolicyMapping, LogPolicy
+import base64
 import time
+import random
+import queue
+import threading
+import weakref
+from starlette.datastructures import Headers
 from starlette.requests import Request
-from starlette.responses import Response
-from typing import Callable
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from typing import Any, List, Mapping, Optional
+from functools import lru_cache
+import orjson
 import os
 import logging
+import logging.handlers
 from colorlog import ColoredFormatter
+from app.logic.core.metrics import REGISTRY, MetricFamily, Sample
+
+# APILog 重播記錄, 預設關閉, 在 logging_config.json 將 api_capture 設為 INFO 開啟
+capture_log = logging.getLogger("api_capture")
+CAPTURE_AUTH_HEADERS = frozenset({"authorization", "cookie"})
+CAPTURE_SKIP_HEADERS = frozenset({"host", "content-length", "connection"})
 
 
 class APILog:
     """
-    專門處理API Log 的 class (Middleware).
+    專門處理API Log 的 class (pure ASGI Middleware).
+
+    request / response 的內容邊傳遞邊複製, 只保留前 max_body_size bytes 作為 log,
+    其餘原封不動地往下傳, 所以 StreamingResponse 與檔案下載仍然是串流.
+    request body 只會記錄 API 實際讀取到的部分.
+
+    每個路由依 APILogPolicyMapping 決定是否記錄、是否複製 body 與抽樣比例;
+    logger 未開啟 DEBUG、或該次請求未被抽中時, 不複製 body 也不組 log 內容.
+
+    api_capture logger 開啟 INFO 時, 另外將每個 request 以 JSONL 寫入 (見 logging_config.json),
+    可用 python -m app.benchmark.replay 重播. Authorization 與 Cookie 不會寫入, 只記錄是否需要登入;
+    capture_body 關閉的路由 (例如登入) 不寫入 body.
 
     Attributes:
-        LOG_MAX_BODY_SIZE: log body 的最大長度
+        CAPTURE_MAX_BODY_SIZE: 重播記錄保留的 request body 上限, 超過時不保留 body
     """
 
-    LOG_MAX_BODY_SIZE = 1000
+    CAPTURE_MAX_BODY_SIZE = 65536
+
+    def __init__(self, app: ASGIApp) -> None:
+        """Init.
 
-    def __init__(self) -> None:
-        """Init."""
-        pass
+        Args:
+            app (ASGIApp): 下一層的 ASGI app
+        """
+        self.app = app
 
-    async def __call__(self, request: Request, call_next: Callable[[Request], Response]) -> Response:
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:  # noqa: CFQ001
         """
-        提供給 middleware 的 callback 函式.
+        ASGI 進入點.
 
         Args:
-            request: Starlette 框架的請求對象，包含請求的詳細信息
-            call_next: 下一個中間件或請求處理器的函數，用於獲取當前請求的響應
+            scope: 連線資訊
+            receive: 接收 request 訊息的函式
+            send: 送出 response 訊息的函式
 
-        Returns:""
+        Raises:
+            ex: API 執行錯誤, 記錄後交由外層處理
         """
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        policy = get_log_policy(scope["path"])
+        debug = policy.enabled and log.isEnabledFor(logging.DEBUG)
+        capture = policy.enabled and capture_log.isEnabledFor(logging.INFO)
+        if not debug and not capture:
+            try:
+                await self.app(scope, receive, send)
+            except Exception as ex:
+                log.critical(ex, exc_info=True)
+                raise ex
+            return
+
         start_time = time.time()
-        request_info = {}
-        response_info = {}
+        request = Request(scope)
+        capture_request = policy.capture_body and not _skip_content_type(request.headers, policy)
+        request_body = _BodyCapture(self.CAPTURE_MAX_BODY_SIZE if capture else policy.max_body_size)
+        response_body = _BodyCapture(policy.max_body_size)
+        response_info: dict = {}
+
+        async def receive_wrapper() -> Message:
+            """接收 request 訊息並複製 body 的前段.
+
+            Returns:
+                Message: request 訊息
+            """
+            message = await receive()
+            if message["type"] == "http.request" and capture_request:
+                request_body.feed(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message: Message) -> None:
+            """送出 response 訊息, 並依抽樣結果複製 status 與 body 的前段.
+
+            Args:
+                message (Message): response 訊息
+            """
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                response_info["status_code"] = status_code
+                response_info["sampled"] = debug and _is_sampled(policy, status_code)
+                response_info["capture"] = (
+                    response_info["sampled"]
+                    and policy.capture_body
+                    and not _skip_content_type(Headers(raw=message.get("headers", [])), policy)
+                )
+            elif message["type"] == "http.response.body" and response_info.get("capture"):
+                response_body.feed(message.get("body", b""))
+            await send(message)
 
         try:
-            # 蒐集 request 資訊
-            request_body = await request.body()
-            request_info = {
-                "url": str(request.url),
-                "method": request.method,
-                "headers": dict(request.headers),
-                "body": request_body[: self.LOG_MAX_BODY_SIZE].decode("utf-8", errors="ignore"),
-            }
-            if len(request_body) > self.LOG_MAX_BODY_SIZE:
-                request_info["body"] += " (truncated)"
-
-            # 執行 request 然後取得 response
-            response = await call_next(request)
-
-            # 蒐集 response 資訊
-            response_body = b""
-            async for chunk in response.body_iterator:
-                response_body += chunk
-
-            duration = time.time() - start_time
-            response_info = {
-                "status_code": response.status_code,
-                "duration": f"{duration:.2f} seconds",
-                "body": response_body[: self.LOG_MAX_BODY_SIZE].decode("utf-8", errors="ignore"),
-            }
-            if len(response_body) > self.LOG_MAX_BODY_SIZE:
-                response_info["body"] += " (truncated)"
-
+            await self.app(scope, receive_wrapper, send_wrapper)
         except Exception as ex:
             response_info = {
                 "status_code": "500",
-                "duration": f"{time.time() - start_time:.2f} seconds",
                 "body": "Internal Server Error",
+                "sampled": debug and _is_sampled(policy, 500),
             }
             log.critical(ex, exc_info=True)
-
+            raise ex
         finally:
-            log_message = (
-                f"{request_info.get('method', 'UNKNOWN')} {request_info.get('url', 'UNKNOWN')}"
-                f" - {response_info.get('status_code', 'UNKNOWN')}\n"
-                f"<<< Request >>>\n"
-                f"URL: {request_info.get('url', 'UNKNOWN')}\n"
-                f"Method: {request_info.get('method', 'UNKNOWN')}\n"
-                f"Headers: {request_info.get('headers', 'UNKNOWN')}\n"
-                f"Body: {request_info.get('body', 'UNKNOWN')}\n"
-                f"<<< Response >>>\n"
-                f"Status Code: {response_info.get('status_code', 'UNKNOWN')}\n"
-                f"Duration: {response_info.get('duration', 'UNKNOWN')}\n"
-                f"Body: {response_info.get('body', 'UNKNOWN')}"
-            )
-            log.debug(log_message)
+            duration = time.time() - start_time
+            status_code = response_info.get("status_code", "UNKNOWN")
+            if response_info.get("sampled", debug):
+                url = str(request.url)
+                http_info = {
+                    "request": {
+                        "url": url,
+                        "method": request.method,
+                        "headers": request.headers,
+                        "body": request_body.text(policy.max_body_size),
+                    },
+                    "response": {
+                        "status_code": status_code,
+                        "duration": duration,
+                        "body": response_info.get("body", response_body.text()),
+                    },
+                }
+                # 詳細內容放在 record.http, 由 formatter 在寫入時才組成文字或 JSON
+                log.debug("%s %s - %s", request.method, url, status_code, extra={"http": http_info})
+            if capture:
+                capture_log.info(
+                    orjson.dumps(
+                        build_capture_record(scope, request_body, capture_request, status_code, start_time, duration)
+                    ).decode()
+                )
+
+
+def build_capture_record(  # noqa: CFQ002
+    scope: Scope, body: "_BodyCapture", body_captured: bool, status_code: Any, start_time: float, duration: float
+) -> dict:
+    """組成一筆重播用的 request 記錄 (JSONL 的一行)
+
+    Args:
+        scope (Scope): 連線資訊, API 執行後含有比對到的 route
+        body (_BodyCapture): 複製的 request body
+        body_captured (bool): 是否有複製 body (路由設定 capture_body 且 content-type 不在略過清單)
+        status_code (Any): 回應的狀態碼
+        start_time (float): 開始時間 (unix time)
+        duration (float): 執行秒數
+
+    Returns:
+        dict: 重播記錄
+    """
+    headers = {}
+    auth = False
+    for raw_name, raw_value in scope["headers"]:
+        name = raw_name.decode("latin-1")
+        if name in CAPTURE_AUTH_HEADERS:
+            auth = True
+        elif name not in CAPTURE_SKIP_HEADERS:
+            headers[name] = raw_value.decode("latin-1")
+
+    route = scope.get("route")
+    record = {
+        "ts": start_time,
+        "method": scope["method"],
+        "path": scope["path"],
+        "query": scope.get("query_string", b"").decode("latin-1"),
+        "route": getattr(route, "path", None),
+        "headers": headers,
+        "auth": auth,
+        "body": None,
+        "status": status_code,
+        "duration": duration,
+    }
+    if not body_captured:
+        record["body_skipped"] = True
+    elif body.size > body.limit:
+        record["body_truncated"] = True
+    elif body.size:
+        try:
+            record["body"] = body.buffer.decode("utf-8")
+        except UnicodeDecodeError:
+            record["body"] = base64.b64encode(body.buffer).decode()
+            record["body_encoding"] = "base64"
+    return record
 
-        return Response(
-            content=response_body,
-            status_code=response.status_code,
-            headers=dict(response.headers),
-            media_type=response.media_type,
-        )
 
+@lru_cache(maxsize=4096)
+def get_log_policy(path: str) -> LogPolicy:
+    """取得路由的 API Log 設定, 每個路徑只比對一次
 
-class CustomColoredFormatter(ColoredFormatter):
-    """Customized ColoredFormatter
+    Args:
+        path (str): request 路徑
+
+    Returns:
+        LogPolicy: 最長符合的設定, 都不符合時為 DEFAULT
+    """
+    matched = APILogPolicyMapping.DEFAULT
+    matched_length = -1
+    for mapping in APILogPolicyMapping:
+        if mapping is APILogPolicyMapping.DEFAULT:
+            continue
+        pattern = mapping.path
+        if pattern.endswith("/*"):
+            prefix = pattern[:-2]
+            is_match = path == prefix or path.startswith(prefix + "/")
+        else:
+            is_match = path == pattern
+        if is_match and len(pattern) > matched_length:
+            matched, matched_length = mapping, len(pattern)
+    return matched.policy
+
+
+def _skip_content_type(headers: Headers, policy: LogPolicy) -> bool:
+    """判斷 body 是否為不記錄的 content-type
 
     Args:
-        ColoredFormatter (_type_): ColoredFormatter
+        headers (Headers): request 或 response 的 headers
+        policy (LogPolicy): API Log 設定
+
+    Returns:
+        bool: 是否不記錄 body
+    """
+    content_type = headers.get("content-type", "").lower()
+    return bool(content_type) and content_type.startswith(policy.skip_content_types)
+
+
+def _is_sampled(policy: LogPolicy, status_code: int) -> bool:
+    """依狀態碼的抽樣比例決定是否記錄
+
+    Args:
+        policy (LogPolicy): API Log 設定
+        status_code (int): response 狀態碼
+
+    Returns:
+        bool: 是否記錄
+    """
+    if status_code >= 500:
+        rate = policy.server_error_sample_rate
+    elif status_code >= 400:
+        rate = policy.client_error_sample_rate
+    else:
+        rate = policy.sample_rate
+    return rate >= 1.0 or random.random() < rate
+
+
+class _BodyCapture:
+    """保留串流 body 前段的緩衝區."""
+
+    __slots__ = ("limit", "buffer", "size")
+
+    def __init__(self, limit: int) -> None:
+        """Init.
+
+        Args:
+            limit (int): 最多保留的 bytes
+        """
+        self.limit = limit
+        self.buffer = bytearray()
+        self.size = 0
+
+    def feed(self, chunk: bytes) -> None:
+        """加入一段 body, 超過上限的部分只計算長度.
+
+        Args:
+            chunk (bytes): body 片段
+        """
+        if len(self.buffer) < self.limit:
+            self.buffer += chunk[: self.limit - len(self.buffer)]
+        self.size += len(chunk)
+
+    def text(self, limit: Optional[int] = None) -> str:
+        """Log 用的 body 文字.
+
+        Args:
+            limit (Optional[int], optional): 最多幾個 bytes, 預設為緩衝區上限. Defaults to None.
+
+        Returns:
+            str: 解碼後的 body, 超過上限時加上 (truncated)
+        """
+        limit = self.limit if limit is None else min(limit, self.limit)
+        text = self.buffer[:limit].decode("utf-8", errors="ignore")
+        if self.size > limit:
+            text += " (truncated)"
+        return text
+
+
+@lru_cache(maxsize=4096)
+def get_parent_filename(pathname: str) -> str:
+    """取得檔案所在資料夾名稱, 每個 pathname 只計算一次
+
+    Args:
+        pathname (str): LogRecord.pathname
+
+    Returns:
+        str: 資料夾名稱
+    """
+    return os.path.basename(os.path.dirname(pathname))
+
+
+def format_http_details(http_info: dict) -> str:
+    """將 APILog 的 record.http 組成多行文字
+
+    Args:
+        http_info (dict): APILog 記錄的 request / response 資訊
+
+    Returns:
+        str: 多行文字, 以換行開頭
     """
+    request_info = http_info.get("request", {})
+    response_info = http_info.get("response", {})
+    duration = response_info.get("duration")
+    return (
+        f"\n<<< Request >>>\n"
+        f"URL: {request_info.get('url', 'UNKNOWN')}\n"
+        f"Method: {request_info.get('method', 'UNKNOWN')}\n"
+        f"Headers: {dict(request_info.get('headers', {}))}\n"
+        f"Body: {request_info.get('body', 'UNKNOWN')}\n"
+        f"<<< Response >>>\n"
+        f"Status Code: {response_info.get('status_code', 'UNKNOWN')}\n"
+        f"Duration: {'UNKNOWN' if duration is None else f'{duration:.2f} seconds'}\n"
+        f"Body: {response_info.get('body', 'UNKNOWN')}"
+    )
+
+
+class _HTTPDetailsMixin(logging.Formatter):
+    """文字 formatter 共用: 補上 parent_filename, 並在訊息後附加 APILog 的 request / response 內容"""
 
     def format(self, record: logging.LogRecord) -> str:
         """Format log record
@@ -113,29 +356,83 @@ class CustomColoredFormatter(ColoredFormatter):
         Returns:
             str: Formatted log record
         """
-        record.black = "\033[30m"
-        record.red = "\033[31m"
-        record.green = "\033[32m"
-        record.yellow = "\033[33m"
-        record.blue = "\033[34m"
-        record.magenta = "\033[35m"
-        record.cyan = "\033[36m"
-        record.white = "\033[37m"
-        record.reset = "\033[0m"
+        record.parent_filename = get_parent_filename(record.pathname)
+        return super().format(record)
+
+    def formatMessage(self, record: logging.LogRecord) -> str:  # noqa: N802
+        """Format message, 附加 record.http 的內容
+
+        Args:
+            record (logging.LogRecord): LogRecord
+
+        Returns:
+            str: Formatted message
+        """
+        http_info = getattr(record, "http", None)
+        if http_info is not None:
+            record.message += format_http_details(http_info)
+        return super().formatMessage(record)
+
+
+class CustomColoredFormatter(_HTTPDetailsMixin, ColoredFormatter):
+    """Customized ColoredFormatter
 
-        parent_dir = os.path.basename(os.path.dirname(record.pathname))
-        record.parent_filename = parent_dir
+    Args:
+        ColoredFormatter (_type_): ColoredFormatter
+
+    Attributes:
+        COLORS: 格式字串可使用的顏色代碼
+    """
 
+    COLORS = {
+        "black": "\033[30m",
+        "red": "\033[31m",
+        "green": "\033[32m",
+        "yellow": "\033[33m",
+        "blue": "\033[34m",
+        "magenta": "\033[35m",
+        "cyan": "\033[36m",
+        "white": "\033[37m",
+        "reset": "\033[0m",
+    }
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Format log record
+
+        Args:
+            record (logging.LogRecord): LogRecord
+
+        Returns:
+            str: Formatted log record
+        """
+        record.__dict__.update(self.COLORS)
         return super().format(record)
 
 
-class CustomFormatter(logging.Formatter):
+class CustomFormatter(_HTTPDetailsMixin, logging.Formatter):
     """Customized Formatter
 
     Args:
         logging (_type_): Formatter
     """
 
+
+class JSONFormatter(logging.Formatter):
+    """以 orjson 輸出單行 JSON 的 formatter, 方便機器解析
+
+    APILog 的 request / response 會輸出為 http.request / http.response 欄位,
+    其他透過 extra 傳入的欄位也會輸出為同名的 key.
+
+    Attributes:
+        RESERVED_ATTRS: LogRecord 原生屬性及其他 formatter 加上的屬性, 不視為 extra 欄位
+    """
+
+    RESERVED_ATTRS = (
+        frozenset(logging.makeLogRecord({}).__dict__)
+        | {"message", "asctime", "parent_filename"}
+        | CustomColoredFormatter.COLORS.keys()
+    )
+
     def format(self, record: logging.LogRecord) -> str:
         """Format log record
 
@@ -143,11 +440,40 @@ class CustomFormatter(logging.Formatter):
             record (logging.LogRecord): LogRecord
 
         Returns:
-            str: Formatted log record
+            str: 單行 JSON
         """
-        parent_dir = os.path.basename(os.path.dirname(record.pathname))
-        record.parent_filename = parent_dir
-        return super().format(record)
+        payload = {
+            "time": f"{self.formatTime(record, self.datefmt)}.{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "file": f"{get_parent_filename(record.pathname)}/{record.filename}:{record.lineno}",
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in self.RESERVED_ATTRS:
+                payload[key] = value
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc_info"] = record.exc_text
+        if record.stack_info:
+            payload["stack_info"] = self.formatStack(record.stack_info)
+        return orjson.dumps(payload, default=_json_default).decode()
+
+
+def _json_default(obj: Any) -> Any:
+    """Log 轉 JSON 時無法直接序列化的型態
+
+    Args:
+        obj (Any): 無法序列化的對象
+
+    Returns:
+        Any: Mapping (例如 request headers) 轉為 dict, 其他轉為字串
+    """
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    return str(obj)
 
 
 class InfoOnlyFilter(logging.Filter):
@@ -167,3 +493,282 @@ class InfoOnlyFilter(logging.Filter):
             bool: True if levelno is INFO, False otherwise
         """
         return record.levelno == logging.INFO
+
+
+class BatchingQueueHandler(logging.handlers.MemoryHandler):
+    """把 log 丟進佇列, 由背景執行緒批次寫入 target handler
+
+    呼叫 log 的執行緒 (例如 event loop) 只需把 record 放進佇列, 格式化與檔案 I/O (含 rotate)
+    都在背景執行緒進行; 同一批 record 只 flush 一次.
+    繼承 MemoryHandler 只是為了讓 logging_config.json 可以用 "target" 指定要包裝的 handler.
+
+    logging_config.json 範例:
+        "file_queue": {
+            "class": "app.logic.core.logging.BatchingQueueHandler",
+            "target": "file",
+            "capacity": 10000,
+            "policy": "drop"
+        }
+
+    Attributes:
+        POLICIES: 佇列已滿時的處理方式, drop: 直接丟棄, block: 最多等待 block_timeout 秒後丟棄
+    """
+
+    POLICIES = ("drop", "block")
+    _STOP = object()
+
+    def __init__(  # noqa: CFQ002
+        self,
+        capacity: int = 10000,
+        target: Optional[logging.Handler] = None,
+        batch_size: int = 500,
+        policy: str = "drop",
+        block_timeout: float = 1.0,
+    ) -> None:
+        """Init.
+
+        Args:
+            capacity (int, optional): 佇列最多可存放的 record 數. Defaults to 10000.
+            target (Optional[logging.Handler], optional): 實際寫入的 handler. Defaults to None.
+            batch_size (int, optional): 背景執行緒每批最多寫入的 record 數. Defaults to 500.
+            policy (str, optional): 佇列已滿時的處理方式, "drop" 或 "block". Defaults to "drop".
+            block_timeout (float, optional): policy 為 block 時最多等待秒數. Defaults to 1.0.
+
+        Raises:
+            ValueError: 不支援的 policy
+        """
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unsupported policy: {policy}, expected one of {self.POLICIES}")
+
+        super().__init__(capacity, flushLevel=logging.CRITICAL + 1, target=target, flushOnClose=False)
+        self.batch_size = batch_size
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.queue: queue.Queue = queue.Queue(maxsize=capacity)
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+        _batching_handlers.add(self)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """把 record 放進佇列, 不做任何 I/O
+
+        Args:
+            record (logging.LogRecord): LogRecord
+        """
+        try:
+            if self.policy == "block":
+                self.queue.put(record, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        """背景執行緒: 取出佇列中的 record 並批次寫入"""
+        while True:
+            batch: List[logging.LogRecord] = []
+            stop = False
+            item = self.queue.get()
+            while True:
+                if item is self._STOP:
+                    stop = True
+                else:
+                    batch.append(item)
+                if stop or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            try:
+                if batch:
+                    self._write_batch(batch)
+            finally:
+                for _ in range(len(batch) + stop):
+                    self.queue.task_done()
+            if stop:
+                return
+
+    def _write_batch(self, records: List[logging.LogRecord]) -> None:
+        """將一批 record 寫入 target, StreamHandler 類 (含檔案) 只寫入與 flush 一次
+
+        Args:
+            records (List[logging.LogRecord]): 一批 LogRecord
+        """
+        target = self.target
+        if target is None:
+            return
+
+        records = [record for record in records if record.levelno >= target.level and target.filter(record)]
+        if not isinstance(target, logging.StreamHandler):
+            for record in records:
+                target.handle(record)
+            self.written += len(records)
+            self.batches += 1
+            return
+
+        lines = []
+        for record in records:
+            try:
+                lines.append(target.format(record) + target.terminator)
+            except Exception:
+                target.handleError(record)
+        if not lines:
+            return
+
+        payload = "".join(lines)
+        target.acquire()
+        try:
+            if isinstance(target, logging.FileHandler) and target.stream is None:
+                target.stream = target._open()
+            if isinstance(target, logging.handlers.RotatingFileHandler) and int(target.maxBytes) > 0:
+                # 每批只檢查一次是否需要 rotate
+                target.stream.seek(0, 2)
+                position = target.stream.tell()
+                if position > 0 and position + len(payload) >= int(target.maxBytes):
+                    target.doRollover()
+            target.stream.write(payload)
+            target.flush()
+            self.written += len(lines)
+            self.batches += 1
+        except Exception:
+            target.handleError(records[-1])
+        finally:
+            target.release()
+
+    def flush(self) -> None:
+        """等待佇列中的 record 全部寫入 (logging.shutdown 時會呼叫)"""
+        if self._thread.is_alive():
+            self.queue.join()
+
+    def close(self) -> None:
+        """寫完佇列中的 record 後停止背景執行緒, 並記錄被丟棄的數量"""
+        _batching_handlers.discard(self)
+        if self._thread.is_alive():
+            self.queue.put(self._STOP)
+            self._thread.join()
+
+        if self.dropped and self.target is not None:
+            self.target.handle(
+                logging.makeLogRecord(
+                    {
+                        "name": __name__,
+                        "levelno": logging.WARNING,
+                        "levelname": "WARNING",
+                        "pathname": __file__,
+                        "msg": f"BatchingQueueHandler dropped {self.dropped} log records (queue full)",
+                    }
+                )
+            )
+
+        self.acquire()
+        try:
+            self.target = None
+            logging.Handler.close(self)
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        """佇列統計
+
+        Returns:
+            dict: 佇列中、已寫入、已丟棄的 record 數與寫入批數
+        """
+        return {
+            "queued": self.queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+        }
+
+
+# 目前的 BatchingQueueHandler (由 logging_config.json 建立), 供 /metrics 讀取佇列統計
+_batching_handlers: "weakref.WeakSet[BatchingQueueHandler]" = weakref.WeakSet()
+
+
+@REGISTRY.register_collector
+def collect_log_queue_metrics() -> List[MetricFamily]:
+    """
+    /metrics 用的 log 佇列統計, scrape 時讀取各 BatchingQueueHandler 的 stats.
+
+    Returns:
+        List[MetricFamily]: 依 handler 名稱 (logging_config.json 的 key) 標示的 log 佇列統計
+    """
+    stats = [(handler.name or "unnamed", handler.stats()) for handler in list(_batching_handlers)]
+    return [
+        MetricFamily(
+            "log_queue_records",
+            "gauge",
+            "Log records waiting in the queue of a batching log handler.",
+            [Sample("", {"handler": name}, handler_stats["queued"]) for name, handler_stats in stats],
+        ),
+        MetricFamily(
+            "log_dropped_records_total",
+            "counter",
+            "Log records dropped because the queue of a batching log handler was full.",
+            [Sample("", {"handler": name}, handler_stats["dropped"]) for name, handler_stats in stats],
+        ),
+        MetricFamily(
+            "log_written_records_total",
+            "counter",
+            "Log records written by a batching log handler.",
+            [Sample("", {"handler": name}, handler_stats["written"]) for name, handler_stats in stats],
+        ),
+    ]
+
+
+class DispatchHandler(logging.Handler):
+    """由 QueueListener 使用: 把其他 process 送來的 record 交給 master 中同名的 logger 處理
+
+    worker 只負責把 record 放進 multiprocessing queue, 實際寫入 console / 檔案 (含 rotate) 都在 master,
+    多個 worker 不會同時 rotate 同一個檔案.
+    """
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        """交給同名 logger 的 handlers
+
+        Args:
+            record (logging.LogRecord): LogRecord
+
+        Returns:
+            bool: 是否處理
+        """
+        logger = logging.getLogger(record.name)
+        if logger.isEnabledFor(record.levelno):
+            logger.handle(record)
+            return True
+        return False
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Not used, record 已在 handle 中處理
+
+        Args:
+            record (logging.LogRecord): LogRecord
+        """
+
+
+def configure_worker_logging(log_queue: Any) -> None:
+    """Worker fork 後呼叫: 所有 logger 的 handlers 改為送到 master 的 queue
+
+    保留各 logger 的 level 與 filter; 從 master 繼承的 handlers 不再使用, 其背景執行緒在 fork 後已不存在.
+
+    Args:
+        log_queue (Any): master 的 multiprocessing queue
+    """
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    loggers = [logging.getLogger()] + [
+        logger for logger in logging.root.manager.loggerDict.values() if isinstance(logger, logging.Logger)
+    ]
+    for logger in loggers:
+        if not logger.handlers:
+            continue
+        for handler in logger.handlers:
+            if isinstance(handler, BatchingQueueHandler):
+                # logging.shutdown 時不會再寫入 master 的檔案
+                handler.target = None
+                handler.dropped = 0
+        logger.handlers = [queue_handler]
@@ -0,0 +1,573 @@
+"""In-process metrics registry rendered in the Prometheus text format."""
+
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Sequence, Tuple
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Sample(NamedTuple):
+    """One exported value.
+
+    Attributes:
+        suffix: Appended to the metric name, e.g. ``_bucket``.
+        labels: Label names and values.
+        value: Sample value.
+    """
+
+    suffix: str
+    labels: Dict[str, str]
+    value: float
+
+
+class MetricFamily(NamedTuple):
+    """Everything exported under one metric name.
+
+    Attributes:
+        name: Metric name.
+        type: ``counter``, ``gauge`` or ``histogram``.
+        documentation: HELP text.
+        samples: Exported values.
+    """
+
+    name: str
+    type: str
+    documentation: str
+    samples: List[Sample]
+
+
+class _Child:
+    """The values of one label combination, kept in one shard per writing thread.
+
+    A thread only ever writes its own shard, so recording takes no lock; the lock is taken once per thread to
+    create the shard, and shards are summed when the metrics are scraped.
+    """
+
+    __slots__ = ("size", "_shards", "_lock")
+
+    def __init__(self, size: int) -> None:
+        """Init.
+
+        Args:
+            size (int): Number of values per shard.
+        """
+        self.size = size
+        self._shards: Dict[int, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def _shard(self) -> List[float]:
+        """Get the shard of the calling thread.
+
+        Returns:
+            List[float]: Values owned by the calling thread.
+        """
+        ident = threading.get_ident()
+        shard = self._shards.get(ident)
+        if shard is None:
+            with self._lock:
+                shard = self._shards.setdefault(ident, [0.0] * self.size)
+        return shard
+
+    def values(self) -> List[float]:
+        """Sum of every shard.
+
+        Returns:
+            List[float]: Aggregated values.
+        """
+        with self._lock:
+            shards = list(self._shards.values())
+        return [sum(column) for column in zip(*shards)] if shards else [0.0] * self.size
+
+
+class _CounterChild(_Child):
+    """Counter of one label combination."""
+
+    __slots__ = ()
+
+    def __init__(self) -> None:
+        """Init."""
+        super().__init__(1)
+
+    def inc(self, amount: float = 1.0) -> None:
+        """Increase the counter.
+
+        Args:
+            amount (float): Non-negative increment.
+        """
+        self._shard()[0] += amount
+
+
+class _GaugeChild(_Child):
+    """Up / down gauge of one label combination."""
+
+    __slots__ = ()
+
+    def __init__(self) -> None:
+        """Init."""
+        super().__init__(1)
+
+    def inc(self, amount: float = 1.0) -> None:
+        """Increase the gauge.
+
+        Args:
+            amount (float): Increment.
+        """
+        self._shard()[0] += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        """Decrease the gauge.
+
+        Args:
+            amount (float): Decrement.
+        """
+        self._shard()[0] -= amount
+
+
+class _HistogramChild(_Child):
+    """Histogram of one label combination; a shard holds one count per bucket followed by the sum."""
+
+    __slots__ = ("upper_bounds",)
+
+    def __init__(self, upper_bounds: Tuple[float, ...]) -> None:
+        """Init.
+
+        Args:
+            upper_bounds (Tuple[float, ...]): Bucket upper bounds, ending with ``inf``.
+        """
+        super().__init__(len(upper_bounds) + 1)
+        self.upper_bounds = upper_bounds
+
+    def observe(self, value: float) -> None:
+        """Record one observation.
+
+        Args:
+            value (float): Observed value, e.g. seconds.
+        """
+        shard = self._shard()
+        shard[bisect_left(self.upper_bounds, value)] += 1
+        shard[-1] += value
+
+
+class Metric:
+    """Base class of a metric with a fixed set of label names.
+
+    Attributes:
+        type: Prometheus metric type.
+    """
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> None:
+        """Init.
+
+        Args:
+            name (str): Metric name.
+            documentation (str): HELP text.
+            label_names (Sequence[str]): Label names, given in this order to ``labels``.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._children: Dict[Tuple[str, ...], _Child] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self) -> _Child:
+        """Create the values of a new label combination.
+
+        Raises:
+            NotImplementedError: Implemented by subclasses.
+        """
+        raise NotImplementedError
+
+    def _child(self, label_values: Tuple[str, ...]) -> _Child:
+        """Get or create the values of a label combination.
+
+        Args:
+            label_values (Tuple[str, ...]): Label values.
+
+        Returns:
+            _Child: Values of the label combination.
+
+        Raises:
+            ValueError: Wrong number of label values.
+        """
+        child = self._children.get(label_values)
+        if child is None:
+            if len(label_values) != len(self.label_names):
+                raise ValueError(f"{self.name} expects labels {self.label_names}, got {label_values}")
+            with self._lock:
+                child = self._children.setdefault(label_values, self._new_child())
+        return child
+
+    def _samples(self, labels: Dict[str, str], values: List[float]) -> List[Sample]:
+        """Build the samples of one label combination.
+
+        Args:
+            labels (Dict[str, str]): Label names and values.
+            values (List[float]): Aggregated values.
+
+        Returns:
+            List[Sample]: Exported values.
+        """
+        return [Sample("", labels, values[0])]
+
+    def collect(self) -> MetricFamily:
+        """Snapshot of every label combination.
+
+        Returns:
+            MetricFamily: Exported values.
+        """
+        with self._lock:
+            children = list(self._children.items())
+        samples: List[Sample] = []
+        for label_values, child in children:
+            samples.extend(self._samples(dict(zip(self.label_names, label_values)), child.values()))
+        return MetricFamily(self.name, self.type, self.documentation, samples)
+
+
+class Counter(Metric):
+    """Monotonically increasing counter.
+
+    Attributes:
+        type: Prometheus metric type.
+    """
+
+    type = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        """Create a counter.
+
+        Returns:
+            _CounterChild: New counter.
+        """
+        return _CounterChild()
+
+    def labels(self, *label_values: str) -> _CounterChild:
+        """Get the counter of a label combination.
+
+        Args:
+            label_values (str): Label values.
+
+        Returns:
+            _CounterChild: The counter.
+        """
+        return self._child(label_values)  # type: ignore[return-value]
+
+
+class Gauge(Metric):
+    """Value that goes up and down, e.g. requests in flight.
+
+    Attributes:
+        type: Prometheus metric type.
+    """
+
+    type = "gauge"
+
+    def _new_child(self) -> _GaugeChild:
+        """Create a gauge.
+
+        Returns:
+            _GaugeChild: New gauge.
+        """
+        return _GaugeChild()
+
+    def labels(self, *label_values: str) -> _GaugeChild:
+        """Get the gauge of a label combination.
+
+        Args:
+            label_values (str): Label values.
+
+        Returns:
+            _GaugeChild: The gauge.
+        """
+        return self._child(label_values)  # type: ignore[return-value]
+
+
+class Histogram(Metric):
+    """Distribution of observed values over fixed buckets.
+
+    Attributes:
+        type: Prometheus metric type.
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        """Init.
+
+        Args:
+            name (str): Metric name.
+            documentation (str): HELP text.
+            label_names (Sequence[str]): Label names, given in this order to ``labels``.
+            buckets (Sequence[float]): Bucket upper bounds; ``+Inf`` is added automatically.
+        """
+        super().__init__(name, documentation, label_names)
+        self.upper_bounds = tuple(sorted(set(buckets) | {math.inf}))
+
+    def _new_child(self) -> _HistogramChild:
+        """Create a histogram.
+
+        Returns:
+            _HistogramChild: New histogram.
+        """
+        return _HistogramChild(self.upper_bounds)
+
+    def labels(self, *label_values: str) -> _HistogramChild:
+        """Get the histogram of a label combination.
+
+        Args:
+            label_values (str): Label values.
+
+        Returns:
+            _HistogramChild: The histogram.
+        """
+        return self._child(label_values)  # type: ignore[return-value]
+
+    def _samples(self, labels: Dict[str, str], values: List[float]) -> List[Sample]:
+        """Build the cumulative bucket, sum and count samples of one label combination.
+
+        Args:
+            labels (Dict[str, str]): Label names and values.
+            values (List[float]): Aggregated bucket counts followed by the sum.
+
+        Returns:
+            List[Sample]: Exported values.
+        """
+        samples = []
+        cumulative = 0.0
+        for upper_bound, count in zip(self.upper_bounds, values):
+            cumulative += count
+            samples.append(Sample("_bucket", {**labels, "le": _format_value(upper_bound)}, cumulative))
+        samples.append(Sample("_sum", labels, values[-1]))
+        samples.append(Sample("_count", labels, cumulative))
+        return samples
+
+
+Collector = Callable[[], Iterable[MetricFamily]]
+
+
+class MetricsRegistry:
+    """Metrics of this process plus collectors that read gauges from other components at scrape time."""
+
+    def __init__(self) -> None:
+        """Init."""
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Collector] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        """Add a metric.
+
+        Args:
+            metric (Metric): The metric.
+
+        Returns:
+            Metric: The same metric.
+
+        Raises:
+            ValueError: The name is already registered.
+        """
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def register_collector(self, collector: Collector) -> Collector:
+        """Add a function called at scrape time.
+
+        Args:
+            collector (Collector): Function returning metric families.
+
+        Returns:
+            Collector: The same function, so this can be used as a decorator.
+        """
+        with self._lock:
+            self._collectors.append(collector)
+        return collector
+
+    def collect(self) -> Iterator[MetricFamily]:
+        """Snapshot of every metric and collector.
+
+        Yields:
+            MetricFamily: Exported values.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        for metric in metrics:
+            yield metric.collect()
+        for collector in collectors:
+            yield from collector()
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format.
+
+        Returns:
+            str: The ``/metrics`` body.
+        """
+        lines = []
+        for family in self.collect():
+            lines.append(f"# HELP {family.name} {_escape(family.documentation, False)}")
+            lines.append(f"# TYPE {family.name} {family.type}")
+            for sample in family.samples:
+                labels = ",".join(f'{name}="{_escape(str(value))}"' for name, value in sample.labels.items())
+                labels = f"{{{labels}}}" if labels else ""
+                lines.append(f"{family.name}{sample.suffix}{labels} {_format_value(sample.value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(text: str, quote: bool = True) -> str:
+    """Escape HELP text or a label value.
+
+    Args:
+        text (str): Text to escape.
+        quote (bool): Whether double quotes are escaped (label values only).
+
+    Returns:
+        str: Escaped text.
+    """
+    text = text.replace("\\", "\\\\").replace("\n", "\\n")
+    return text.replace('"', '\\"') if quote else text
+
+
+def _format_value(value: float) -> str:
+    """Format a sample value.
+
+    Args:
+        value (float): Sample value.
+
+    Returns:
+        str: Prometheus number.
+    """
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUESTS_TOTAL = Counter(
+    "http_requests_total", "HTTP requests by route and status code.", ("method", "route", "status")
+)
+HTTP_REQUEST_DURATION_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("method", "route")
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being handled.", ("method",))
+SP_EXECUTION_SECONDS = Histogram(
+    "sp_execution_seconds", "Stored procedure execution time by SP and outcome.", ("sp_name", "status")
+)
+AFS_OPERATION_SECONDS = Histogram(
+    "afs_operation_seconds", "Azure File Storage operation time by operation and outcome.", ("operation", "status")
+)
+
+for _metric in (
+    HTTP_REQUESTS_TOTAL,
+    HTTP_REQUEST_DURATION_SECONDS,
+    HTTP_REQUESTS_IN_FLIGHT,
+    SP_EXECUTION_SECONDS,
+    AFS_OPERATION_SECONDS,
+):
+    REGISTRY.register(_metric)
+
+
+@contextmanager
+def observe_duration(histogram: Histogram, *label_values: str) -> Iterator[None]:
+    """
+    Time a block and observe it with a trailing ``status`` label of ``ok`` or ``error``.
+
+    Args:
+        histogram (Histogram): Histogram whose last label is ``status``.
+        label_values (str): The other label values.
+    """
+    started_at = time.perf_counter()
+    status = "error"
+    try:
+        yield
+        status = "ok"
+    finally:
+        histogram.labels(*label_values, status).observe(time.perf_counter() - started_at)
+
+
+def get_route_template(scope: Scope, status_code: str) -> str:
+    """
+    Route path template of a handled request, so path parameters do not create new label values.
+
+    The router stores the matched route in ``scope["route"]`` while routing, so it is read after the request instead
+    of matching every route again.
+
+    Args:
+        scope (Scope): ASGI connection scope, after the app has handled the request.
+        status_code (str): Response status code.
+
+    Returns:
+        str: Route path such as ``/items/{item_id}``; ``unmatched`` for a 404 without a route (so unknown paths do
+        not create new label values), otherwise the raw path.
+    """
+    path = getattr(scope.get("route"), "path", None)
+    if path is not None:
+        return path
+    return "unmatched" if status_code == "404" else scope["path"]
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording request count, latency and in-flight requests per route."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        """Init.
+
+        Args:
+            app (ASGIApp): 下一層的 ASGI app
+        """
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """
+        ASGI 進入點.
+
+        Args:
+            scope: 連線資訊
+            receive: 接收 request 訊息的函式
+            send: 送出 response 訊息的函式
+        """
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = {"code": "500"}
+
+        async def send_wrapper(message: Message) -> None:
+            """送出 response 訊息並記錄狀態碼.
+
+            Args:
+                message (Message): response 訊息
+            """
+            if message["type"] == "http.response.start":
+                status["code"] = str(message["status"])
+            await send(message)
+
+        # route 在路由之後才知道, 處理中的 request 只依 method 統計
+        in_flight = HTTP_REQUESTS_IN_FLIGHT.labels(method)
+        in_flight.inc()
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            route = get_route_template(scope, status["code"])
+            HTTP_REQUEST_DURATION_SECONDS.labels(method, route).observe(time.perf_counter() - started_at)
+            HTTP_REQUESTS_TOTAL.labels(method, route, status["code"]).inc()
@@ -0,0 +1,32 @@
+"""App 共用的 response class."""
+
+from typing import Any
+import orjson
+from fastapi.responses import JSONResponse
+from app.schema import ORJSON_OPTIONS, orjson_default
+from app.schema.base_response import BaseSPAPIResponse
+
+
+class ORJSONResponse(JSONResponse):
+    """以 orjson 編碼的 JSONResponse, main.py 設為整個 app 的 default_response_class.
+
+    一般的 route 仍由 FastAPI 依 response_model 驗證並轉換後再交給這個 class 編碼.
+    SP 的結果可以直接回傳這個 class, 略過 response_model 的驗證與轉換, 由 BaseSPAPIResponse.dump_json 編碼:
+
+        @router.get("/items", response_model=BaseSPAPIResponse)
+        def get_items() -> ORJSONResponse:
+            return ORJSONResponse(BaseSPAPIResponse.from_sp_response(simple_sp_execution("SP_GET_ITEMS")))
+    """
+
+    def render(self, content: Any) -> bytes:
+        """編碼為 JSON
+
+        Args:
+            content (Any): 內容
+
+        Returns:
+            bytes: JSON
+        """
+        if isinstance(content, BaseSPAPIResponse):
+            return content.dump_json()
+        return orjson.dumps(content, default=orjson_default, option=ORJSON_OPTIONS)
@@ -1,18 +1,57 @@
 from app import log
+import hashlib
+import math
+import time
+import uuid
 from datetime import datetime, timedelta
-from jose import JWTError, jwt
+from functools import cached_property, partial
+from typing import NamedTuple, Optional
+from jose import JWTError, jwk, jwt
+from jose.backends.base import Key
 from fastapi import Request, HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
 from app.config.jwt import JWTEnvs
 from app.schema.auth import PayloadDataSchema, PayloadSchema
+from app.logic.utilities.jwt_keys import JWTKeySet, get_key_set
 from app.logic.utilities.time_process import TimeProcess
+from app.logic.utilities.token_revocation import RevocationList, get_revocation_list
+from app.logic.utilities.ttl_cache import TTLCache
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/login")
 
+# 已驗證的 access token (VerifiedToken), 所有 JWTHandler 共用; 快取的 PayloadDataSchema 會交給多個 request, 不可修改
+_verified_tokens: Optional[TTLCache] = (
+    TTLCache(int(JWTEnvs.JWT_TOKEN_CACHE_MAX_ENTRIES.value), float(JWTEnvs.JWT_TOKEN_CACHE_TTL.value))
+    if int(JWTEnvs.JWT_TOKEN_CACHE_MAX_ENTRIES.value) > 0
+    else None
+)
+
+
+class VerifiedToken(NamedTuple):
+    """驗證完成的 Access Token
+
+    Attributes:
+        exp: Token 的 exp (unix time)
+        jti: Token ID, 撤銷時使用
+        sid: 登入 session ID, 同一次登入的 access token 與 refresh token 相同, 登出時撤銷
+        payload: Token資料
+    """
+
+    exp: Optional[float]
+    jti: Optional[str]
+    sid: Optional[str]
+    payload: PayloadDataSchema
+
 
 class JWTHandler:
-    """JWT Token 處理"""
+    """JWT Token 處理
+
+    Attributes:
+        key_set: Access Token 的金鑰組
+        re_key: Refresh Token 的金鑰
+        revocation_list: 已撤銷的 Token
+    """
 
     def __init__(self) -> None:
         """初始化"""
@@ -29,26 +68,60 @@ class JWTHandler:
         self.re_secret_key = JWTEnvs.JWT_RE_SECRET_KEY.value
         self.re_expire_minutes = int(JWTEnvs.JWT_RE_EXPIRE_MINUTES.value)
 
-    def create_token(self, data: dict, is_access_token: bool = True) -> str:
+    @property
+    def key_set(self) -> JWTKeySet:
+        """Access Token 的金鑰組, 依 kid 選擇金鑰, 第一次使用時才載入
+
+        Returns:
+            JWTKeySet: 所有 JWTHandler 共用的金鑰組
+        """
+        return get_key_set()
+
+    @property
+    def revocation_list(self) -> RevocationList:
+        """已撤銷的 Token, 第一次使用時載入
+
+        Returns:
+            RevocationList: 所有 JWTHandler 共用的撤銷清單
+        """
+        return get_revocation_list()
+
+    @cached_property
+    def re_key(self) -> Key:
+        """Refresh Token 的金鑰, 只由本服務驗證, 維持 HMAC; 只解析一次
+
+        Returns:
+            Key: HMAC 金鑰
+        """
+        return jwk.construct(self.re_secret_key, self.algorithm)
+
+    def create_token(self, data: dict, is_access_token: bool = True, session_id: Optional[str] = None) -> str:
         """產生 Token
 
         Args:
             data (dict): 放入Token的資料
             is_access_token (bool, optional): Token類型識別, True: Access Token, False: Refresh Token. 預設為 True.
+            session_id (Optional[str], optional): 登入 session ID (sid), 登出時整個 session 一起撤銷. 預設為 None.
 
         Returns:
             str: Token
         """
         raw_data = data.copy()
+        raw_data["jti"] = uuid.uuid4().hex
+        if session_id is not None:
+            raw_data["sid"] = session_id
 
         if is_access_token:
             expire = datetime.now() + timedelta(minutes=int(self.expire_minutes))
             raw_data.update({"exp": expire})
-            encoded_jwt = jwt.encode(raw_data, self.secret_key, algorithm=self.algorithm)
+            signing_key = self.key_set.signing_key
+            encoded_jwt = jwt.encode(
+                raw_data, signing_key.private, algorithm=signing_key.algorithm, headers={"kid": signing_key.kid}
+            )
         else:
             expire = datetime.now() + timedelta(minutes=int(self.re_expire_minutes))
             raw_data.update({"exp": expire})
-            encoded_jwt = jwt.encode(raw_data, self.re_secret_key, algorithm=self.algorithm)
+            encoded_jwt = jwt.encode(raw_data, self.re_key, algorithm=self.algorithm)
 
         return encoded_jwt
 
@@ -60,22 +133,87 @@ class JWTHandler:
             access_token (str, optional): Access Token, 預設為 Depends(oauth2_scheme)
 
         Raises:
+            JWTError: Token 已撤銷, 轉為 credentials_exception
             credentials_exception: 驗證失敗
 
         Returns:
             PayloadDataSchema: Token資料
         """
         try:
-            payload = jwt.decode(access_token, self.secret_key, algorithms=[self.algorithm])
+            if _verified_tokens is None:
+                token = self.decode_access_token(access_token)
+            else:
+                token = _verified_tokens.get_or_load(
+                    token_cache_key(access_token),
+                    partial(self.decode_access_token, access_token),
+                    ttl=_remaining_lifetime,
+                )
+
+            if self.revocation_list.is_revoked(token.jti) or self.revocation_list.is_revoked(token.sid):
+                raise JWTError("Token has been revoked")
+            return token.payload
+        except JWTError as ex:
+            log.critical(ex, exc_info=True)
+            raise self.credentials_exception
+
+    def decode_access_token(self, access_token: str) -> VerifiedToken:
+        """解碼並驗證 Access Token, 不檢查是否已撤銷
+
+        Args:
+            access_token (str): Access Token
+
+        Raises:
+            JWTError: 找不到 kid 對應的金鑰
+
+        Returns:
+            VerifiedToken: 驗證完成的 Token
+        """
+        key = self.key_set.get(jwt.get_unverified_header(access_token).get("kid"))
+        if key is None:
+            raise JWTError("Unknown JWT key id")
+
+        # 只接受該金鑰的演算法, 避免以其他演算法偽造
+        payload = jwt.decode(access_token, key.public, algorithms=[key.algorithm])
+
+        # if not (self.token_fields == set(payload["user_info"].keys())):
+        #     raise self.credentials_exception
 
-            # if not (self.token_fields == set(payload["user_info"].keys())):
-            #     raise self.credentials_exception
+        return VerifiedToken(payload.get("exp"), payload.get("jti"), payload.get("sid"), PayloadDataSchema(**payload))
+
+    def revoke_token(self, token: str, is_access_token: bool = True) -> None:
+        """撤銷 Token, 在 exp 之前都無法再使用; Token 有 sid 時同一次登入的其他 Token (含 refresh token) 一起撤銷
+
+        Args:
+            token (str): Access Token 或 Refresh Token
+            is_access_token (bool, optional): Token類型識別, True: Access Token, False: Refresh Token. 預設為 True.
 
-            return PayloadDataSchema(**payload)
+        Raises:
+            credentials_exception: Token 驗證失敗
+        """
+        try:
+            if is_access_token:
+                verified = self.decode_access_token(token)
+                exp, jti, sid = verified.exp, verified.jti, verified.sid
+            else:
+                payload = jwt.decode(token, self.re_key, algorithms=[self.algorithm])
+                exp, jti, sid = payload.get("exp"), payload.get("jti"), payload.get("sid")
         except JWTError as ex:
             log.critical(ex, exc_info=True)
             raise self.credentials_exception
 
+        if sid is not None:
+            # session 的 token 都在現在之前產生, 最晚在現在加上 token 效期後過期
+            self.revocation_list.revoke(sid, time.time() + max(self.expire_minutes, self.re_expire_minutes) * 60)
+        elif jti is not None:
+            # 沒有 sid 的舊 token 只撤銷本身; 沒有 exp 的 token 保留到 refresh token 的效期之後
+            self.revocation_list.revoke(jti, exp or time.time() + self.re_expire_minutes * 60)
+        else:
+            log.warning("Token 沒有 jti, 無法撤銷")
+            return
+
+        if is_access_token:
+            invalidate_verified_token(token)
+
     def refresh_token(self, refresh_token: str = Depends(oauth2_scheme)) -> PayloadSchema:
         """驗證 Token
 
@@ -83,13 +221,19 @@ class JWTHandler:
             refresh_token (str, optional): Refresh Token, 預設為 Depends(oauth2_scheme)
 
         Raises:
+            JWTError: Token 已撤銷, 轉為 credentials_exception
             credentials_exception: 驗證失敗
 
         Returns:
             PayloadSchema: Token資料
         """
         try:
-            payload = jwt.decode(refresh_token, self.re_secret_key, algorithms=[self.algorithm])
+            payload = jwt.decode(refresh_token, self.re_key, algorithms=[self.algorithm])
+
+            if self.revocation_list.is_revoked(payload.get("jti")) or self.revocation_list.is_revoked(
+                payload.get("sid")
+            ):
+                raise JWTError("Token has been revoked")
 
             if not (self.token_fields == set(payload["user_info"].keys())):
                 raise self.credentials_exception
@@ -102,6 +246,7 @@ class JWTHandler:
                     re_token_expire_minutes=self.re_expire_minutes,
                 ),
                 with_refresh_token=False,
+                session_id=payload.get("sid"),
             )
 
             return refreshed_payload
@@ -109,12 +254,15 @@ class JWTHandler:
             log.critical(ex, exc_info=True)
             raise self.credentials_exception
 
-    def generate_payload(self, data: PayloadDataSchema, with_refresh_token: bool = True) -> PayloadSchema:
+    def generate_payload(
+        self, data: PayloadDataSchema, with_refresh_token: bool = True, session_id: Optional[str] = None
+    ) -> PayloadSchema:
         """產生 Payload
 
         Args:
             data (PayloadDataSchema): Payload所搭載的資料
             with_refresh_token (bool, optional): 是否連同產生 Refresh Token. 預設為 True.
+            session_id (Optional[str], optional): 登入 session ID (sid), 未指定時建立新的 session. 預設為 None.
 
         Raises:
             ex: _description_
@@ -123,16 +271,64 @@ class JWTHandler:
             PayloadSchema: Payload
         """
         try:
+            session_id = session_id or uuid.uuid4().hex
             if with_refresh_token:
                 result = PayloadSchema(
-                    access_token=self.create_token(data.model_dump(), is_access_token=True),
-                    refresh_token=self.create_token(data.model_dump(), is_access_token=False),
+                    access_token=self.create_token(data.model_dump(), is_access_token=True, session_id=session_id),
+                    refresh_token=self.create_token(data.model_dump(), is_access_token=False, session_id=session_id),
                 )
             else:
                 result = PayloadSchema(
-                    access_token=self.create_token(data.model_dump(), is_access_token=True),
+                    access_token=self.create_token(data.model_dump(), is_access_token=True, session_id=session_id),
                 )
             return result
         except Exception as ex:
             log.critical(ex, exc_info=True)
             raise ex
+
+
+def token_cache_key(access_token: str) -> bytes:
+    """已驗證 Token 快取的 key, 只保存 Token 的摘要
+
+    Args:
+        access_token (str): Access Token
+
+    Returns:
+        bytes: SHA-256 摘要
+    """
+    return hashlib.sha256(access_token.encode()).digest()
+
+
+def _remaining_lifetime(token: VerifiedToken) -> float:
+    """Token 剩餘的有效秒數, 作為快取的 TTL
+
+    Args:
+        token (VerifiedToken): 驗證完成的 Token
+
+    Returns:
+        float: 剩餘秒數, 沒有 exp 時為無限 (由快取的 TTL 上限決定)
+    """
+    return math.inf if token.exp is None else float(token.exp) - time.time()
+
+
+def invalidate_verified_token(access_token: Optional[str] = None) -> None:
+    """清除已驗證 Token 的快取, Token 被撤銷時呼叫
+
+    Args:
+        access_token (Optional[str], optional): 要清除的 Token, 未指定時清除全部. Defaults to None.
+    """
+    if _verified_tokens is None:
+        return
+    if access_token is None:
+        _verified_tokens.clear()
+    else:
+        _verified_tokens.invalidate(token_cache_key(access_token))
+
+
+def verified_token_cache_stats() -> dict:
+    """已驗證 Token 快取的使用統計
+
+    Returns:
+        dict: 快取的 hit / miss 等統計, 未啟用時為空
+    """
+    return _verified_tokens.stats() if _verified_tokens is not None else {}
@@ -0,0 +1,195 @@
+"""JWT 簽章金鑰."""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional
+from jose import jwk
+from jose.backends.base import Key
+from jose.constants import ALGORITHMS
+from app import log
+from app.config.jwt import JWTEnvs
+
+ASYMMETRIC_ALGORITHMS = ALGORITHMS.RSA_DS | ALGORITHMS.EC_DS
+
+
+class SigningKey(NamedTuple):
+    """解析完成的 JWT 金鑰, 簽章與驗證都直接使用, 不再重新解析
+
+    Attributes:
+        kid: 金鑰 ID, 放在 JWT header 的 kid
+        algorithm: 簽章演算法
+        private: 簽章用金鑰, 只有驗證用的公鑰時為 None
+        public: 驗證用金鑰 (HMAC 與簽章用金鑰相同)
+    """
+
+    kid: str
+    algorithm: str
+    private: Optional[Key]
+    public: Key
+
+
+class JWTKeySet:
+    """JWT 金鑰組 (JWKS)
+
+    [HMAC]
+    未設定 JWT_KEYS_FILE 時, 以 JWT_SECRET_KEY 與 JWT_ALGORITHM 建立唯一的金鑰
+
+    [非對稱金鑰]
+    JWT_KEYS_FILE 為 JWKS 格式的 json 檔 {"keys": [{"kid": ..., "alg": "RS256", "kty": "RSA", ...}]},
+    含私鑰參數的金鑰可用於簽章, 只有公鑰的金鑰只用於驗證.
+    輪替金鑰時先加入新金鑰並將 JWT_SIGNING_KID 指向它, 舊金鑰保留到舊 token 全部過期後再移除;
+    檔案修改後最晚 reload_interval 秒會重新載入.
+
+    Attributes:
+        path: JWKS 檔案路徑
+        signing_kid: 簽章用的金鑰 ID
+        reload_interval: 檢查檔案是否修改的間隔秒數
+        signing_key: 目前的簽章金鑰
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = JWTEnvs.JWT_KEYS_FILE.value,
+        signing_kid: Optional[str] = JWTEnvs.JWT_SIGNING_KID.value,
+        reload_interval: float = float(JWTEnvs.JWT_KEYS_RELOAD_INTERVAL.value),
+    ) -> None:
+        """Init.
+
+        Args:
+            path (Optional[str]): JWKS 檔案路徑, 未設定時使用 HMAC secret
+            signing_kid (Optional[str]): 簽章用的金鑰 ID, 未設定時使用第一個含私鑰的金鑰
+            reload_interval (float): 檢查檔案是否修改的間隔秒數
+        """
+        self.path = path
+        self.signing_kid = signing_kid
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._keys: Dict[str, SigningKey] = {}
+        self._signing_key: Optional[SigningKey] = None
+        self._mtime = 0.0
+        self._checked_at = 0.0
+        self.reload()
+
+    def reload(self) -> None:
+        """重新載入金鑰
+
+        Raises:
+            ValueError: 金鑰設定錯誤
+        """
+        if not self.path:
+            algorithm = JWTEnvs.JWT_ALGORITHM.value or ALGORITHMS.HS256
+            key = jwk.construct(JWTEnvs.JWT_SECRET_KEY.value, algorithm)
+            keys = {"default": SigningKey("default", algorithm, key, key)}
+            mtime = 0.0
+        else:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, "rb") as file:
+                keys = {}
+                for entry in json.load(file)["keys"]:
+                    signing_key = parse_jwk(entry)
+                    keys[signing_key.kid] = signing_key
+
+        signing_kid = self.signing_kid or next((kid for kid, key in keys.items() if key.private is not None), None)
+        if signing_kid not in keys or keys[signing_kid].private is None:
+            raise ValueError(f"JWT signing key {signing_kid} not found in {self.path}")
+
+        with self._lock:
+            self._keys = keys
+            self._signing_key = keys[signing_kid]
+            self._mtime = mtime
+            self._checked_at = time.monotonic()
+
+    def _reload_if_changed(self) -> None:
+        """每 reload_interval 秒檢查一次檔案, 有修改時重新載入
+
+        輪替金鑰時檔案可能暫時不存在, 寫到一半或缺少簽章金鑰, 載入失敗時繼續使用已載入的金鑰,
+        下一個間隔再重試, 不影響簽發與驗證 token.
+        """
+        if not self.path or time.monotonic() - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = time.monotonic()
+        try:
+            if os.path.getmtime(self.path) != self._mtime:
+                self.reload()
+        except Exception as ex:
+            log.error(f"重新載入 JWT 金鑰失敗, 繼續使用已載入的金鑰, {self.reload_interval} 秒後重試: {ex!r}")
+
+    @property
+    def signing_key(self) -> SigningKey:
+        """簽章用的金鑰
+
+        Returns:
+            SigningKey: 目前的簽章金鑰
+        """
+        self._reload_if_changed()
+        return self._signing_key  # type: ignore[return-value]
+
+    def get(self, kid: Optional[str]) -> Optional[SigningKey]:
+        """依 JWT header 的 kid 取得驗證用金鑰
+
+        Args:
+            kid (Optional[str]): 金鑰 ID, 沒有 kid 的舊 token 使用簽章金鑰
+
+        Returns:
+            Optional[SigningKey]: 金鑰, 找不到時為 None
+        """
+        self._reload_if_changed()
+        if kid is None:
+            return self._signing_key
+        return self._keys.get(kid)
+
+    def public_jwks(self) -> dict:
+        """可公開給其他服務驗證 token 的 JWKS, 不含 HMAC 金鑰
+
+        Returns:
+            dict: {"keys": [...]}
+        """
+        self._reload_if_changed()
+        keys: List[dict] = []
+        for key in self._keys.values():
+            if key.algorithm in ASYMMETRIC_ALGORITHMS:
+                keys.append({**key.public.to_dict(), "kid": key.kid, "use": "sig"})
+        return {"keys": keys}
+
+
+def parse_jwk(entry: dict) -> SigningKey:
+    """解析一筆 JWK
+
+    Args:
+        entry (dict): JWK, 需有 kid 與 alg
+
+    Raises:
+        ValueError: 不支援的演算法
+
+    Returns:
+        SigningKey: 解析完成的金鑰
+    """
+    kid = entry["kid"]
+    algorithm = entry["alg"]
+    if algorithm not in ASYMMETRIC_ALGORITHMS:
+        raise ValueError(f"Unsupported JWT algorithm {algorithm} for key {kid}, expected one of RS*/ES*")
+
+    key = jwk.construct(entry, algorithm)
+    if "d" in entry:
+        return SigningKey(kid, algorithm, key, key.public_key())
+    return SigningKey(kid, algorithm, None, key)
+
+
+_key_set: Optional[JWTKeySet] = None
+_key_set_lock = threading.Lock()
+
+
+def get_key_set() -> JWTKeySet:
+    """取得 access token 的金鑰組, 所有 JWTHandler 共用
+
+    Returns:
+        JWTKeySet: 金鑰組
+    """
+    global _key_set
+    if _key_set is None:
+        with _key_set_lock:
+            if _key_set is None:
+                _key_set = JWTKeySet()
+    return _key_set
@@ -1,12 +1,45 @@
-from typing import List, Dict, Iterable, Optional, Type
-from sqlalchemy.engine.row import RowProxy
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.inspection import inspect
+"""SQLAlchemy 查詢結果轉換.
 
-Base = declarative_base()
+SQLAlchemy 載入需要數百毫秒, 在第一次使用時才 import.
+"""
 
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, List, Dict, Iterable, Optional
 
-def model_to_dict(model_instance: Optional[Type[Base]]) -> Optional[Dict]:  # type: ignore
+if TYPE_CHECKING:
+    from sqlalchemy.engine.row import RowProxy
+
+
+@lru_cache(maxsize=None)
+def _declarative_base() -> Any:
+    """建立 declarative base, 只建立一次
+
+    Returns:
+        Any: declarative base
+    """
+    from sqlalchemy.ext.declarative import declarative_base
+
+    return declarative_base()
+
+
+def __getattr__(name: str) -> Any:
+    """第一次存取 Base 時才載入 SQLAlchemy (PEP 562)
+
+    Args:
+        name (str): 屬性名稱
+
+    Raises:
+        AttributeError: 不存在的屬性
+
+    Returns:
+        Any: Base
+    """
+    if name == "Base":
+        return _declarative_base()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def model_to_dict(model_instance: Optional[Any]) -> Optional[Dict]:
     """Convert a single SQLAlchemy ORM model instance to a dictionary.
 
     Args:
@@ -18,10 +51,12 @@ def model_to_dict(model_instance: Optional[Type[Base]]) -> Optional[Dict]:  # ty
     if model_instance is None:
         return None
 
+    from sqlalchemy.inspection import inspect
+
     return {c.key: getattr(model_instance, c.key) for c in inspect(model_instance).mapper.column_attrs}
 
 
-def row_to_dict_list(query_result: Iterable[RowProxy]) -> List[Dict]:
+def row_to_dict_list(query_result: Iterable["RowProxy"]) -> List[Dict]:
     """Convert SQLAlchemy query result to a list of dictionaries.
 
     Args:
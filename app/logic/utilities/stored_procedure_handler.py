@@ -1,13 +1,134 @@
+import anyio
+import asyncio
 import pyodbc
 import json
+import orjson
+import threading
+import time
+from concurrent.futures import Future
+from functools import lru_cache, partial
+from typing import (
+    AsyncIterator,
+    Callable,
+    Dict,
+    Generator,
+    Hashable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import StreamingResponse
 from app import log
-from app.schema.base_response import BaseSPResponse
+from app.schema import ORJSON_OPTIONS, orjson_default
+from app.schema.base_response import BaseSPResponse, ColumnarResultSet
 from app.config.stored_procedure_mapping import StoredProcedureMapping
 from app.logic.core.db_manager import use_with_create_connection
+from app.logic.core.db_executor import run_in_db_executor
+from app.logic.core.metrics import SP_EXECUTION_SECONDS, observe_duration
+from app.logic.utilities.ttl_cache import TTLCache
+
+
+class SPBatchError(pyodbc.Error):
+    """批次執行 Stored Procedure 時, 某一個呼叫發生的錯誤
+
+    Attributes:
+        index (int): 發生錯誤的呼叫在 calls 中的位置
+        sp_name (str): 發生錯誤的 SP 名稱
+        message (str): 錯誤訊息
+        committed (Tuple[int, ...]): 跨 DB 批次中, 其他 DB 已經 commit 的呼叫在 calls 中的位置
+    """
+
+    def __init__(self, index: int, sp_name: str, message: str, committed: Sequence[int] = ()) -> None:
+        """初始化
+
+        Args:
+            index (int): 發生錯誤的呼叫在 calls 中的位置
+            sp_name (str): 發生錯誤的 SP 名稱
+            message (str): 錯誤訊息
+            committed (Sequence[int], optional): 其他 DB 已經 commit 的呼叫在 calls 中的位置. Defaults to ().
+        """
+        committed_message = f" (已 commit 的呼叫: {sorted(committed)})" if committed else ""
+        super().__init__(f"Stored Procedure 批次執行錯誤 calls[{index}] [{sp_name}]: {message}{committed_message}")
+        self.index = index
+        self.sp_name = sp_name
+        self.message = message
+        self.committed = tuple(sorted(committed))
+
+
+@lru_cache(maxsize=1024)
+def build_sql_template(
+    sp_name: str, input_keys: Tuple[str, ...], output_keys: Tuple[str, ...], variable_suffix: str = ""
+) -> str:
+    """依呼叫型態 (SP 名稱, 輸入參數名稱, 輸出參數名稱) 建構參數化的 SQL 語句, 結果會被快取
+
+    輸入參數以 ? 綁定, 相同型態的呼叫送出的 SQL 文字完全相同,
+    SQL Server 可以重複使用已編譯的執行計畫, 我們也不需重新組字串.
+
+    回傳範例:
+        DECLARE @O_MSG nvarchar(max);
+        EXEC [dbo].[SP_TEST] @DRIVERID = ?, @O_MSG = @O_MSG OUTPUT;
+        SELECT @O_MSG AS O_MSG;
+
+    Args:
+        sp_name (str): SP 名稱
+        input_keys (Tuple[str, ...]): 輸入參數名稱, 順序需與綁定的參數值相同
+        output_keys (Tuple[str, ...]): 輸出參數名稱
+        variable_suffix (str, optional): 輸出參數變數名稱的後綴, 批次執行時避免變數重複宣告. Defaults to "".
+
+    Returns:
+        str: SQL 語句
+    """
+    # DECLARE statement
+    declare_stmt = ""
+    if output_keys:
+        declare_stmt = ", ".join([f"@{key}{variable_suffix} nvarchar(max)" for key in output_keys])
+        declare_stmt = f"DECLARE {declare_stmt};"
+
+    # EXEC statement
+    exec_args = [f"@{key} = ?" for key in input_keys]
+    exec_args += [f"@{key} = @{key}{variable_suffix} OUTPUT" for key in output_keys]
+    exec_stmt = f"EXEC [dbo].[{sp_name}] {', '.join(exec_args)};"
+
+    # SELECT statement
+    select_stmt = ""
+    if output_keys:
+        select_stmt = ", ".join([f"@{key}{variable_suffix} AS {key}" for key in output_keys])
+        select_stmt = f"SELECT {select_stmt};"
+
+    # final SQL
+    sql = f"{declare_stmt} {exec_stmt} {select_stmt}"
+    return sql
+
+
+def empty_result_set(columnar: bool) -> Union[list, ColumnarResultSet]:
+    """SP 沒有回傳資料時的 result_set, columnar 模式同樣為 ColumnarResultSet
+
+    Args:
+        columnar (bool): 是否以欄為單位回傳 result_set
+
+    Returns:
+        Union[list, ColumnarResultSet]: 空的 result_set
+    """
+    return ColumnarResultSet.model_construct(columns=[], data={}) if columnar else []
 
 
 class StoredProcedureHandler:
-    """Stored Procedure Handler"""
+    """Stored Procedure Handler
+
+    Attributes:
+        STREAM_BATCH_SIZE: 串流模式每次 fetchmany 取回的筆數
+        BATCH_INDEX_COLUMN: 批次執行時, 標示後續結果集屬於第幾個呼叫的欄位名稱
+        BATCH_MAX_PARAMETERS: 批次執行時每次往返最多綁定的參數數量, SQL Server 單一 request 最多 2100 個參數
+    """
+
+    STREAM_BATCH_SIZE = 1000
+    BATCH_INDEX_COLUMN = "__SP_BATCH_INDEX"
+    BATCH_MAX_PARAMETERS = 2099
 
     def __init__(self, connection: pyodbc.Connection):
         """初始化
@@ -17,7 +138,7 @@ class StoredProcedureHandler:
         """
         self.connection = connection
 
-    def execute(self, sp_name: str, params: dict = {}) -> BaseSPResponse:
+    def execute(self, sp_name: str, params: dict = {}, columnar: bool = False) -> BaseSPResponse:
         """執行 Stored Procedure
 
         ※ 若有輸入參數, 例如: @@DRIVERID VARCHAR(20)
@@ -28,10 +149,14 @@ class StoredProcedureHandler:
         則需在 params 中加入 outparam 參數, 並將所有輸出參數包含在內
         例如: params = {"outparam": {"O_MSG": ""}}
 
+        ※ columnar=True 時 result_set 改為以欄為單位的 ColumnarResultSet,
+        欄位名稱不會在每一列重複, 適合欄位多、筆數多的結果
+
         Args:
             sp_name (str): SP 名稱
             params (dict, optional): SP 所需參數. Defaults to {}.
                 ※ outparam (dict): 輸出參數
+            columnar (bool, optional): 是否以欄為單位回傳 result_set. Defaults to False.
 
         Raises:
             Error: 執行 SP 錯誤
@@ -40,46 +165,192 @@ class StoredProcedureHandler:
         Returns:
             BaseSPResponse: SP 執行結果
         """
-        try:
-            result_set = []
-            output_params = params.pop("outparam", {})
-            input_params = params
+        with observe_duration(SP_EXECUTION_SECONDS, sp_name):
+            try:
+                result_set: Union[list, ColumnarResultSet] = []
+                input_params = dict(params)
+                output_params = input_params.pop("outparam", {})
 
-            sql = self.build_sql(sp_name, input_params, output_params)
+                sql = self.build_sql(sp_name, input_params, output_params)
 
-            cursor = self.connection.cursor()
-            cursor.execute(sql)
+                cursor = self.connection.cursor()
+                cursor.execute(sql, *input_params.values())
 
-            if cursor.description:
-                result_set = self.fetchall_as_dict(cursor)
+                if cursor.description:
+                    # SP 沒有回傳資料時, 第一個結果集即為輸出參數
+                    if output_params and output_params.keys() == {column[0] for column in cursor.description}:
+                        output_params = self.fetchall_as_dict(cursor)[0]
+                        cursor.close()
+                        return BaseSPResponse.model_construct(
+                            result_set=empty_result_set(columnar), output_parameters=output_params
+                        )
+
+                    result_set = self.fetchall_as_columns(cursor) if columnar else self.fetchall_as_dict(cursor)
+
+                    if output_params:
+                        cursor.nextset()
+                        output_params_result = self.fetchall_as_dict(cursor)
+                        output_params = output_params_result[0]
 
-                if output_params and result_set[0].keys() == output_params.keys():
-                    output_params = result_set[0]
                     cursor.close()
-                    return BaseSPResponse(result_set=[], output_parameters=output_params)
+                    return BaseSPResponse.model_construct(result_set=result_set, output_parameters=output_params)
 
-                elif output_params:
-                    cursor.nextset()
-                    output_params_result = self.fetchall_as_dict(cursor)
-                    output_params = output_params_result[0]
+                else:
+                    raise pyodbc.Error("SP 執行完成，但沒有收到任何回傳資料。")
 
-                cursor.close()
-                return BaseSPResponse(result_set=result_set, output_parameters=output_params)
+            except pyodbc.Error as ex:
+                log.critical(f"Stored Procedure 執行錯誤 [{sp_name}] {json.dumps(params, default=str)}")
+                self.connection.rollback()
+                raise ex
 
-            else:
-                raise pyodbc.Error("SP 執行完成，但沒有收到任何回傳資料。")
+    def execute_batch(self, calls: List[Tuple[str, dict]], columnar: bool = False) -> List[BaseSPResponse]:
+        """在同一個 DB 以一次往返批次執行多個 Stored Procedure
+
+        每個呼叫前會先 SELECT 一個標示用的結果集, 再以 nextset() 依序讀取 (略過只有筆數沒有欄位的結果),
+        因此每個 SP 回傳幾個結果集都能正確對應到所屬的呼叫.
+        綁定的參數超過 BATCH_MAX_PARAMETERS 時, 依序拆成多次往返, 每次不超過上限;
+        單一呼叫的輸入參數就超過上限時, 在執行任何呼叫之前拋出 ValueError.
+        整個批次在同一個交易中執行, 任一呼叫失敗時會整批 rollback 並拋出 SPBatchError.
+        params 規則同 execute. 每個 SP 的執行時間 (讀到該呼叫的標示到讀到下一個呼叫的標示) 記錄在
+        sp_execution_seconds, 與 execute 相同.
 
+        Args:
+            calls (List[Tuple[str, dict]]): (SP 名稱, SP 所需參數) 的 list
+            columnar (bool, optional): 是否以欄為單位回傳 result_set. Defaults to False.
+
+        Raises:
+            SPBatchError: 某一個呼叫執行錯誤, index 為該呼叫在 calls 中的位置
+
+        Returns:
+            List[BaseSPResponse]: 依 calls 順序的 SP 執行結果
+        """
+        # 每次往返的 (第一個呼叫的位置, SQL 語句, 綁定的參數值)
+        requests: List[Tuple[int, List[str], list]] = []
+        output_params_list = []
+        for index, (sp_name, params) in enumerate(calls):
+            input_params, output_params = self.split_batch_params(index, sp_name, params)
+            output_params_list.append(output_params)
+            if not requests or len(requests[-1][2]) + len(input_params) > self.BATCH_MAX_PARAMETERS:
+                requests.append((index, [], []))
+            _, statements, values = requests[-1]
+            statements.append(f"SELECT {index} AS {self.BATCH_INDEX_COLUMN};")
+            statements.append(build_sql_template(sp_name, tuple(input_params), tuple(output_params), f"_{index}"))
+            values.extend(input_params.values())
+
+        result_sets: List[list] = [[] for _ in calls]
+        index = 0
+        # 讀到各呼叫標示的時間, 作為該 SP 開始執行的時間
+        started_at = [time.perf_counter()] + [0.0] * (len(calls) - 1)
+        cursor = self.connection.cursor()
+        try:
+            for index, statements, values in requests:
+                cursor.execute(" ".join(statements), *values)
+                while True:
+                    if cursor.description:
+                        columns = [column[0] for column in cursor.description]
+                        if columns == [self.BATCH_INDEX_COLUMN]:
+                            index = cursor.fetchone()[0]
+                            started_at[index] = time.perf_counter()
+                        else:
+                            result_sets[index].append((columns, cursor.fetchall()))
+                    if not cursor.nextset():
+                        break
         except pyodbc.Error as ex:
-            log.critical(f"Stored Procedure 執行錯誤 [{sp_name}] {json.dumps(params)}")
+            self._observe_batch(calls, started_at, index)
+            sp_name = calls[index][0]
+            log.critical(f"Stored Procedure 批次執行錯誤 calls[{index}] [{sp_name}] {json.dumps(calls, default=str)}")
             self.connection.rollback()
-            raise ex
+            raise SPBatchError(index, sp_name, str(ex)) from ex
+        finally:
+            cursor.close()
+
+        responses = []
+        for index, (sets, output_params) in enumerate(zip(result_sets, output_params_list)):
+            if not sets:
+                self._observe_batch(calls, started_at, index)
+                self.connection.rollback()
+                raise SPBatchError(index, calls[index][0], "SP 執行完成，但沒有收到任何回傳資料。")
+            responses.append(self._build_batch_response(sets, output_params, columnar))
+        self._observe_batch(calls, started_at)
+        return responses
+
+    @classmethod
+    def split_batch_params(cls, index: int, sp_name: str, params: dict) -> Tuple[dict, dict]:
+        """將批次中單一呼叫的參數分為輸入參數與輸出參數, 並檢查輸入參數數量
+
+        Args:
+            index (int): 呼叫在 calls 中的位置
+            sp_name (str): SP 名稱
+            params (dict): SP 所需參數
+
+        Raises:
+            ValueError: 單一呼叫的輸入參數超過 BATCH_MAX_PARAMETERS, 無法在一次往返中執行
+
+        Returns:
+            Tuple[dict, dict]: 輸入參數與輸出參數
+        """
+        input_params = dict(params)
+        output_params = input_params.pop("outparam", {})
+        if len(input_params) > cls.BATCH_MAX_PARAMETERS:
+            raise ValueError(
+                f"calls[{index}] [{sp_name}] 有 {len(input_params)} 個輸入參數, "
+                f"超過批次執行每次往返的上限 {cls.BATCH_MAX_PARAMETERS}"
+            )
+        return input_params, output_params
+
+    @staticmethod
+    def _observe_batch(calls: List[Tuple[str, dict]], started_at: List[float], failed: Optional[int] = None) -> None:
+        """將批次中各 SP 的執行時間記錄到 sp_execution_seconds, 失敗時只記錄到失敗的呼叫為止
+
+        Args:
+            calls (List[Tuple[str, dict]]): (SP 名稱, SP 所需參數) 的 list
+            started_at (List[float]): 各呼叫開始執行的時間 (perf_counter)
+            failed (Optional[int], optional): 失敗的呼叫位置, 全部成功時為 None. Defaults to None.
+        """
+        finished_at = time.perf_counter()
+        last = len(calls) - 1 if failed is None else failed
+        for index in range(last + 1):
+            ended_at = started_at[index + 1] if index < last else finished_at
+            status = "error" if index == failed else "ok"
+            SP_EXECUTION_SECONDS.labels(calls[index][0], status).observe(max(ended_at - started_at[index], 0.0))
+
+    def _build_batch_response(self, sets: list, output_params: dict, columnar: bool) -> BaseSPResponse:
+        """將批次中單一呼叫的結果集轉為 BaseSPResponse, 規則同 execute
+
+        Args:
+            sets (list): 該呼叫的 (欄位名稱, 資料列) 結果集
+            output_params (dict): 輸出參數
+            columnar (bool): 是否以欄為單位回傳 result_set
+
+        Returns:
+            BaseSPResponse: SP 執行結果
+        """
+        columns, rows = sets[0]
+        if output_params and output_params.keys() == set(columns):
+            return BaseSPResponse.model_construct(
+                result_set=empty_result_set(columnar), output_parameters=dict(zip(columns, rows[0]))
+            )
+
+        result_set: Union[list, ColumnarResultSet]
+        if columnar:
+            data = dict(zip(columns, (list(values) for values in zip(*rows)))) if rows else {c: [] for c in columns}
+            result_set = ColumnarResultSet.model_construct(columns=columns, data=data)
+        else:
+            result_set = [dict(zip(columns, row)) for row in rows]
+
+        if output_params and len(sets) > 1:
+            output_columns, output_rows = sets[1]
+            output_params = dict(zip(output_columns, output_rows[0]))
+        return BaseSPResponse.model_construct(result_set=result_set, output_parameters=output_params)
 
     def build_sql(self, sp_name: str, input_params: dict, output_params: dict) -> str:
-        """建構完整的 SQL 語句, 且支援多個輸入參數與輸出參數
+        """建構參數化的 SQL 語句, 且支援多個輸入參數與輸出參數
+
+        輸入參數的值不會寫入 SQL, 執行時需依 input_params 的順序綁定參數值.
 
         回傳範例:
             DECLARE @O_MSG nvarchar(max);
-            EXEC [dbo].[SP_TEST] @O_MSG = @O_MSG OUTPUT, @DRIVERID = 'T123';
+            EXEC [dbo].[SP_TEST] @DRIVERID = ?, @O_MSG = @O_MSG OUTPUT;
             SELECT @O_MSG AS O_MSG;
 
         Args:
@@ -90,40 +361,7 @@ class StoredProcedureHandler:
         Returns:
             str: SQL 語句
         """
-        # DECLARE statement
-        declare_stmt = ""
-        if output_params:
-            declare_stmt = ", ".join([f"@{key} nvarchar(max)" for key in output_params.keys()])
-            declare_stmt = f"DECLARE {declare_stmt};"
-
-        # EXEC statement
-        input_stmt = ""
-        output_stmt = ""
-
-        if input_params:
-            input_stmt = ", ".join(
-                [
-                    f"@{key} = '{value}'" if value is not None else f"@{key} = NULL"
-                    for key, value in input_params.items()
-                ]
-            )
-        if output_params:
-            output_stmt = ", ".join([f"@{key} = @{key} OUTPUT" for key in output_params.keys()])
-
-        if input_stmt and output_stmt:
-            input_stmt += ", "
-
-        exec_stmt = f"EXEC [dbo].[{sp_name}] {input_stmt}{output_stmt};"
-
-        # SELECT statement
-        select_stmt = ""
-        if output_params:
-            select_stmt = ", ".join([f"@{key} AS {key}" for key in output_params.keys()])
-            select_stmt = f"SELECT {select_stmt};"
-
-        # final SQL
-        sql = f"{declare_stmt} {exec_stmt} {select_stmt}"
-        return sql
+        return build_sql_template(sp_name, tuple(input_params), tuple(output_params))
 
     def fetchall_as_dict(self, cursor: pyodbc.Cursor) -> list:
         """將 cursor 結果轉換為 dict, 並以 list 回傳
@@ -137,8 +375,205 @@ class StoredProcedureHandler:
         columns = [column[0] for column in cursor.description]
         return [dict(zip(columns, row)) for row in cursor.fetchall()]
 
+    def fetchall_as_columns(self, cursor: pyodbc.Cursor, batch_size: int = STREAM_BATCH_SIZE) -> ColumnarResultSet:
+        """將 cursor 結果轉換為以欄為單位的資料, 每個欄位一個 list
+
+        以 fetchmany 分批讀取, 每批直接併入各欄的 list, 不會建立每一列的 dict.
+
+        Args:
+            cursor (pyodbc.Cursor): Cursor
+            batch_size (int, optional): 每批筆數. Defaults to STREAM_BATCH_SIZE.
+
+        Returns:
+            ColumnarResultSet: 欄位名稱及各欄的值
+        """
+        columns = [column[0] for column in cursor.description]
+        values: List[list] = [[] for _ in columns]
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for column_values, batch_values in zip(values, zip(*rows)):
+                column_values.extend(batch_values)
+        return ColumnarResultSet.model_construct(columns=columns, data=dict(zip(columns, values)))
+
+    def fetchmany_as_dict(self, cursor: pyodbc.Cursor, batch_size: int = STREAM_BATCH_SIZE) -> Iterator[List[dict]]:
+        """以 fetchmany 分批將 cursor 結果轉換為 dict, 每批以 list 回傳
+
+        Args:
+            cursor (pyodbc.Cursor): Cursor
+            batch_size (int, optional): 每批筆數. Defaults to STREAM_BATCH_SIZE.
+
+        Yields:
+            List[dict]: 一批轉換後的 dict list
+        """
+        columns = [column[0] for column in cursor.description]
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [dict(zip(columns, row)) for row in rows]
+
+    def execute_stream(
+        self, sp_name: str, params: dict = {}, batch_size: int = STREAM_BATCH_SIZE
+    ) -> Iterator[List[dict]]:
+        """以串流模式執行 Stored Procedure, 分批回傳第一個結果集
+
+        不會一次把所有資料讀進記憶體, 適合回傳大量資料的報表 SP.
+        串流模式不支援輸出參數 (outparam), 因為輸出參數在所有資料之後才會回傳.
+
+        Args:
+            sp_name (str): SP 名稱
+            params (dict, optional): SP 所需參數. Defaults to {}.
+            batch_size (int, optional): 每批筆數. Defaults to STREAM_BATCH_SIZE.
+
+        Yields:
+            List[dict]: 一批資料
+
+        Raises:
+            ValueError: 串流模式不支援輸出參數
+            Error: 執行 SP 錯誤
+            ex: 執行 SP 錯誤
+        """
+        if "outparam" in params:
+            raise ValueError("串流模式不支援輸出參數 (outparam)")
+
+        cursor = self.connection.cursor()
+        try:
+            sql = self.build_sql(sp_name, params, {})
+            cursor.execute(sql, *params.values())
+
+            if not cursor.description:
+                raise pyodbc.Error("SP 執行完成，但沒有收到任何回傳資料。")
+
+            yield from self.fetchmany_as_dict(cursor, batch_size)
+
+        except pyodbc.Error as ex:
+            log.critical(f"Stored Procedure 執行錯誤 [{sp_name}] {json.dumps(params, default=str)}")
+            self.connection.rollback()
+            raise ex
+        finally:
+            cursor.close()
+
+
+_sp_caches: Dict[str, TTLCache] = {}
+_sp_caches_lock = threading.Lock()
+
+
+def get_sp_cache(sp_name: str) -> Optional[TTLCache]:
+    """取得 SP 的結果快取, 依 StoredProcedureMapping 的 cache_policy 建立
+
+    Args:
+        sp_name (str): SP 名稱
+
+    Returns:
+        Optional[TTLCache]: 結果快取, SP 未設定快取時為 None
+    """
+    cache = _sp_caches.get(sp_name)
+    if cache is None:
+        policy = StoredProcedureMapping[sp_name].cache_policy
+        if policy is None:
+            return None
+        with _sp_caches_lock:
+            cache = _sp_caches.get(sp_name)
+            if cache is None:
+                cache = TTLCache(max_entries=policy.max_entries, ttl=policy.ttl)
+                _sp_caches[sp_name] = cache
+    return cache
+
+
+def sp_cache_key(sp_name: str, params: dict, columnar: bool = False) -> bytes:
+    """依 SP 的 cache_policy 產生快取 key
+
+    Args:
+        sp_name (str): SP 名稱
+        params (dict): SP 所需參數
+        columnar (bool, optional): 是否以欄為單位回傳 result_set. Defaults to False.
+
+    Returns:
+        bytes: 快取 key
+    """
+    policy = StoredProcedureMapping[sp_name].cache_policy
+    input_params = {key: value for key, value in params.items() if key != "outparam"}
+    if policy is not None and policy.key_params is not None:
+        input_params = {key: input_params.get(key) for key in policy.key_params}
+    return orjson.dumps(
+        [columnar, input_params, sorted(params.get("outparam", {}))], default=str, option=orjson.OPT_SORT_KEYS
+    )
+
+
+def invalidate_sp_cache(sp_name: Optional[str] = None, params: Optional[dict] = None) -> None:
+    """清除 SP 結果快取, 例如資料異動之後
+
+    Args:
+        sp_name (Optional[str], optional): SP 名稱, None 表示清除所有 SP 的快取. Defaults to None.
+        params (Optional[dict], optional): 只清除這組參數的結果, None 表示清除該 SP 所有結果. Defaults to None.
+    """
+    if sp_name is None:
+        for sp_cache in list(_sp_caches.values()):
+            sp_cache.clear()
+        return
+
+    cache = get_sp_cache(sp_name)
+    if cache is None:
+        return
+    if params is None:
+        cache.clear()
+    else:
+        cache.invalidate(sp_cache_key(sp_name, params, columnar=False))
+        cache.invalidate(sp_cache_key(sp_name, params, columnar=True))
+
+
+def sp_cache_stats() -> Dict[str, dict]:
+    """各 SP 結果快取的命中/未命中/淘汰次數
+
+    Returns:
+        Dict[str, dict]: 以 SP 名稱為 key 的快取統計
+    """
+    return {sp_name: cache.stats() for sp_name, cache in list(_sp_caches.items())}
+
+
+def copy_cached_response(sp_result: BaseSPResponse) -> BaseSPResponse:
+    """複製快取中的 SP 結果交給呼叫端, 呼叫端修改資料列或輸出參數不會影響快取
+
+    只複製 list / dict 容器, 欄位值 (str, int, datetime, Decimal...) 不可變, 直接共用.
+
+    Args:
+        sp_result (BaseSPResponse): 快取中的 SP 結果
+
+    Returns:
+        BaseSPResponse: 複本
+    """
+    result_set = sp_result.result_set
+    if isinstance(result_set, ColumnarResultSet):
+        result_set = ColumnarResultSet.model_construct(
+            columns=list(result_set.columns), data={column: list(values) for column, values in result_set.data.items()}
+        )
+    else:
+        result_set = [dict(row) for row in result_set]
+    return BaseSPResponse.model_construct(result_set=result_set, output_parameters=dict(sp_result.output_parameters))
+
 
-def simple_sp_execution(sp_name: str, params: dict = {}) -> BaseSPResponse:
+def _execute_on_pooled_connection(sp_name: str, params: dict, columnar: bool) -> BaseSPResponse:
+    """借用連線池的連線執行 Stored Procedure
+
+    Args:
+        sp_name (str): SP 名稱
+        params (dict): SP 所需參數
+        columnar (bool): 是否以欄為單位回傳 result_set
+
+    Returns:
+        BaseSPResponse: SP 執行結果
+    """
+    db = StoredProcedureMapping[sp_name].db
+    with use_with_create_connection(database=db) as connection:
+        sp = StoredProcedureHandler(connection)
+        sp_result = sp.execute(sp_name, params, columnar)
+
+    return sp_result
+
+
+def simple_sp_execution(sp_name: str, params: dict = {}, columnar: bool = False) -> BaseSPResponse:
     """一個簡單的執行 Stored Procedure 的方法
 
     ※ 若有輸入參數, 例如: @@DRIVERID VARCHAR(20)
@@ -149,17 +584,257 @@ def simple_sp_execution(sp_name: str, params: dict = {}) -> BaseSPResponse:
     則需在 params 中加入 outparam 參數, 並將所有輸出參數包含在內
     例如: params = {"outparam": {"O_MSG": ""}}
 
+    ※ 若 SP 在 StoredProcedureMapping 設定了 cache_policy, 相同參數會直接回傳快取結果 (的複本),
+    同時間相同參數的呼叫只會執行一次 SP
+
     Args:
         sp_name (str): SP 名稱
         params (dict, optional): SP 所需參數. Defaults to {}.
             ※ outparam (dict): 輸出參數
+        columnar (bool, optional): 是否以欄為單位回傳 result_set. Defaults to False.
 
     Returns:
         BaseSPResponse: SP 執行結果
     """
+    cache = get_sp_cache(sp_name)
+    if cache is None:
+        return _execute_on_pooled_connection(sp_name, params, columnar)
+
+    return copy_cached_response(
+        cache.get_or_load(
+            sp_cache_key(sp_name, params, columnar), partial(_execute_on_pooled_connection, sp_name, params, columnar)
+        )
+    )
+
+
+def batch_sp_execution(
+    calls: List[Tuple[StoredProcedureMapping, dict]], columnar: bool = False
+) -> List[BaseSPResponse]:
+    """批次執行多個彼此獨立的 Stored Procedure, 同一個 DB 的呼叫只需一個連線、一次往返
+
+    批次執行不經過 SP 結果快取. 同一個 DB 的呼叫在同一個交易中執行, 全部成功或全部 rollback.
+    某一個呼叫的輸入參數超過 StoredProcedureHandler.BATCH_MAX_PARAMETERS 時, 在任何 DB 執行之前拋出 ValueError.
+
+    ※ 不同 DB 的呼叫依 DB 分組, 各自在自己的交易中依序執行, 不是分散式交易:
+    後面的 DB 失敗時, 前面的 DB 已經 commit, 無法 rollback, 這些呼叫在 calls 中的位置會放在
+    SPBatchError.committed. 需要全部成功或全部失敗的呼叫請放在同一個 DB.
+
+    例如:
+        batch_sp_execution([
+            (StoredProcedureMapping.SP_FAKE1, {"DRIVERID": "T123"}),
+            (StoredProcedureMapping.SP_FAKE2, {"outparam": {"O_MSG": ""}}),
+        ])
+
+    Args:
+        calls (List[Tuple[StoredProcedureMapping, dict]]): (SP, SP 所需參數) 的 list
+        columnar (bool, optional): 是否以欄為單位回傳 result_set. Defaults to False.
+
+    Returns:
+        List[BaseSPResponse]: 依 calls 順序的 SP 執行結果
+
+    Raises:
+        SPBatchError: 某一個呼叫執行錯誤 (或該 DB 連線 / commit 失敗), index 為該呼叫在 calls 中的位置,
+            committed 為其他 DB 已經 commit 的呼叫
+    """
+    groups: Dict[str, List[int]] = {}
+    for position, (sp, params) in enumerate(calls):
+        StoredProcedureHandler.split_batch_params(position, sp.name, params)
+        groups.setdefault(sp.db, []).append(position)
+
+    responses: List[Optional[BaseSPResponse]] = [None] * len(calls)
+    committed: List[int] = []
+    for db, positions in groups.items():
+        try:
+            with use_with_create_connection(database=db) as connection:
+                sp_handler = StoredProcedureHandler(connection)
+                group_responses = sp_handler.execute_batch(
+                    [(calls[position][0].name, calls[position][1]) for position in positions], columnar
+                )
+        except SPBatchError as ex:
+            # 換算為在 calls 中的位置
+            raise SPBatchError(positions[ex.index], ex.sp_name, ex.message, committed) from ex
+        except pyodbc.Error as ex:
+            # 連線或 commit 失敗, 整組 rollback
+            raise SPBatchError(positions[0], calls[positions[0]][0].name, str(ex), committed) from ex
+        committed.extend(positions)
+        for position, response in zip(positions, group_responses):
+            responses[position] = response
+
+    return [response for response in responses if response is not None]
+
+
+# 執行中的快取載入, 保留參考避免 task 被回收; 發起的 request 被取消時載入仍會完成並交給其他等待者
+_cache_loads: Set[asyncio.Task] = set()
+
+
+async def _load_sp_cache(
+    cache: TTLCache, key: Hashable, future: Future, db: str, loader: Callable[[], BaseSPResponse]
+) -> None:
+    """在 DB 執行緒池執行 SP, 結果放入快取並交給所有等待相同 key 的呼叫端
+
+    Args:
+        cache (TTLCache): SP 的結果快取
+        key (Hashable): 快取 key
+        future (Future): TTLCache.claim 取得的 future
+        db (str): SP 所對應的 DB 名稱
+        loader (Callable[[], BaseSPResponse]): 執行 SP
+
+    Raises:
+        BaseException: 載入被取消 (例如 event loop 結束), 等待者同樣收到錯誤
+    """
+    try:
+        sp_result = await run_in_db_executor(db, loader)
+    except BaseException as ex:
+        # 錯誤 (例如 ExecutorBusyError) 由等待者各自拋出
+        cache.fail(key, future, ex)
+        if not isinstance(ex, Exception):
+            raise
+    else:
+        cache.complete(key, future, sp_result)
+
+
+async def async_sp_execution(sp_name: str, params: dict = {}, columnar: bool = False) -> BaseSPResponse:
+    """simple_sp_execution 的非同步版本, 供 async def 的 API 使用
+
+    SP 會在該 DB 專用的執行緒池中執行, 不會卡住 event loop;
+    排隊已滿且等待逾時會拋出 ExecutorBusyError.
+    設定 cache_policy 的 SP, 同時間相同參數的呼叫只佔用一個 DB 執行緒, 其他呼叫在 event loop 上等待結果.
+    參數規則同 simple_sp_execution.
+
+    Args:
+        sp_name (str): SP 名稱
+        params (dict, optional): SP 所需參數. Defaults to {}.
+            ※ outparam (dict): 輸出參數
+        columnar (bool, optional): 是否以欄為單位回傳 result_set. Defaults to False.
+
+    Returns:
+        BaseSPResponse: SP 執行結果
+    """
+    db = StoredProcedureMapping[sp_name].db
+    cache = get_sp_cache(sp_name)
+    if cache is None:
+        return await run_in_db_executor(db, simple_sp_execution, sp_name, params, columnar)
+
+    # 快取命中, 或相同參數已經在執行時, 在 event loop 上等待結果, 不佔用 DB 執行緒
+    key = sp_cache_key(sp_name, params, columnar)
+    claim = cache.claim(key)
+    if claim.future is None:
+        return copy_cached_response(claim.value)
+    if claim.owner:
+        task = asyncio.create_task(
+            _load_sp_cache(
+                cache, key, claim.future, db, partial(_execute_on_pooled_connection, sp_name, params, columnar)
+            )
+        )
+        _cache_loads.add(task)
+        task.add_done_callback(_cache_loads.discard)
+    return copy_cached_response(await asyncio.wrap_future(claim.future))
+
+
+def stream_sp_execution(
+    sp_name: str, params: dict = {}, batch_size: int = StoredProcedureHandler.STREAM_BATCH_SIZE
+) -> Generator[List[dict], None, None]:
+    """以串流模式執行 Stored Procedure, 分批回傳資料
+
+    DB 連線會一直借用到資料讀完 (或 generator 被關閉) 為止, 記憶體用量只與 batch_size 有關.
+    參數規則同 simple_sp_execution, 但不支援輸出參數.
+
+    Args:
+        sp_name (str): SP 名稱
+        params (dict, optional): SP 所需參數. Defaults to {}.
+        batch_size (int, optional): 每批筆數. Defaults to StoredProcedureHandler.STREAM_BATCH_SIZE.
+
+    Yields:
+        List[dict]: 一批資料
+    """
     db = StoredProcedureMapping[sp_name].db
     with use_with_create_connection(database=db) as connection:
         sp = StoredProcedureHandler(connection)
-        sp_result = sp.execute(sp_name, params)
+        yield from sp.execute_stream(sp_name, params, batch_size)
 
-    return sp_result
+
+def encode_ndjson(batches: Iterator[List[dict]]) -> Iterator[bytes]:
+    """將分批資料編碼為 NDJSON, 每批輸出一個 chunk
+
+    Args:
+        batches (Iterator[List[dict]]): 分批資料
+
+    Yields:
+        bytes: 一批資料, 每列一行 JSON
+    """
+    option = ORJSON_OPTIONS | orjson.OPT_APPEND_NEWLINE
+    for batch in batches:
+        yield b"".join([orjson.dumps(row, default=orjson_default, option=option) for row in batch])
+
+
+def encode_json_array(batches: Iterator[List[dict]]) -> Iterator[bytes]:
+    """將分批資料編碼為一個 JSON array, 每批輸出一個 chunk
+
+    Args:
+        batches (Iterator[List[dict]]): 分批資料
+
+    Yields:
+        bytes: JSON array 的片段
+    """
+    separator = b"["
+    for batch in batches:
+        yield separator + b",".join([orjson.dumps(row, default=orjson_default, option=ORJSON_OPTIONS) for row in batch])
+        separator = b","
+    yield b"[]" if separator == b"[" else b"]"
+
+
+async def iterate_sp_stream(
+    batches: Generator[List[dict], None, None], chunks: Iterator[bytes]
+) -> AsyncIterator[bytes]:
+    """在執行緒池逐段產生 response 片段, 結束、發生錯誤或用戶端斷線時在執行緒池關閉 batches
+
+    stream_sp_execution 的 generator 借用著 DB 連線, 關閉時才 rollback 並歸還連線.
+    直接把同步 iterator 交給 StreamingResponse 時, 斷線後要等 generator 被回收才歸還, 而且在 event loop 上執行.
+    這裡在 finally 中關閉, 斷線造成的取消不會中斷關閉.
+
+    Args:
+        batches (Generator[List[dict], None, None]): stream_sp_execution 回傳的 generator
+        chunks (Iterator[bytes]): 由 batches 編碼的 response 片段
+
+    Yields:
+        bytes: response 片段
+    """
+    try:
+        while True:
+            chunk = await run_in_threadpool(next, chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        with anyio.CancelScope(shield=True):
+            await run_in_threadpool(batches.close)
+
+
+def sp_streaming_response(
+    sp_name: str,
+    params: dict = {},
+    media_format: str = "ndjson",
+    batch_size: int = StoredProcedureHandler.STREAM_BATCH_SIZE,
+) -> StreamingResponse:
+    """以 StreamingResponse 回傳 Stored Procedure 的結果, 邊讀邊送
+
+    讀取、編碼與關閉都在執行緒池進行, 用戶端斷線時立即歸還 DB 連線 (見 iterate_sp_stream).
+
+    Args:
+        sp_name (str): SP 名稱
+        params (dict, optional): SP 所需參數. Defaults to {}.
+        media_format (str, optional): "ndjson" (每列一行) 或 "json" (JSON array). Defaults to "ndjson".
+        batch_size (int, optional): 每批筆數. Defaults to StoredProcedureHandler.STREAM_BATCH_SIZE.
+
+    Returns:
+        StreamingResponse: 串流回應
+
+    Raises:
+        ValueError: 不支援的格式
+    """
+    encoders = {"ndjson": (encode_ndjson, "application/x-ndjson"), "json": (encode_json_array, "application/json")}
+    if media_format not in encoders:
+        raise ValueError(f"不支援的格式: {media_format}")
+    encode, media_type = encoders[media_format]
+    batches = stream_sp_execution(sp_name, params, batch_size)
+    return StreamingResponse(iterate_sp_stream(batches, encode(batches)), media_type=media_type)
@@ -0,0 +1,244 @@
+"""Token 撤銷清單."""
+
+import fcntl
+import math
+import os
+import threading
+import time
+from typing import Dict, Optional
+import orjson
+from app import log
+from app.config.jwt import JWTEnvs
+
+
+class BloomFilter:
+    """Bloom filter, 判斷為不存在時一定不存在, 判斷為存在時才需要再確認
+
+    使用 Python 的 str hash (同一個 process 內固定且會快取在 str 上) 做 double hashing,
+    所以不能跨 process 保存, 重新載入時由完整清單重建.
+
+    Attributes:
+        size: bit 數
+        hash_count: 每個值使用的 hash 數
+    """
+
+    def __init__(self, capacity: int, false_positive_rate: float) -> None:
+        """依預期數量與誤判率決定大小.
+
+        Args:
+            capacity (int): 預期的值數量
+            false_positive_rate (float): 誤判率 (0~1)
+        """
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(false_positive_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def add(self, value: str) -> None:
+        """加入一個值
+
+        Args:
+            value (str): 值
+        """
+        hashed = hash(value)
+        first, second = hashed & 0xFFFFFFFF, (hashed >> 32) | 1
+        for index in range(self.hash_count):
+            position = (first + index * second) % self.size
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value: str) -> bool:
+        """是否可能存在
+
+        Args:
+            value (str): 值
+
+        Returns:
+            bool: False 時一定不存在
+        """
+        hashed = hash(value)
+        first, second = hashed & 0xFFFFFFFF, (hashed >> 32) | 1
+        for index in range(self.hash_count):
+            position = (first + index * second) % self.size
+            if not self._bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class RevocationList:
+    """已撤銷的 Token (jti) 清單
+
+    先查 Bloom filter, 只有可能已撤銷時才查完整清單, 未撤銷的 token 不需要查 DB.
+    jti 在 token 的 exp 之後自動移除 (token 本身已失效), 並重建 Bloom filter.
+
+    設定 path 時, 撤銷時會與檔案合併後寫回, 並每 reload_interval 秒檢查檔案是否被其他 worker 修改.
+
+    Attributes:
+        path: 快照檔路徑, 未設定時只保存在記憶體
+        capacity: Bloom filter 預期的數量
+        false_positive_rate: Bloom filter 誤判率
+        reload_interval: 檢查快照檔是否修改的間隔秒數
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = JWTEnvs.JWT_REVOCATION_FILE.value,
+        capacity: int = int(JWTEnvs.JWT_REVOCATION_CAPACITY.value),
+        false_positive_rate: float = float(JWTEnvs.JWT_REVOCATION_FALSE_POSITIVE_RATE.value),
+        reload_interval: float = float(JWTEnvs.JWT_REVOCATION_RELOAD_INTERVAL.value),
+    ) -> None:
+        """Init.
+
+        Args:
+            path (Optional[str]): 快照檔路徑
+            capacity (int): Bloom filter 預期的數量, 超過時自動加大
+            false_positive_rate (float): Bloom filter 誤判率
+            reload_interval (float): 檢查快照檔是否修改的間隔秒數
+        """
+        self.path = path
+        self.capacity = capacity
+        self.false_positive_rate = false_positive_rate
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._expires: Dict[str, float] = {}
+        self._filter = BloomFilter(capacity, false_positive_rate)
+        self._next_purge = math.inf
+        self._mtime = 0.0
+        self._checked_at = time.monotonic()
+
+    def _rebuild_locked(self) -> None:
+        """以完整清單重建 Bloom filter; must be called with the lock held."""
+        self.capacity = max(self.capacity, len(self._expires) * 2)
+        bloom = BloomFilter(self.capacity, self.false_positive_rate)
+        for jti in self._expires:
+            bloom.add(jti)
+        self._filter = bloom
+        self._next_purge = min(self._expires.values(), default=math.inf)
+
+    def _merge_locked(self, entries: Dict[str, float]) -> None:
+        """加入多筆 jti; must be called with the lock held.
+
+        Args:
+            entries (Dict[str, float]): jti 與 exp (unix time)
+        """
+        now = time.time()
+        for jti, exp in entries.items():
+            if exp > now and jti not in self._expires:
+                self._expires[jti] = exp
+                self._filter.add(jti)
+                self._next_purge = min(self._next_purge, exp)
+        if len(self._expires) > self.capacity:
+            self._rebuild_locked()
+
+    def purge(self) -> None:
+        """移除已過期的 jti 並重建 Bloom filter"""
+        now = time.time()
+        with self._lock:
+            expired = [jti for jti, exp in self._expires.items() if exp <= now]
+            for jti in expired:
+                del self._expires[jti]
+            self._rebuild_locked()
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        """Token 是否已撤銷
+
+        Args:
+            jti (Optional[str]): Token 的 jti, 沒有 jti 的舊 token 視為未撤銷
+
+        Returns:
+            bool: 是否已撤銷
+        """
+        if time.monotonic() - self._checked_at >= self.reload_interval:
+            self._reload_if_changed()
+        if jti is None or not self._expires or jti not in self._filter:
+            return False
+        return jti in self._expires
+
+    def revoke(self, jti: str, exp: float) -> None:
+        """撤銷 token
+
+        Args:
+            jti (str): Token 的 jti
+            exp (float): Token 的 exp (unix time), 之後自動移除
+        """
+        with self._lock:
+            self._merge_locked({jti: exp})
+        if self.path:
+            self.save()
+
+    def _reload_if_changed(self) -> None:
+        """檢查快照檔是否被修改, 並移除已過期的 jti"""
+        self._checked_at = time.monotonic()
+
+        if time.time() >= self._next_purge:
+            self.purge()
+        if self.path and os.path.exists(self.path) and os.path.getmtime(self.path) != self._mtime:
+            self.load()
+
+    def load(self) -> None:
+        """載入快照檔並與記憶體中的清單合併"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, "rb") as file:
+                entries = orjson.loads(file.read())
+        except (OSError, orjson.JSONDecodeError) as ex:
+            log.critical(f"Token 撤銷清單載入失敗 [{self.path}]: {ex}")
+            return
+        with self._lock:
+            self._merge_locked(entries)
+            self._mtime = mtime
+
+    def save(self) -> None:
+        """與快照檔合併後寫回, 先寫入暫存檔再取代, 讀取端不會讀到寫到一半的檔案
+
+        合併到取代的期間持有 <path>.lock 的 flock, 多個 worker 同時撤銷時依序合併,
+        不會以自己的快照覆蓋其他 worker 剛寫入的 jti.
+        """
+        if not self.path:
+            return
+        with open(f"{self.path}.lock", "ab") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            self.load()
+            with self._lock:
+                data = orjson.dumps(self._expires)
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as file:
+                file.write(data)
+            os.replace(temp_path, self.path)
+            with self._lock:
+                self._mtime = os.path.getmtime(self.path)
+
+    def stats(self) -> dict:
+        """撤銷清單的統計
+
+        Returns:
+            dict: 數量與 Bloom filter 大小
+        """
+        with self._lock:
+            return {
+                "revoked": len(self._expires),
+                "capacity": self.capacity,
+                "filter_bytes": len(self._filter._bits),
+                "hash_count": self._filter.hash_count,
+            }
+
+
+_revocation_list: Optional[RevocationList] = None
+_revocation_list_lock = threading.Lock()
+
+
+def get_revocation_list() -> RevocationList:
+    """取得 token 撤銷清單, 所有 JWTHandler 共用; 第一次使用時載入快照檔
+
+    Returns:
+        RevocationList: 撤銷清單
+    """
+    global _revocation_list
+    if _revocation_list is None:
+        with _revocation_list_lock:
+            if _revocation_list is None:
+                revocation_list = RevocationList()
+                revocation_list.load()
+                _revocation_list = revocation_list
+    return _revocation_list
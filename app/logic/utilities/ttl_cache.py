@@ -0,0 +1,255 @@
+"""In-process LRU cache with per-entry TTL and single-flight loading."""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, NamedTuple, Optional, Tuple, Union
+
+
+class Claim(NamedTuple):
+    """Result of ``TTLCache.claim``.
+
+    Attributes:
+        value: The cached value on a hit.
+        future: The load of the key on a miss, None on a hit; it cannot be cancelled, so waiters may give up
+            without affecting it.
+        owner: Whether this caller started the load and must finish it with ``complete`` or ``fail``.
+    """
+
+    value: Any = None
+    future: Optional[Future] = None
+    owner: bool = False
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after a TTL.
+
+    ``get_or_load`` coalesces concurrent misses for the same key: the first caller runs the loader and the others
+    wait for its result, so a burst of identical requests costs one load. Failed loads are not cached.
+    Async callers use ``claim`` / ``complete`` / ``fail`` directly and wait on the load's future from the event loop.
+    """
+
+    def __init__(self, max_entries: int, ttl: float) -> None:
+        """Initialize an empty cache.
+
+        Args:
+            max_entries (int): Maximum number of entries; the least recently used entry is evicted beyond it.
+            ttl (float): Default time-to-live in seconds.
+
+        Raises:
+            ValueError: Invalid cache size.
+        """
+        if max_entries < 1:
+            raise ValueError(f"max_entries must be positive, got {max_entries}")
+
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _get_locked(self, key: Hashable, now: float) -> Tuple[bool, Any]:
+        """Look up a live entry; must be called with the lock held.
+
+        Args:
+            key (Hashable): Cache key.
+            now (float): Current monotonic time.
+
+        Returns:
+            Tuple[bool, Any]: (found, value).
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= now:
+            del self._entries[key]
+            self.expirations += 1
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def _set_locked(self, key: Hashable, value: Any, ttl: float, now: float) -> None:
+        """Store an entry and evict beyond ``max_entries``; must be called with the lock held.
+
+        Args:
+            key (Hashable): Cache key.
+            value (Any): Value to cache.
+            ttl (float): Time-to-live in seconds.
+            now (float): Current monotonic time.
+        """
+        if ttl <= 0:
+            return
+        self._entries[key] = (now + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def lookup(self, key: Hashable) -> Tuple[bool, Any]:
+        """Look up a key without loading it; only hits are counted.
+
+        Args:
+            key (Hashable): Cache key.
+
+        Returns:
+            Tuple[bool, Any]: (found, value).
+        """
+        with self._lock:
+            found, value = self._get_locked(key, time.monotonic())
+            if found:
+                self.hits += 1
+            return found, value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value.
+
+        Args:
+            key (Hashable): Cache key.
+            value (Any): Value to cache.
+            ttl (Optional[float]): Time-to-live in seconds, defaults to the cache TTL.
+        """
+        with self._lock:
+            self._set_locked(key, value, self.ttl if ttl is None else ttl, time.monotonic())
+
+    def claim(self, key: Hashable) -> Claim:
+        """Look up a key, or join its load in flight, or start a new load.
+
+        Args:
+            key (Hashable): Cache key.
+
+        Returns:
+            Claim: A hit, the load to wait for, or a new load that the caller owns.
+        """
+        with self._lock:
+            found, value = self._get_locked(key, time.monotonic())
+            if found:
+                self.hits += 1
+                return Claim(value)
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                self.coalesced += 1
+                return Claim(future=inflight)
+            self.misses += 1
+            future: Future = Future()
+            # 等待者 (例如 asyncio.wrap_future) 被取消時不會連帶取消共用的 future
+            future.set_running_or_notify_cancel()
+            self._inflight[key] = future
+            return Claim(future=future, owner=True)
+
+    def complete(
+        self, key: Hashable, future: Future, value: Any, ttl: Union[None, float, Callable[[Any], float]] = None
+    ) -> Any:
+        """Finish an owned load: cache the value and hand it to every waiter.
+
+        Args:
+            key (Hashable): Cache key.
+            future (Future): The future returned by ``claim``.
+            value (Any): The loaded value.
+            ttl (Union[None, float, Callable[[Any], float]]): Time-to-live in seconds, or a function computing it
+                from the loaded value (capped at the cache TTL); defaults to the cache TTL.
+
+        Returns:
+            Any: The loaded value.
+        """
+        if callable(ttl):
+            ttl = min(ttl(value), self.ttl)
+        with self._lock:
+            # 載入期間被 invalidate 時, 結果只交給等待中的呼叫端, 不放入快取
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+                self._set_locked(key, value, self.ttl if ttl is None else ttl, time.monotonic())
+        future.set_result(value)
+        return value
+
+    def fail(self, key: Hashable, future: Future, ex: BaseException) -> None:
+        """Finish an owned load with an error; nothing is cached and every waiter gets the error.
+
+        Args:
+            key (Hashable): Cache key.
+            future (Future): The future returned by ``claim``.
+            ex (BaseException): The loader's error.
+        """
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+        future.set_exception(ex)
+
+    def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Any],
+        ttl: Union[None, float, Callable[[Any], float]] = None,
+    ) -> Any:
+        """Return the cached value, or load it once for all concurrent callers of the same key.
+
+        Args:
+            key (Hashable): Cache key.
+            loader (Callable[[], Any]): Function producing the value on a miss.
+            ttl (Union[None, float, Callable[[Any], float]]): Time-to-live in seconds, or a function computing it
+                from the loaded value (capped at the cache TTL); defaults to the cache TTL.
+
+        Returns:
+            Any: The cached or freshly loaded value.
+
+        Raises:
+            Exception: Whatever the loader raised.
+        """
+        claim = self.claim(key)
+        if claim.future is None:
+            return claim.value
+        if not claim.owner:
+            return claim.future.result()
+
+        try:
+            value = loader()
+        except BaseException as ex:
+            self.fail(key, claim.future, ex)
+            raise
+        return self.complete(key, claim.future, value, ttl)
+
+    def invalidate(self, key: Hashable) -> None:
+        """Drop one key, including a load in flight.
+
+        Args:
+            key (Hashable): Cache key.
+        """
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+            self._inflight.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop every entry, including loads in flight."""
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._inflight.clear()
+
+    def stats(self) -> dict:
+        """Snapshot of the cache counters.
+
+        Returns:
+            dict: Size and hit / miss / eviction counters.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
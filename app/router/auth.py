@@ -4,7 +4,7 @@ from app import log
 from app.schema.auth import PayloadSchema, LoginOutputSchema, PayloadDataSchema
 from app.schema.base_response import BaseAPIResponse
 from app.logic.auth import AuthLogic
-from app.logic.utilities.jwt_handler import JWTHandler
+from app.logic.utilities.jwt_handler import JWTHandler, oauth2_scheme
 
 
 jwt = JWTHandler()
@@ -80,3 +80,52 @@ def say_my_name(request: Request, payload: PayloadDataSchema = Depends(jwt.verif
         return BaseAPIResponse(success=True, data=payload.user_info, message="Hello, " + payload.user_info["user_name"])
     except Exception as ex:
         log.critical(ex, exc_info=True)
+
+
+@router.post(
+    "/logout",
+    description="登出, 撤銷目前的 access token 與同一次登入的 refresh token",
+    response_model=BaseAPIResponse,
+)
+def logout(request: Request, access_token: str = Depends(oauth2_scheme)) -> BaseAPIResponse:
+    """登出.
+
+    Args:
+        request (Request): Request
+        access_token (str): Access Token
+
+    Raises:
+        ex: 撤銷失敗
+
+    Returns:
+        BaseAPIResponse: API 結果
+    """
+    try:
+        jwt.revoke_token(access_token)
+        return BaseAPIResponse(success=True, message="Logged out")
+    except Exception as ex:
+        log.critical(ex, exc_info=True)
+        raise ex
+
+
+@router.get(
+    "/.well-known/jwks.json",
+    description="Access Token 驗證用公鑰 (JWKS)",
+)
+def jwks(request: Request) -> dict:
+    """Access Token 驗證用公鑰, 供其他服務在本地驗證 token.
+
+    Args:
+        request (Request): Request
+
+    Raises:
+        ex: 金鑰載入錯誤
+
+    Returns:
+        dict: JWKS, 使用 HMAC 時為空
+    """
+    try:
+        return jwt.key_set.public_jwks()
+    except Exception as ex:
+        log.critical(ex, exc_info=True)
+        raise ex
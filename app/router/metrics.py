@@ -0,0 +1,21 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.logic.core.metrics import REGISTRY
+
+
+router = APIRouter()
+
+
+@router.get(
+    "/metrics",
+    description="Prometheus 監控指標",
+    response_class=PlainTextResponse,
+    include_in_schema=False,
+)
+def metrics() -> PlainTextResponse:
+    """Prometheus 監控指標.
+
+    Returns:
+        PlainTextResponse: Prometheus text format 的監控指標
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
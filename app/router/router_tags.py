@@ -6,7 +6,9 @@ class RouterTags(Enum):
 
     Attributes:
         auth: 身份驗證及管理
+        metrics: 監控指標
 
     """
 
     auth = "帳號登入"
+    metrics = "監控指標"
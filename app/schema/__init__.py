@@ -1,7 +1,13 @@
 """Init."""
 
 import orjson
+from decimal import Decimal
 from typing import Any, Callable
+from pydantic_core import PydanticSerializationError, to_jsonable_python
+
+# 時區為 UTC 的 datetime 輸出 "Z" 而不是 "+00:00", 與 pydantic 相同;
+# dict 的 key 不是 str (例如 int) 時轉為字串, 與標準 json 相同, 否則 orjson 會 raise TypeError
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
 
 
 def orjson_dumps(v: Any, *, default: Callable) -> str:
@@ -17,3 +23,29 @@ def orjson_dumps(v: Any, *, default: Callable) -> str:
         _type_: 序列化後的JSON字符串
     """
     return orjson.dumps(v, default=default).decode()
+
+
+def orjson_default(obj: Any) -> Any:
+    """Orjson 無法直接序列化的型態, 輸出與 pydantic (FastAPI response) 相同的結果
+
+    datetime / date / time / UUID orjson 已原生支援且格式相同 (UTC 需搭配 ORJSON_OPTIONS);
+    Decimal 輸出字串 (例如 "1.50"), bytes 以 UTF-8 解碼為字串,
+    其他型態 (例如 timedelta, Enum, pydantic model) 交給 pydantic 轉換.
+
+    Args:
+        obj (Any): 無法序列化的對象
+
+    Returns:
+        Any: 可序列化的對象
+
+    Raises:
+        TypeError: 不支援的型態
+    """
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return bytes(obj).decode("utf-8", errors="replace")
+    try:
+        return to_jsonable_python(obj)
+    except PydanticSerializationError:
+        raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}") from None
@@ -1,7 +1,9 @@
 """Base api response."""
 
-from typing import Any
+from typing import Any, Union
+import orjson
 from pydantic import BaseModel
+from app.schema import ORJSON_OPTIONS, orjson_default
 
 
 class BaseAPIResponse(BaseModel):
@@ -18,15 +20,29 @@ class BaseAPIResponse(BaseModel):
     data: Any = None
 
 
+class ColumnarResultSet(BaseModel):
+    """以欄為單位的 Stored Procedure 回傳資料, 欄位名稱只出現一次
+
+    例如: {"columns": ["ID", "NAME"], "data": {"ID": [1, 2], "NAME": ["A", "B"]}}
+
+    Attributes:
+        columns (list): 欄位名稱, 依 SP 回傳順序
+        data (dict): 欄位名稱對應該欄所有值的 list
+    """
+
+    columns: list = []
+    data: dict = {}
+
+
 class BaseSPResponse(BaseModel):
     """Stored Procedure 回傳資料結構
 
     Attributes:
-        result_set (list): 回傳資料
+        result_set (Union[list, ColumnarResultSet]): 回傳資料, 預設為 dict list, columnar 模式為 ColumnarResultSet
         output_parameters (dict): 輸出參數
     """
 
-    result_set: list = []
+    result_set: Union[list, ColumnarResultSet] = []
     output_parameters: dict = {}
 
 
@@ -38,3 +54,33 @@ class BaseSPAPIResponse(BaseAPIResponse):
     """
 
     data: BaseSPResponse = BaseSPResponse()
+
+    @classmethod
+    def from_sp_response(cls, data: BaseSPResponse, success: bool = True, message: str = "") -> "BaseSPAPIResponse":
+        """由 SP 執行結果建立, 資料直接來自 DB, 不重新驗證
+
+        Args:
+            data (BaseSPResponse): SP 執行結果
+            success (bool, optional): 成功 or 失敗. Defaults to True.
+            message (str, optional): 回傳訊息. Defaults to "".
+
+        Returns:
+            BaseSPAPIResponse: API 回傳資料
+        """
+        return cls.model_construct(success=success, message=message, data=data)
+
+    def dump_json(self) -> bytes:
+        """以 orjson 直接編碼 result_set, 不經過 pydantic 序列化, 輸出與 FastAPI 的 response 相同
+
+        Returns:
+            bytes: JSON
+        """
+        result_set: Any = self.data.result_set
+        if isinstance(result_set, ColumnarResultSet):
+            result_set = {"columns": result_set.columns, "data": result_set.data}
+        payload = {
+            "success": self.success,
+            "message": self.message,
+            "data": {"result_set": result_set, "output_parameters": self.data.output_parameters},
+        }
+        return orjson.dumps(payload, default=orjson_default, option=ORJSON_OPTIONS)
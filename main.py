@@ -1,17 +1,46 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 from fastapi import FastAPI
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.concurrency import run_in_threadpool
+from app.config.stored_procedure_mapping import StoredProcedureMapping
+from app.logic.core.afs_async_manager import close_async_afs_manager
+from app.logic.core.afs_manager import close_afs_manager
+from app.logic.core.db_executor import shutdown_executors
+from app.logic.core.db_manager import close_pools, warm_up_pools
 from app.logic.core.logging import APILog
-from app.router import auth
+from app.logic.core.metrics import MetricsMiddleware
+from app.logic.core.responses import ORJSONResponse
+from app.logic.utilities.token_revocation import get_revocation_list
+from app.router import auth, metrics
 from app import log
 from app.router.router_tags import RouterTags
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """App 啟動時預先建立 DB 連線池並載入 token 撤銷清單, 關閉時釋放所有連線 (含 AFS 連線池).
+
+    Args:
+        app (FastAPI): FastAPI app
+    """
+    await run_in_threadpool(warm_up_pools, [sp.db for sp in StoredProcedureMapping])
+    await run_in_threadpool(get_revocation_list)
+    yield
+    await run_in_threadpool(shutdown_executors)
+    await run_in_threadpool(close_pools)
+    await run_in_threadpool(close_afs_manager)
+    await close_async_afs_manager()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # Router
 app.include_router(auth.router, prefix="/api", tags=[RouterTags.auth])
+app.include_router(metrics.router, tags=[RouterTags.metrics])
 
 # Middleware
-app.add_middleware(BaseHTTPMiddleware, dispatch=APILog())
+app.add_middleware(APILog)
+app.add_middleware(MetricsMiddleware)
 
 
 @app.get("/")
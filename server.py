@@ -0,0 +1,395 @@
+"""正式環境啟動程式: 先建立 socket, 再 fork 多個 uvicorn worker (uvloop + httptools) 共用.
+
+    python server.py --workers 4 --max-requests 10000 --max-requests-jitter 1000 --max-rss-mb 512
+
+master 不處理 request, 只負責:
+    - 維持 worker 數量, worker 結束 (達到 max requests / 異常) 時補上新的 worker
+    - worker RSS 超過上限時先補上新的 worker 再讓舊的 worker 處理完 request 後結束
+    - 收集所有 worker 的 log 統一寫入, 多個 process 不會同時寫入 / rotate 同一個檔案
+
+Signals:
+    SIGTERM / SIGINT: 等待處理中的 request (最多 graceful timeout 秒) 後結束
+    SIGHUP: rolling restart, 新 worker 啟動完成後才結束一個舊 worker
+"""
+
+import argparse
+import json
+import logging
+import logging.config
+import logging.handlers
+import math
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import sys
+import time
+from typing import Any, Dict, List, NamedTuple, Optional
+import psutil
+import uvicorn
+from app.config.server import ServerEnvs
+from app.config.settings import settings
+from app.logic.core.logging import DispatchHandler, configure_worker_logging
+
+log = logging.getLogger("server")
+
+APP = "main:app"
+READY_TIMEOUT = 60.0
+
+
+def available_cpus() -> int:
+    """可用的 CPU 數, 考慮 CPU affinity 與 cgroup (容器) 的 CPU quota
+
+    Returns:
+        int: CPU 數, 至少為 1
+    """
+    count = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    quota: Optional[float] = None
+    try:
+        # cgroup v2: "<quota> <period>" 或 "max <period>"
+        with open("/sys/fs/cgroup/cpu.max") as file:
+            limit, period = file.read().split()
+        if limit != "max":
+            quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as file:
+                limit = file.read().strip()
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as file:
+                period = file.read().strip()
+            if int(limit) > 0:
+                quota = int(limit) / int(period)
+        except (OSError, ValueError):
+            pass
+    if quota is not None:
+        count = min(count, math.ceil(quota))
+    return max(1, count)
+
+
+def bind_socket(host: str, port: int, backlog: int) -> socket.socket:
+    """建立所有 worker 共用的 socket
+
+    Args:
+        host (str): host
+        port (int): port
+        backlog (int): listen backlog
+
+    Returns:
+        socket.socket: 已 listen 的 socket
+    """
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class WorkerServer(uvicorn.Server):
+    """啟動完成時通知 master, master 結束時 (例如被 SIGKILL) 一併結束"""
+
+    def __init__(self, config: uvicorn.Config, ready: Any, master_pid: int) -> None:
+        """Init.
+
+        Args:
+            config (uvicorn.Config): uvicorn 設定
+            ready (Any): 啟動完成時 set 的 multiprocessing Event
+            master_pid (int): master 的 process ID
+        """
+        super().__init__(config)
+        self.ready = ready
+        self.master_pid = master_pid
+
+    async def startup(self, sockets: Optional[List[socket.socket]] = None) -> None:
+        """啟動 (含 lifespan startup) 完成後通知 master
+
+        Args:
+            sockets (Optional[List[socket.socket]], optional): master 建立的 socket. Defaults to None.
+        """
+        await super().startup(sockets)
+        if self.started:
+            self.ready.set()
+
+    async def on_tick(self, counter: int) -> bool:
+        """每 0.1 秒呼叫一次, master 已不存在時結束
+
+        Args:
+            counter (int): 呼叫次數
+
+        Returns:
+            bool: 是否結束
+        """
+        if counter % 10 == 0 and os.getppid() != self.master_pid:
+            return True
+        return await super().on_tick(counter)
+
+
+def run_worker(options: argparse.Namespace, app: Any, sock: socket.socket, log_queue: Any, ready: Any) -> None:
+    """Worker process 的進入點
+
+    Args:
+        options (argparse.Namespace): 啟動參數
+        app (Any): 預先載入的 ASGI app, 或 "main:app"
+        sock (socket.socket): master 建立的 socket
+        log_queue (Any): 送 log 到 master 的 queue
+        ready (Any): 啟動完成時 set 的 multiprocessing Event
+    """
+    # 終端機的 Ctrl+C 只送給 master, 由 master 依序結束 worker
+    os.setpgrp()
+    configure_worker_logging(log_queue)
+
+    max_requests = None
+    if options.max_requests:
+        max_requests = options.max_requests + random.randint(0, options.max_requests_jitter)
+    config = uvicorn.Config(
+        app,
+        loop="uvloop",
+        http="httptools",
+        lifespan="on",
+        log_config=None,
+        proxy_headers=True,
+        forwarded_allow_ips=settings.get("FORWARDED_ALLOW_IPS"),
+        backlog=options.backlog,
+        timeout_keep_alive=options.keepalive,
+        timeout_graceful_shutdown=options.graceful_timeout,
+        limit_max_requests=max_requests,
+    )
+    WorkerServer(config, ready, os.getppid()).run(sockets=[sock])
+
+
+class Worker(NamedTuple):
+    """master 管理的 worker
+
+    Attributes:
+        process: worker process
+        ready: 啟動完成時 set 的 Event
+        started_at: 啟動時間 (monotonic)
+    """
+
+    process: Any
+    ready: Any
+    started_at: float
+
+
+class Arbiter:
+    """管理 worker process
+
+    Attributes:
+        workers: pid 與 worker
+        retiring: 已通知結束、等待處理完 request 的 worker pid 與通知時間
+    """
+
+    def __init__(self, options: argparse.Namespace, app: Any, sock: socket.socket, log_queue: Any) -> None:
+        """Init.
+
+        Args:
+            options (argparse.Namespace): 啟動參數
+            app (Any): 預先載入的 ASGI app, 或 "main:app"
+            sock (socket.socket): 所有 worker 共用的 socket
+            log_queue (Any): worker 送 log 的 queue
+        """
+        self.options = options
+        self.app = app
+        self.sock = sock
+        self.log_queue = log_queue
+        self.context = multiprocessing.get_context("fork")
+        self.workers: Dict[int, Worker] = {}
+        self.retiring: Dict[int, float] = {}
+        self._stopping = False
+        self._reload = False
+
+    def spawn(self) -> Worker:
+        """啟動一個 worker
+
+        Returns:
+            Worker: worker
+        """
+        ready = self.context.Event()
+        process: Any = self.context.Process(
+            target=run_worker, args=(self.options, self.app, self.sock, self.log_queue, ready), daemon=False
+        )
+        process.start()
+        worker = Worker(process, ready, time.monotonic())
+        self.workers[process.pid] = worker
+        log.info(f"Worker {process.pid} started")
+        return worker
+
+    def retire(self, pid: int) -> None:
+        """通知 worker 處理完 request 後結束, 不補上新的 worker 前不計入 worker 數
+
+        Args:
+            pid (int): worker pid
+        """
+        if pid in self.retiring:
+            return
+        self.retiring[pid] = time.monotonic()
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def active(self) -> List[int]:
+        """未被通知結束的 worker
+
+        Returns:
+            List[int]: worker pid
+        """
+        return [pid for pid in self.workers if pid not in self.retiring]
+
+    def reap(self) -> None:
+        """移除已結束的 worker, 強制結束超過 graceful timeout 仍未結束的 worker
+
+        Raises:
+            RuntimeError: worker 在啟動完成前結束 (例如 app 載入失敗)
+        """
+        now = time.monotonic()
+        for pid, worker in list(self.workers.items()):
+            if worker.process.is_alive():
+                retired_at = self.retiring.get(pid)
+                if retired_at is not None and now - retired_at > self.options.graceful_timeout + 5:
+                    log.warning(f"Worker {pid} did not exit in time, killing")
+                    worker.process.kill()
+                continue
+            worker.process.join()
+            del self.workers[pid]
+            expected = self.retiring.pop(pid, None) is not None
+            if not expected and not worker.ready.is_set() and not self._stopping:
+                raise RuntimeError(f"Worker {pid} failed to boot (exit code {worker.process.exitcode})")
+            if not expected:
+                log.info(f"Worker {pid} exited (exit code {worker.process.exitcode})")
+
+    def check_memory(self) -> None:
+        """RSS 超過上限的 worker 改由新的 worker 取代"""
+        if not self.options.max_rss_mb:
+            return
+        limit = self.options.max_rss_mb * 1024 * 1024
+        for pid in self.active():
+            if not self.workers[pid].ready.is_set():
+                continue
+            try:
+                rss = psutil.Process(pid).memory_info().rss
+            except psutil.Error:
+                continue
+            if rss > limit:
+                log.warning(f"Worker {pid} RSS {rss // 1024 // 1024}MB exceeds {self.options.max_rss_mb}MB, recycling")
+                self.retire(pid)
+
+    def maintain(self) -> None:
+        """補足 worker 數量"""
+        while len(self.active()) < self.options.workers:
+            self.spawn()
+
+    def rolling_restart(self) -> None:
+        """逐一以新的 worker 取代舊的 worker, 新 worker 啟動完成後才結束舊 worker"""
+        log.info("Rolling restart")
+        for pid in self.active():
+            worker = self.spawn()
+            deadline = time.monotonic() + READY_TIMEOUT
+            while not worker.ready.wait(0.1):
+                self.reap()
+                if self._stopping or time.monotonic() > deadline:
+                    return
+            self.retire(pid)
+
+    def handle_signal(self, signum: int, frame: Any) -> None:
+        """記錄收到的 signal, 由主迴圈處理
+
+        Args:
+            signum (int): signal
+            frame (Any): stack frame
+        """
+        if signum == signal.SIGHUP:
+            self._reload = True
+        else:
+            self._stopping = True
+
+    def run(self) -> None:
+        """啟動 worker 並持續管理, 直到收到 SIGTERM / SIGINT"""
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(signum, self.handle_signal)
+
+        log.info(f"Listening on {self.sock.getsockname()} with {self.options.workers} workers (pid {os.getpid()})")
+        try:
+            while not self._stopping:
+                self.reap()
+                self.check_memory()
+                self.maintain()
+                if self._reload:
+                    self._reload = False
+                    self.rolling_restart()
+                time.sleep(0.5)
+        finally:
+            self.stop()
+
+    def stop(self) -> None:
+        """通知所有 worker 結束並等待"""
+        self._stopping = True
+        for pid in list(self.workers):
+            self.retire(pid)
+        while self.workers:
+            self.reap()
+            time.sleep(0.1)
+        log.info("Shutdown complete")
+
+
+def parse_args() -> argparse.Namespace:
+    """命令列參數, 未指定時使用 ServerEnvs
+
+    Returns:
+        argparse.Namespace: 啟動參數
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=ServerEnvs.SERVER_HOST.value)
+    parser.add_argument("--port", type=int, default=int(ServerEnvs.SERVER_PORT.value))
+    parser.add_argument("--workers", type=int, default=int(ServerEnvs.SERVER_WORKERS.value or available_cpus()))
+    parser.add_argument("--backlog", type=int, default=int(ServerEnvs.SERVER_BACKLOG.value))
+    parser.add_argument(
+        "--preload",
+        action=argparse.BooleanOptionalAction,
+        default=bool(ServerEnvs.SERVER_PRELOAD.value),
+        help="fork worker 前先載入 app",
+    )
+    parser.add_argument("--max-requests", type=int, default=int(ServerEnvs.SERVER_MAX_REQUESTS.value))
+    parser.add_argument("--max-requests-jitter", type=int, default=int(ServerEnvs.SERVER_MAX_REQUESTS_JITTER.value))
+    parser.add_argument("--max-rss-mb", type=int, default=int(ServerEnvs.SERVER_MAX_RSS_MB.value))
+    parser.add_argument("--graceful-timeout", type=int, default=int(ServerEnvs.SERVER_GRACEFUL_TIMEOUT.value))
+    parser.add_argument("--keepalive", type=int, default=int(ServerEnvs.SERVER_KEEPALIVE.value))
+    parser.add_argument("--log-config", default="logging_config.json")
+    return parser.parse_args()
+
+
+def main() -> int:
+    """啟動 master
+
+    Returns:
+        int: exit code
+    """
+    options = parse_args()
+    with open(options.log_config) as file:
+        logging.config.dictConfig(json.load(file))
+
+    context = multiprocessing.get_context("fork")
+    log_queue = context.Queue()
+    listener = logging.handlers.QueueListener(log_queue, DispatchHandler())
+    listener.start()
+    try:
+        app: Any = APP
+        if options.preload:
+            import main as main_module
+
+            app = main_module.app
+        sock = bind_socket(options.host, options.port, options.backlog)
+        Arbiter(options, app, sock, log_queue).run()
+    except Exception as ex:
+        log.critical(ex, exc_info=True)
+        return 1
+    finally:
+        listener.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
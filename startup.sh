@@ -1 +1 @@
-uvicorn main:app --host localhost --port 8000 --log-config logging_config.json
\ No newline at end of file
+python server.py --host localhost --port 8000 --log-config logging_config.json
\ No newline at end of file
@@ -0,0 +1,27 @@
+"""測試共用設定: DB 與 Azure File Storage 使用 app.benchmark.fakes 的替身, 不需要 .env 或任何外部服務."""
+
+from app.benchmark import fakes
+
+# 必須在 import app 的其他模組之前
+fakes.install()
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    """只在 asyncio 上執行 async 測試
+
+    Returns:
+        str: anyio backend
+    """
+    return "asyncio"
+
+
+@pytest.fixture(autouse=True)
+def clear_fake_share() -> None:
+    """每個測試開始前清空替身 file share 的內容"""
+    fakes.FakeShareFileClient.FILES.clear()
+    fakes.FakeShareFileClient.ETAGS.clear()
+    fakes.FakeShareFileClient.CONTENT_MD5.clear()
+    fakes.FakeShareDirectoryClient.DIRECTORIES.clear()
@@ -0,0 +1,420 @@
+"""AsyncAzureFileStorageManager 以 app.benchmark.fakes 的 aio 替身測試."""
+
+import asyncio
+import os
+from io import BytesIO
+from typing import Any, AsyncIterator, List, Set
+import aiohttp
+import pytest
+from app.benchmark import fakes
+from app.logic.core import afs_async_manager
+from app.logic.core.afs_async_manager import AsyncAzureFileStorageManager, close_async_afs_manager
+from app.logic.core.afs_manager import AzureFileStorageManager
+
+pytestmark = pytest.mark.anyio
+
+CHUNK_SIZE = 1024
+SHARE = fakes.BENCHMARK_ENV["AFS_SHARE_NAME"]
+
+
+@pytest.fixture
+async def manager() -> AsyncIterator[AsyncAzureFileStorageManager]:
+    """每段 1KB, 最多 3 段同時傳輸的 manager
+
+    Yields:
+        AsyncAzureFileStorageManager: manager
+    """
+    async with AsyncAzureFileStorageManager() as manager:
+        manager.chunk_size = CHUNK_SIZE
+        manager.max_concurrency = 3
+        yield manager
+
+
+def stored(file_path: str, share_name: str = SHARE) -> bytes:
+    """替身 file share 中的檔案內容
+
+    Args:
+        file_path (str): 檔案路徑
+        share_name (str, optional): file share 名稱. Defaults to SHARE.
+
+    Returns:
+        bytes: 內容
+    """
+    return bytes(fakes.FakeShareFileClient.FILES[(share_name, file_path)])
+
+
+def unfinished_tasks(before: Set[asyncio.Task]) -> Set[asyncio.Task]:
+    """測試開始後建立且還沒結束的 task
+
+    Args:
+        before (Set[asyncio.Task]): 測試開始時的 task
+
+    Returns:
+        Set[asyncio.Task]: task
+    """
+    return {task for task in asyncio.all_tasks() - before if not task.done()}
+
+
+async def test_upload_and_download_file(manager: AsyncAzureFileStorageManager) -> None:
+    """upload_file 分段上傳, download_file 取回相同內容
+
+    Args:
+        manager (AsyncAzureFileStorageManager): manager
+    """
+    data = os.urandom(10 * CHUNK_SIZE + 7)
+    await manager.upload_file(data, "dir/file.bin")
+    assert stored("dir/file.bin") == data
+    assert await manager.download_file("dir/file.bin") == data
+
+
+async def test_upload_image(manager: AsyncAzureFileStorageManager, tmp_path: Any) -> None:
+    """upload_image 上傳到指定的 file share
+
+    Args:
+        manager (AsyncAzureFileStorageManager): manager
+        tmp_path (Any): 暫存目錄
+    """
+    data = os.urandom(3 * CHUNK_SIZE)
+    image_path = tmp_path / "qrcode.png"
+    image_path.write_bytes(data)
+    await manager.upload_image(str(image_path), "qrcode/qrcode.png", "qrcode-share")
+    assert stored("qrcode/qrcode.png", "qrcode-share") == data
+
+
+@pytest.mark.parametrize("length", [None, 5 * CHUNK_SIZE])
+async def test_upload_stream(manager: AsyncAzureFileStorageManager, length: Any) -> None:
+    """upload_stream 上傳 stream 目前位置之後的內容, 指定 length 時只上傳 length bytes
+
+    Args:
+        manager (AsyncAzureFileStorageManager): manager
+        length (Any): 上傳的 bytes
+    """
+    data = os.urandom(8 * CHUNK_SIZE + 1)
+    stream = BytesIO(data)
+    stream.seek(100)
+    expected = data[100:] if length is None else data[100 : 100 + length]
+    assert await manager.upload_stream(stream, "stream.bin", length=length) == len(expected)
+    assert stored("stream.bin") == expected
+
+
+@pytest.mark.parametrize("known_length", [False, True])
+async def test_upload_async_iterator(manager: AsyncAzureFileStorageManager, known_length: bool) -> None:
+    """upload_async_iterator 把大小不一的來源重新分段, 未指定 length 時邊上傳邊調整檔案大小
+
+    Args:
+        manager (AsyncAzureFileStorageManager): manager
+        known_length (bool): 是否指定 length
+    """
+    parts = [os.urandom(size) for size in (10, CHUNK_SIZE, 3 * CHUNK_SIZE + 5, 1, CHUNK_SIZE - 1)]
+    data = b"".join(parts)
+
+    async def chunks() -> AsyncIterator[bytes]:
+        """來源
+
+        Yields:
+            bytes: 一段內容
+        """
+        for part in parts:
+            yield part
+
+    length = len(data) if known_length else None
+    assert await manager.upload_async_iterator(chunks(), "iterator.bin", length=length) == len(data)
+    assert stored("iterator.bin") == data
+
+
+async def test_iter_file(manager: AsyncAzureFileStorageManager) -> None:
+    """iter_file 依序產生不超過 chunk_size 的各段
+
+    Args:
+        manager (AsyncAzureFileStorageManager): manager
+    """
+    data = os.urandom(7 * CHUNK_SIZE + 3)
+    await manager.upload_file(data, "iter.bin")
+    chunks = [chunk async for chunk in manager.iter_file("iter.bin")]
+    assert b"".join(chunks) == data
+    assert len(chunks) == 8
+    assert all(len(chunk) <= CHUNK_SIZE for chunk in chunks)
+
+
+async def test_download_to_stream(manager: AsyncAzureFileStorageManager) -> None:
+    """download_to_stream 依序寫入 stream 並回傳 bytes
+
+    Args:
+        manager (AsyncAzureFileStorageManager): manager
+    """
+    data = os.urandom(5 * CHUNK_SIZE + 9)
+    await manager.upload_file(data, "to_stream.bin")
+    stream = BytesIO()
+    assert await manager.download_to_stream("to_stream.bin", stream) == len(data)
+    assert stream.getvalue() == data
+
+
+@pytest.mark.parametrize("size", [0, 10, CHUNK_SIZE, 3 * CHUNK_SIZE + 1])
+async def test_download_file_without_properties_request(
+    manager: AsyncAzureFileStorageManager, monkeypatch: pytest.MonkeyPatch, size: int
+) -> None:
+    """download_file 由第一段的回應取得檔案大小, 不查詢檔案屬性, 不超過 chunk_size 的檔案只需要一次往返
+
+    Args:
+        manager (AsyncAzureFileStorageManager): manager
+        monkeypatch (pytest.MonkeyPatch): monkeypatch
+        size (int): 檔案 bytes
+    """
+    data = os.urandom(size)
+    await manager.upload_file(data, "size.bin")
+    requests: List[str] = []
+    download_file = fakes.FakeAsyncShareFileClient.download_file
+    get_file_properties = fakes.FakeAsyncShareFileClient.get_file_properties
+
+    async def counting_download_file(self: Any, *args: Any, **kwargs: Any) -> Any:
+        """記錄下載
+
+        Args:
+            args (Any): 參數
+            kwargs (Any): 下載選項
+
+        Returns:
+            Any: 下載內容
+        """
+        requests.append("download_file")
+        return await download_file(self, *args, **kwargs)
+
+    async def counting_get_file_properties(self: Any, **kwargs: Any) -> Any:
+        """記錄查詢檔案屬性
+
+        Args:
+            kwargs (Any): 選項
+
+        Returns:
+            Any: 檔案屬性
+        """
+        requests.append("get_file_properties")
+        return await get_file_properties(self, **kwargs)
+
+    monkeypatch.setattr(fakes.FakeAsyncShareFileClient, "download_file", counting_download_file)
+    monkeypatch.setattr(fakes.FakeAsyncShareFileClient, "get_file_properties", counting_get_file_properties)
+
+    assert await manager.download_file("size.bin") == data
+    assert requests == ["download_file"] * max(1, -(-size // CHUNK_SIZE))
+
+
+async def test_iter_file_early_exit_cancels_pending_ranges(
+    manager: AsyncAzureFileStorageManager, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """iter_file 提前結束時取消預先下載中的段, 之後不再下載其他段
+
+    Args:
+        manager (AsyncAzureFileStorageManager): manager
+        monkeypatch (pytest.MonkeyPatch): monkeypatch
+    """
+    await manager.upload_file(os.urandom(10 * CHUNK_SIZE), "early_exit.bin")
+    before = asyncio.all_tasks()
+    download_file = fakes.FakeAsyncShareFileClient.download_file
+    started: List[int] = []
+    cancelled: List[int] = []
+
+    async def slow_download_file(self: Any, offset: int = 0, length: Any = None, **kwargs: Any) -> Any:
+        """第一段以外的段一直等待, 直到被取消
+
+        Args:
+            offset (int, optional): 起始位置. Defaults to 0.
+            length (Any, optional): 長度. Defaults to None.
+            kwargs (Any): 下載選項
+
+        Returns:
+            Any: 下載內容
+
+        Raises:
+            CancelledError: 被取消
+        """
+        started.append(offset)
+        if offset:
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled.append(offset)
+                raise
+        return await download_file(self, offset, length, **kwargs)
+
+    monkeypatch.setattr(fakes.FakeAsyncShareFileClient, "download_file", slow_download_file)
+    chunks = manager.iter_file("early_exit.bin")
+    assert len(await chunks.__anext__()) == CHUNK_SIZE
+    # 讓取出第一段前排入的 3 段開始下載
+    await asyncio.sleep(0)
+    await chunks.aclose()
+
+    assert sorted(started) == [0, CHUNK_SIZE, 2 * CHUNK_SIZE, 3 * CHUNK_SIZE]
+    assert sorted(cancelled) == [CHUNK_SIZE, 2 * CHUNK_SIZE, 3 * CHUNK_SIZE]
+    assert not unfinished_tasks(before)
+
+
+async def test_upload_error_propagates_and_deletes_file(
+    manager: AsyncAzureFileStorageManager, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """_upload_ranges 有一段失敗時取消其他段, 刪除不完整的檔案後拋出原本的例外
+
+    Args:
+        manager (AsyncAzureFileStorageManager): manager
+        monkeypatch (pytest.MonkeyPatch): monkeypatch
+    """
+    upload_range = fakes.FakeAsyncShareFileClient.upload_range
+
+    async def failing_upload_range(self: Any, data: bytes, offset: int, length: int, **kwargs: Any) -> dict:
+        """第三段失敗
+
+        Args:
+            data (bytes): 內容
+            offset (int): 起始位置
+            length (int): bytes
+            kwargs (Any): 選項
+
+        Returns:
+            dict: 結果
+
+        Raises:
+            ConnectionError: 第三段
+        """
+        if offset == 2 * CHUNK_SIZE:
+            raise ConnectionError("range failed")
+        return await upload_range(self, data, offset, length, **kwargs)
+
+    monkeypatch.setattr(fakes.FakeAsyncShareFileClient, "upload_range", failing_upload_range)
+    before = asyncio.all_tasks()
+    with pytest.raises(ConnectionError, match="range failed"):
+        await manager.upload_file(os.urandom(10 * CHUNK_SIZE), "failed.bin")
+    assert (SHARE, "failed.bin") not in fakes.FakeShareFileClient.FILES
+    assert not unfinished_tasks(before)
+
+
+async def upload_with_file(manager: AsyncAzureFileStorageManager, data: bytes, file_path: str) -> None:
+    """以 upload_file 上傳
+
+    Args:
+        manager (AsyncAzureFileStorageManager): manager
+        data (bytes): 內容
+        file_path (str): 檔案路徑
+    """
+    await manager.upload_file(data, file_path)
+
+
+async def upload_with_image(manager: AsyncAzureFileStorageManager, data: bytes, file_path: str) -> None:
+    """以 upload_image 由本機檔案上傳
+
+    Args:
+        manager (AsyncAzureFileStorageManager): manager
+        data (bytes): 內容
+        file_path (str): 檔案路徑
+    """
+    local_path = os.path.join(os.path.dirname(manager.disk_cache.directory), "image.png")  # type: ignore[union-attr]
+    with open(local_path, "wb") as local_file:
+        local_file.write(data)
+    await manager.upload_image(local_path, file_path, SHARE)
+
+
+async def upload_with_stream(manager: AsyncAzureFileStorageManager, data: bytes, file_path: str) -> None:
+    """以 upload_stream 上傳
+
+    Args:
+        manager (AsyncAzureFileStorageManager): manager
+        data (bytes): 內容
+        file_path (str): 檔案路徑
+    """
+    await manager.upload_stream(BytesIO(data), file_path)
+
+
+async def upload_with_async_iterator(manager: AsyncAzureFileStorageManager, data: bytes, file_path: str) -> None:
+    """以 upload_async_iterator 上傳
+
+    Args:
+        manager (AsyncAzureFileStorageManager): manager
+        data (bytes): 內容
+        file_path (str): 檔案路徑
+    """
+
+    async def chunks() -> AsyncIterator[bytes]:
+        """來源
+
+        Yields:
+            bytes: 全部內容
+        """
+        yield data
+
+    await manager.upload_async_iterator(chunks(), file_path)
+
+
+UPLOADS = [upload_with_file, upload_with_image, upload_with_stream, upload_with_async_iterator]
+
+
+@pytest.mark.parametrize("upload", UPLOADS, ids=[upload.__name__ for upload in UPLOADS])
+async def test_upload_invalidates_disk_cache(tmp_path: Any, monkeypatch: pytest.MonkeyPatch, upload: Any) -> None:
+    """透過 async manager 上傳 (成功或失敗) 後刪除磁碟快取的檔案, AzureFileStorageManager 不會再讀到舊的內容
+
+    Args:
+        tmp_path (Any): 暫存目錄, 作為共用的磁碟快取目錄
+        monkeypatch (pytest.MonkeyPatch): monkeypatch
+        upload (Any): 上傳方式
+    """
+    cache_dir = str(tmp_path / "cache")
+    sync_manager = AzureFileStorageManager(disk_cache_dir=cache_dir)
+    sync_manager.upload_file(b"old", "cached.bin")
+    assert sync_manager.download_file("cached.bin") == b"old"
+    assert sync_manager.disk_cache.hits == 1  # type: ignore[union-attr]
+
+    async with AsyncAzureFileStorageManager(disk_cache_dir=cache_dir) as manager:
+        await upload(manager, b"new", "cached.bin")
+        assert sync_manager.download_file("cached.bin") == b"new"
+
+        async def failing_upload_range(self: Any, *args: Any, **kwargs: Any) -> dict:
+            """上傳失敗
+
+            Args:
+                args (Any): 參數
+                kwargs (Any): 選項
+
+            Raises:
+                ConnectionError: 每一段
+            """
+            raise ConnectionError("range failed")
+
+        monkeypatch.setattr(fakes.FakeAsyncShareFileClient, "upload_range", failing_upload_range)
+        with pytest.raises(ConnectionError):
+            await upload(manager, b"newer", "cached.bin")
+
+    assert sync_manager.disk_cache.get(SHARE, "cached.bin", lambda: None) is None  # type: ignore[union-attr]
+    sync_manager.close()
+
+
+async def test_close_async_afs_manager_closes_owned_session(monkeypatch: pytest.MonkeyPatch) -> None:
+    """close_async_afs_manager 關閉 manager 自行建立的 session
+
+    Args:
+        monkeypatch (pytest.MonkeyPatch): monkeypatch
+    """
+    monkeypatch.setattr(afs_async_manager, "_async_afs_manager", None)
+    manager = afs_async_manager.get_async_afs_manager()
+    assert afs_async_manager.get_async_afs_manager() is manager
+    await manager.open()
+    session = manager.session
+    assert session is not None and not session.closed
+
+    await close_async_afs_manager()
+    assert session.closed
+    assert manager.session is None
+    assert afs_async_manager._async_afs_manager is None
+
+
+async def test_close_async_afs_manager_keeps_injected_session(monkeypatch: pytest.MonkeyPatch) -> None:
+    """外部傳入的 session 由呼叫端管理, close_async_afs_manager 不會關閉
+
+    Args:
+        monkeypatch (pytest.MonkeyPatch): monkeypatch
+    """
+    async with aiohttp.ClientSession() as session:
+        manager = AsyncAzureFileStorageManager(session=session)
+        monkeypatch.setattr(afs_async_manager, "_async_afs_manager", manager)
+        await manager.upload_file(b"data", "injected.bin")
+
+        await close_async_afs_manager()
+        assert not session.closed
+        assert manager.session is session
+        assert afs_async_manager._async_afs_manager is None
@@ -0,0 +1,205 @@
+"""AsyncAzureFileStorageManager 以真正的 Azure SDK aio client 對本機 aiohttp 測試 server 傳輸.
+
+test_afs_async_manager.py 使用的替身不經過 _build_transport, 這裡暫時換回真正的 azure.storage.fileshare,
+由 aiohttp 測試 server 模擬 Create File / Put Range / Get File, 檢查共用的 aiohttp session 與連線池.
+"""
+
+import importlib
+import os
+import re
+import sys
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from app.benchmark import fakes
+from app.logic.core.afs_async_manager import AsyncAzureFileStorageManager
+
+pytestmark = pytest.mark.anyio
+
+CHUNK_SIZE = 1024
+SHARE = fakes.BENCHMARK_ENV["AFS_SHARE_NAME"]
+ACCOUNT = "devstoreaccount1"
+# Azurite 公開的開發用金鑰, 測試 server 不驗證簽章
+ACCOUNT_KEY = "Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq/K1SZFPTOtr/KBHBeksoGMGw=="
+INVALID_RANGE = (
+    '<?xml version="1.0" encoding="utf-8"?>'
+    "<Error><Code>InvalidRange</Code><Message>The range specified is invalid.</Message></Error>"
+)
+
+
+class FileServer:
+    """模擬 Azure File REST API 的 aiohttp handler, 記錄每個 request 的 method 與用戶端連線埠
+
+    Attributes:
+        files: 檔案路徑對應的內容
+        requests: 依序的 (method, 用戶端連線埠)
+    """
+
+    def __init__(self) -> None:
+        """Initialize FileServer."""
+        self.files: Dict[str, bytearray] = {}
+        self.requests: List[Tuple[str, int]] = []
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """依 method 與 comp 參數處理 Create File, Put Range, Set File Properties 與 Get File
+
+        Args:
+            request (web.Request): request
+
+        Returns:
+            web.Response: response
+        """
+        assert request.transport is not None
+        self.requests.append((request.method, request.transport.get_extra_info("peername")[1]))
+        comp = request.query.get("comp")
+        headers = {"ETag": '"0x1"', "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"}
+        if request.method == "PUT" and comp == "range":
+            start, end = self.byte_range(request)
+            self.files[request.path][start : end + 1] = await request.read()
+            return web.Response(status=201, headers=headers)
+        if request.method == "PUT":
+            size = int(request.headers["x-ms-content-length"])
+            data = self.files.get(request.path, bytearray()) if comp == "properties" else bytearray()
+            self.files[request.path] = data[:size] + bytearray(max(0, size - len(data)))
+            return web.Response(status=200 if comp == "properties" else 201, headers=headers)
+        if request.method == "GET":
+            data = self.files[request.path]
+            start, end = self.byte_range(request)
+            if start >= len(data):
+                return web.Response(
+                    status=416,
+                    text=INVALID_RANGE,
+                    content_type="application/xml",
+                    headers={"x-ms-error-code": "InvalidRange"},
+                )
+            body = bytes(data[start : end + 1])
+            headers["Content-Range"] = f"bytes {start}-{start + len(body) - 1}/{len(data)}"
+            return web.Response(status=206, body=body, headers=headers)
+        return web.Response(status=405)
+
+    @staticmethod
+    def byte_range(request: web.Request) -> Tuple[int, int]:
+        """x-ms-range 的起訖位置
+
+        Args:
+            request (web.Request): request
+
+        Returns:
+            Tuple[int, int]: 起始與結束 (含) 位置
+        """
+        match = re.fullmatch(r"bytes=(\d+)-(\d+)", request.headers["x-ms-range"])
+        assert match is not None
+        return int(match[1]), int(match[2])
+
+
+@pytest.fixture
+def azure_sdk(monkeypatch: pytest.MonkeyPatch) -> None:
+    """測試期間換回真正的 azure.storage.fileshare 與 aio, 結束後還原替身
+
+    Args:
+        monkeypatch (pytest.MonkeyPatch): monkeypatch
+    """
+    monkeypatch.delitem(sys.modules, "azure.storage.fileshare")
+    monkeypatch.delitem(sys.modules, "azure.storage.fileshare.aio")
+    importlib.import_module("azure.storage.fileshare.aio")
+
+
+@pytest.fixture
+async def server() -> AsyncIterator[Tuple[FileServer, str]]:
+    """啟動本機的 aiohttp 測試 server
+
+    Yields:
+        Tuple[FileServer, str]: handler 與指向 server 的 AFS 連線字串
+    """
+    files = FileServer()
+    app = web.Application()
+    app.router.add_route("*", "/{path:.*}", files.handle)
+    server = TestServer(app)
+    await server.start_server()
+    endpoint = f"http://{server.host}:{server.port}/{ACCOUNT}"
+    yield files, f"DefaultEndpointsProtocol=http;AccountName={ACCOUNT};AccountKey={ACCOUNT_KEY};FileEndpoint={endpoint}"
+    await server.close()
+
+
+def create_manager(
+    connection_string: str, session: Optional[aiohttp.ClientSession] = None
+) -> AsyncAzureFileStorageManager:
+    """每段 1KB, 最多 3 段同時傳輸, 不使用磁碟快取的 manager
+
+    Args:
+        connection_string (str): AFS 連線字串
+        session (Optional[aiohttp.ClientSession], optional): 外部傳入的 session. Defaults to None.
+
+    Returns:
+        AsyncAzureFileStorageManager: manager
+    """
+    manager = AsyncAzureFileStorageManager(connection_string, pool_maxsize=4, session=session, disk_cache_dir=None)
+    manager.chunk_size = CHUNK_SIZE
+    manager.max_concurrency = 3
+    return manager
+
+
+@pytest.mark.usefixtures("azure_sdk")
+async def test_uploads_reuse_one_session(server: Tuple[FileServer, str]) -> None:
+    """兩次上傳使用 manager 建立的同一個 session 與 keep-alive 連線, close 時關閉自己建立的 session
+
+    Args:
+        server (Tuple[FileServer, str]): 測試 server 與連線字串
+    """
+    files, connection_string = server
+    manager = create_manager(connection_string)
+    await manager.upload_file(b"first", "dir/first.bin")
+    session = manager.session
+    assert isinstance(session, aiohttp.ClientSession)
+    assert session.connector is not None and session.connector.limit == 4
+
+    await manager.upload_file(b"second", "second.bin")
+    assert manager.session is session
+    assert bytes(files.files[f"/{ACCOUNT}/{SHARE}/dir/first.bin"]) == b"first"
+    assert bytes(files.files[f"/{ACCOUNT}/{SHARE}/second.bin"]) == b"second"
+    # 依序的 Create File 與 Put Range 都經過連線池中同一條連線
+    assert [method for method, _ in files.requests] == ["PUT"] * 4
+    assert len({port for _, port in files.requests}) == 1
+
+    await manager.close()
+    assert session.closed
+
+
+@pytest.mark.usefixtures("azure_sdk")
+async def test_close_keeps_supplied_session_open(server: Tuple[FileServer, str]) -> None:
+    """外部傳入的 session 不會由 close 關閉, 之後的 manager 仍可繼續使用
+
+    Args:
+        server (Tuple[FileServer, str]): 測試 server 與連線字串
+    """
+    files, connection_string = server
+    async with aiohttp.ClientSession() as session:
+        async with create_manager(connection_string, session) as manager:
+            await manager.upload_file(b"first", "first.bin")
+            assert manager.session is session
+        assert not session.closed
+
+        async with create_manager(connection_string, session) as manager:
+            await manager.upload_file(b"second", "second.bin")
+        assert not session.closed
+    assert bytes(files.files[f"/{ACCOUNT}/{SHARE}/second.bin"]) == b"second"
+
+
+@pytest.mark.usefixtures("azure_sdk")
+@pytest.mark.parametrize("size", [0, 10, 3 * CHUNK_SIZE + 1])
+async def test_download_size_from_content_range(server: Tuple[FileServer, str], size: int) -> None:
+    """分段下載由真正的 SDK 回應的 Content-Range 取得檔案大小, 空檔案的 416 視為沒有內容
+
+    Args:
+        server (Tuple[FileServer, str]): 測試 server 與連線字串
+        size (int): 檔案 bytes
+    """
+    files, connection_string = server
+    data = os.urandom(size)
+    async with create_manager(connection_string) as manager:
+        await manager.upload_file(data, "size.bin")
+        files.requests.clear()
+        assert await manager.download_file("size.bin") == data
+    assert [method for method, _ in files.requests] == ["GET"] * max(1, -(-size // CHUNK_SIZE))
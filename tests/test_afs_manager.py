@@ -0,0 +1,100 @@
+"""AzureFileStorageManager 以 app.benchmark.fakes 的替身測試."""
+
+import os
+from io import BytesIO
+from typing import Any, Iterator, List
+import pytest
+from app.benchmark import fakes
+from app.logic.core.afs_manager import AzureFileStorageManager
+
+CHUNK_SIZE = 1024
+
+
+@pytest.fixture
+def manager() -> Iterator[AzureFileStorageManager]:
+    """每段 1KB, 最多 3 段同時傳輸, 不使用磁碟快取的 manager
+
+    Yields:
+        AzureFileStorageManager: manager
+    """
+    manager = AzureFileStorageManager(disk_cache_dir=None)
+    manager.chunk_size = CHUNK_SIZE
+    manager.max_concurrency = 3
+    yield manager
+    manager.close()
+
+
+@pytest.fixture
+def requests(monkeypatch: pytest.MonkeyPatch) -> List[str]:
+    """記錄替身收到的下載與查詢檔案屬性
+
+    Args:
+        monkeypatch (pytest.MonkeyPatch): monkeypatch
+
+    Returns:
+        List[str]: 依序的 request
+    """
+    requests: List[str] = []
+    download_file = fakes.FakeShareFileClient.download_file
+    get_file_properties = fakes.FakeShareFileClient.get_file_properties
+
+    def counting_download_file(self: Any, *args: Any, **kwargs: Any) -> Any:
+        """記錄下載
+
+        Args:
+            args (Any): 參數
+            kwargs (Any): 下載選項
+
+        Returns:
+            Any: 下載內容
+        """
+        requests.append("download_file")
+        return download_file(self, *args, **kwargs)
+
+    def counting_get_file_properties(self: Any, **kwargs: Any) -> Any:
+        """記錄查詢檔案屬性
+
+        Args:
+            kwargs (Any): 選項
+
+        Returns:
+            Any: 檔案屬性
+        """
+        requests.append("get_file_properties")
+        return get_file_properties(self, **kwargs)
+
+    monkeypatch.setattr(fakes.FakeShareFileClient, "download_file", counting_download_file)
+    monkeypatch.setattr(fakes.FakeShareFileClient, "get_file_properties", counting_get_file_properties)
+    return requests
+
+
+@pytest.mark.parametrize("size", [0, 10, CHUNK_SIZE, 3 * CHUNK_SIZE + 1])
+def test_download_without_properties_request(manager: AzureFileStorageManager, requests: List[str], size: int) -> None:
+    """download_file / iter_file / download_to_stream 由第一段的回應取得檔案大小, 不查詢檔案屬性
+
+    不超過 chunk_size 的檔案只需要一次往返.
+
+    Args:
+        manager (AzureFileStorageManager): manager
+        requests (List[str]): 替身收到的 request
+        size (int): 檔案 bytes
+    """
+    data = os.urandom(size)
+    manager.upload_file(data, "size.bin")
+    expected = ["download_file"] * max(1, -(-size // CHUNK_SIZE))
+
+    requests.clear()
+    assert manager.download_file("size.bin") == data
+    assert requests == expected
+
+    requests.clear()
+    chunks = list(manager.iter_file("size.bin"))
+    assert b"".join(chunks) == data
+    assert all(0 < len(chunk) <= CHUNK_SIZE for chunk in chunks)
+    assert requests == expected
+
+    requests.clear()
+    stream = BytesIO()
+    assert manager.download_to_stream("size.bin", stream) == size
+    assert stream.getvalue() == data
+    assert requests == expected
@@ -0,0 +1,130 @@
+"""ConnectionPool 以 app.benchmark.fakes 的 pyodbc 替身測試."""
+
+import threading
+import time
+import types
+from typing import Any, List
+import pytest
+from app.benchmark import fakes
+from app.logic.core import db_manager
+from app.logic.core.db_manager import ConnectionPool, PoolTimeoutError, use_with_create_connection
+
+DATABASE = "POOL_TEST"
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> List[float]:
+    """db_manager 使用可手動前進的時鐘
+
+    Args:
+        monkeypatch (pytest.MonkeyPatch): monkeypatch
+
+    Returns:
+        List[float]: 目前時間, 修改 clock[0] 使時間前進
+    """
+    now = [1000.0]
+    monkeypatch.setattr(db_manager, "time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def create_pool(**kwargs: Any) -> ConnectionPool:
+    """最多 2 條連線, 不預先建立、不 ping 的 pool
+
+    Args:
+        kwargs (Any): 覆寫的 ConnectionPool 參數
+
+    Returns:
+        ConnectionPool: pool
+    """
+    options = dict(min_size=0, max_size=2, timeout=0.1, max_lifetime=0, idle_timeout=0, ping_interval=3600)
+    return ConnectionPool(DATABASE, **{**options, **kwargs})
+
+
+def test_exhausted_pool_times_out() -> None:
+    """連線都被借出時等待 timeout 秒後拋出 PoolTimeoutError, 歸還後可再借出"""
+    pool = create_pool()
+    first, second = pool.acquire(), pool.acquire()
+    assert first is not second
+
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+    assert pool.stats()["timeouts"] == 1
+
+    pool.release(second)
+    assert pool.acquire() is second
+    assert pool.stats()["opened"] == 2
+
+
+def test_waiter_gets_released_connection() -> None:
+    """等待中的 acquire 在其他執行緒歸還連線後取得該連線"""
+    pool = create_pool(max_size=1, timeout=5)
+    connection = pool.acquire()
+    acquired: List[Any] = []
+    waiter = threading.Thread(target=lambda: acquired.append(pool.acquire()))
+    waiter.start()
+    time.sleep(0.05)
+
+    pool.release(connection)
+    waiter.join(5)
+    assert acquired == [connection]
+    stats = pool.stats()
+    assert (stats["opened"], stats["waits"], stats["timeouts"]) == (1, 1, 0)
+
+
+def test_connection_recycled_after_max_lifetime(clock: List[float]) -> None:
+    """超過 max_lifetime 的連線在借出或歸還時關閉, 改用新的連線
+
+    Args:
+        clock (List[float]): 目前時間
+    """
+    pool = create_pool(max_lifetime=60)
+    first = pool.acquire()
+    pool.release(first)
+
+    clock[0] += 30
+    assert pool.acquire() is first
+    pool.release(first)
+
+    # 閒置中過期: 借出時關閉
+    clock[0] += 31
+    second = pool.acquire()
+    assert second is not first
+    assert first.closed
+
+    # 借出中過期: 歸還時關閉
+    clock[0] += 60
+    pool.release(second)
+    assert second.closed
+    stats = pool.stats()
+    assert (stats["idle"], stats["opened"], stats["discarded"]) == (0, 2, 2)
+
+
+@pytest.mark.parametrize("rollback_fails", [False, True])
+def test_connection_discarded_when_rollback_fails(monkeypatch: pytest.MonkeyPatch, rollback_fails: bool) -> None:
+    """發生錯誤後 rollback 成功的連線放回 pool, rollback 失敗的連線關閉, 不交給下一個借用者
+
+    Args:
+        monkeypatch (pytest.MonkeyPatch): monkeypatch
+        rollback_fails (bool): rollback 是否失敗
+    """
+    pool = create_pool()
+    monkeypatch.setitem(db_manager._pools, DATABASE, pool)
+
+    def rollback(self: fakes.FakeConnection) -> None:
+        """Rollback, rollback_fails 時失敗
+
+        Raises:
+            FakeError: 連線已中斷
+        """
+        if rollback_fails:
+            raise fakes.FakeError("Communication link failure")
+
+    monkeypatch.setattr(fakes.FakeConnection, "rollback", rollback)
+
+    with pytest.raises(RuntimeError):
+        with use_with_create_connection(database=DATABASE) as connection:
+            raise RuntimeError("SP failed")
+
+    assert connection.closed is rollback_fails
+    assert pool.stats()["idle"] == (0 if rollback_fails else 1)
+    assert (pool.acquire() is connection) is not rollback_fails
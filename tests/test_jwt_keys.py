@@ -0,0 +1,58 @@
+"""JWTKeySet 重新載入 JWKS 檔案."""
+
+import json
+import os
+from typing import Any
+import pytest
+from cryptography.hazmat.primitives.asymmetric import ec
+from jose import jwk
+from jose.constants import ALGORITHMS
+from app.logic.utilities.jwt_keys import JWTKeySet
+
+
+def write_jwks(path: Any, *kids: str) -> None:
+    """寫入含私鑰的 JWKS
+
+    Args:
+        path (Any): 檔案路徑
+        kids (str): 金鑰 ID
+    """
+    keys = []
+    for kid in kids:
+        key = jwk.construct(ec.generate_private_key(ec.SECP256R1()), ALGORITHMS.ES256)
+        keys.append({**key.to_dict(), "kid": kid, "alg": ALGORITHMS.ES256})
+    path.write_text(json.dumps({"keys": keys}))
+
+
+@pytest.mark.parametrize(
+    "break_file",
+    [
+        lambda path: path.unlink(),
+        lambda path: path.write_text('{"keys": [{"kid": "new"'),
+        lambda path: write_jwks(path, "other"),
+    ],
+    ids=["missing", "half-written", "signing-kid-missing"],
+)
+def test_failed_reload_keeps_loaded_keys(tmp_path: Any, break_file: Any) -> None:
+    """輪替中的 JWKS 檔案無法載入時繼續使用已載入的金鑰, 修正後下一個間隔重新載入
+
+    Args:
+        tmp_path (Any): 暫存目錄
+        break_file (Any): 讓檔案無法載入
+    """
+    path = tmp_path / "jwks.json"
+    write_jwks(path, "old")
+    key_set = JWTKeySet(str(path), "old", reload_interval=0)
+    old_key = key_set.signing_key
+
+    break_file(path)
+    if path.exists():
+        os.utime(path, (0, 1))
+    assert key_set.signing_key is old_key
+    assert key_set.get("old") is old_key
+    assert [key["kid"] for key in key_set.public_jwks()["keys"]] == ["old"]
+
+    write_jwks(path, "old", "new")
+    os.utime(path, (0, 2))
+    key_set.signing_kid = "new"
+    assert key_set.signing_key.kid == "new"
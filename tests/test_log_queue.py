@@ -0,0 +1,146 @@
+"""BatchingQueueHandler 佇列已滿的處理、/metrics 的丟棄計數與 close 時寫出佇列."""
+
+import logging
+import threading
+import time
+from typing import Iterator, List
+import pytest
+from app.logic.core.logging import BatchingQueueHandler
+from app.logic.core.metrics import REGISTRY
+
+
+class BlockedHandler(logging.Handler):
+    """記錄收到的訊息, 第一筆 record 等到 unblock 才寫入, 讓背景執行緒停住而佇列可以填滿
+
+    Attributes:
+        entered: 背景執行緒已開始寫入第一筆 record
+        unblock: 設定後繼續寫入
+        messages: 已寫入的訊息
+    """
+
+    def __init__(self) -> None:
+        """Init."""
+        super().__init__()
+        self.entered = threading.Event()
+        self.unblock = threading.Event()
+        self.messages: List[str] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """記錄訊息
+
+        Args:
+            record (logging.LogRecord): LogRecord
+        """
+        self.entered.set()
+        self.unblock.wait(5)
+        self.messages.append(record.getMessage())
+
+
+def record(message: str) -> logging.LogRecord:
+    """建立 INFO record
+
+    Args:
+        message (str): 訊息
+
+    Returns:
+        logging.LogRecord: LogRecord
+    """
+    return logging.makeLogRecord({"msg": message, "levelno": logging.INFO, "levelname": "INFO"})
+
+
+@pytest.fixture
+def target() -> Iterator[BlockedHandler]:
+    """停住背景執行緒的 target, 測試結束時放行
+
+    Yields:
+        BlockedHandler: target
+    """
+    target = BlockedHandler()
+    yield target
+    target.unblock.set()
+
+
+def fill(handler: BatchingQueueHandler, target: BlockedHandler, capacity: int) -> None:
+    """讓背景執行緒停在第一筆 record, 再放入 capacity 筆填滿佇列
+
+    Args:
+        handler (BatchingQueueHandler): handler
+        target (BlockedHandler): handler 的 target
+        capacity (int): 佇列容量
+    """
+    handler.handle(record("writing"))
+    assert target.entered.wait(5)
+    for index in range(capacity):
+        handler.handle(record(f"queued {index}"))
+    assert handler.stats()["queued"] == capacity
+
+
+def test_drop_policy_counts_dropped_records(target: BlockedHandler) -> None:
+    """drop: 佇列已滿時立即丟棄, 丟棄數量輸出到 /metrics 的 log_dropped_records_total
+
+    Args:
+        target (BlockedHandler): target
+    """
+    handler = BatchingQueueHandler(capacity=2, target=target, batch_size=1, policy="drop")
+    handler.set_name("test_drop")
+    fill(handler, target, 2)
+
+    started = time.perf_counter()
+    for index in range(3):
+        handler.handle(record(f"dropped {index}"))
+    assert time.perf_counter() - started < 0.5
+    assert handler.stats()["dropped"] == 3
+    assert 'log_dropped_records_total{handler="test_drop"} 3' in REGISTRY.render().splitlines()
+
+    target.unblock.set()
+    handler.close()
+    assert target.messages == [
+        "writing",
+        "queued 0",
+        "queued 1",
+        "BatchingQueueHandler dropped 3 log records (queue full)",
+    ]
+    assert 'handler="test_drop"' not in REGISTRY.render()
+
+
+def test_block_policy_waits_for_space(target: BlockedHandler) -> None:
+    """block: 佇列已滿時等待, 背景執行緒在 block_timeout 內騰出空間就放入, 否則丟棄
+
+    Args:
+        target (BlockedHandler): target
+    """
+    handler = BatchingQueueHandler(capacity=1, target=target, batch_size=1, policy="block", block_timeout=0.1)
+    fill(handler, target, 1)
+
+    started = time.perf_counter()
+    handler.handle(record("dropped"))
+    assert time.perf_counter() - started >= 0.1
+    assert handler.stats()["dropped"] == 1
+
+    handler.block_timeout = 5
+    threading.Timer(0.1, target.unblock.set).start()
+    handler.handle(record("waited"))
+    handler.close()
+
+    assert target.messages == [
+        "writing",
+        "queued 0",
+        "waited",
+        "BatchingQueueHandler dropped 1 log records (queue full)",
+    ]
+
+
+def test_close_writes_queued_records(target: BlockedHandler) -> None:
+    """呼叫 close 時佇列中還有 record, 等背景執行緒全部寫入後才返回
+
+    Args:
+        target (BlockedHandler): target
+    """
+    handler = BatchingQueueHandler(capacity=10, target=target, batch_size=2)
+    fill(handler, target, 5)
+
+    threading.Timer(0.1, target.unblock.set).start()
+    handler.close()
+
+    assert target.messages == ["writing"] + [f"queued {index}" for index in range(5)]
+    assert handler.stats() == {"queued": 0, "written": 6, "dropped": 0, "batches": 4}
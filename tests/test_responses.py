@@ -0,0 +1,88 @@
+"""ORJSONResponse 與 FastAPI 預設 JSONResponse 的輸出比較."""
+
+import datetime
+import math
+from decimal import Decimal
+from typing import Any, Optional, Type
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+from app.logic.core.responses import ORJSONResponse
+from app.schema.base_response import BaseAPIResponse, BaseSPAPIResponse, BaseSPResponse
+
+VALUES = {
+    "int-keys": {1: "a", 2: {3: "b"}},
+    "datetime": datetime.datetime(2024, 1, 2, 3, 4, 5, 6),
+    "datetime-utc": datetime.datetime(2024, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc),
+    "decimal": Decimal("1.50"),
+    "bytes": b"abc",
+    "nan": math.nan,
+}
+
+
+def get(response_class: Type[JSONResponse], value: Any, response_model: Optional[type] = None) -> Any:
+    """以指定的 default_response_class 建立 app, 取得 route 回傳 value 的 response
+
+    Args:
+        response_class (Type[JSONResponse]): default_response_class
+        value (Any): route 回傳的值, 有 response_model 時放在 BaseAPIResponse.data
+        response_model (Optional[type], optional): route 的 response_model. Defaults to None.
+
+    Returns:
+        Any: response
+    """
+    app = FastAPI(default_response_class=response_class)
+    if response_model is None:
+        app.get("/")(lambda: {"value": value})
+    else:
+        app.get("/", response_model=response_model)(lambda: BaseAPIResponse(success=True, data={"value": value}))
+    return TestClient(app, raise_server_exceptions=False).get("/")
+
+
+@pytest.mark.parametrize("value", VALUES.values(), ids=VALUES.keys())
+def test_response_model_output_matches_json_response(value: Any) -> None:
+    """有 response_model 的 route, 輸出與 JSONResponse 完全相同
+
+    Args:
+        value (Any): route 回傳的值
+    """
+    expected = get(JSONResponse, value, BaseAPIResponse)
+    actual = get(ORJSONResponse, value, BaseAPIResponse)
+    assert expected.status_code == 200
+    assert (actual.status_code, actual.content) == (expected.status_code, expected.content)
+
+
+@pytest.mark.parametrize("name", ["int-keys", "datetime", "datetime-utc", "decimal", "bytes"])
+def test_plain_output_matches_json_response(name: str) -> None:
+    """沒有 response_model 的 route (先經過 jsonable_encoder), 輸出與 JSONResponse 完全相同
+
+    Args:
+        name (str): VALUES 的項目
+    """
+    expected = get(JSONResponse, VALUES[name])
+    actual = get(ORJSONResponse, VALUES[name])
+    assert expected.status_code == 200
+    assert (actual.status_code, actual.content) == (expected.status_code, expected.content)
+
+
+def test_plain_nan_is_null() -> None:
+    """沒有 response_model 時 JSONResponse 不接受 NaN (500), ORJSONResponse 與 pydantic 相同輸出 null"""
+    assert get(JSONResponse, math.nan).status_code == 500
+    assert get(ORJSONResponse, math.nan).json() == {"value": None}
+
+
+def test_trusted_sp_response_matches_response_model() -> None:
+    """直接回傳 ORJSONResponse(BaseSPAPIResponse.from_sp_response(...)) 與經過 response_model 的輸出相同"""
+    rows = [{"ID": 1, **{name.upper(): value for name, value in VALUES.items() if name != "int-keys"}}]
+    data = BaseSPResponse.model_construct(result_set=rows, output_parameters={1: Decimal("2.5")})
+
+    standard = FastAPI()
+    standard.get("/", response_model=BaseSPAPIResponse)(lambda: BaseSPAPIResponse(success=True, data=data))
+    trusted = FastAPI(default_response_class=ORJSONResponse)
+    trusted.get("/", response_model=BaseSPAPIResponse)(lambda: ORJSONResponse(BaseSPAPIResponse.from_sp_response(data)))
+
+    expected = TestClient(standard).get("/")
+    actual = TestClient(trusted).get("/")
+    assert expected.status_code == actual.status_code == 200
+    assert actual.content == expected.content
@@ -0,0 +1,121 @@
+"""Stored Procedure 批次執行: 參數上限的拆分與 SPBatchError 的呼叫位置."""
+
+import re
+from typing import Iterator, List, Tuple
+import pytest
+from app.benchmark import fakes
+from app.config.stored_procedure_mapping import StoredProcedureMapping
+from app.logic.utilities.stored_procedure_handler import SPBatchError, StoredProcedureHandler, batch_sp_execution
+
+LIMIT = StoredProcedureHandler.BATCH_MAX_PARAMETERS
+SP1 = StoredProcedureMapping.SP_FAKE1
+SP2 = StoredProcedureMapping.SP_FAKE2
+CALL = re.compile(rf"SELECT (\d+) AS {StoredProcedureHandler.BATCH_INDEX_COLUMN};\s*EXEC \[dbo\]\.\[(\w+)\] ([^;]*);")
+
+
+@pytest.fixture
+def requests(monkeypatch: pytest.MonkeyPatch) -> List[Tuple[str, int]]:
+    """以替身模擬 SQL Server 執行批次: 依序回傳各呼叫的標示與一個結果集, 參數值為 "FAIL" 的呼叫執行錯誤
+
+    Args:
+        monkeypatch (pytest.MonkeyPatch): monkeypatch
+
+    Returns:
+        List[Tuple[str, int]]: 每次往返的 (第一個 SP 名稱, 綁定的參數數量)
+    """
+    requests: List[Tuple[str, int]] = []
+
+    def results(sql: str, params: tuple) -> Iterator[fakes.ResultSet]:
+        """依 SQL 中的呼叫產生結果集
+
+        Args:
+            sql (str): SQL 語句
+            params (tuple): 綁定參數
+
+        Yields:
+            fakes.ResultSet: 結果集
+
+        Raises:
+            FakeError: 參數超過 SQL Server 上限, 或呼叫的參數值為 "FAIL"
+        """
+        calls = CALL.findall(sql)
+        requests.append((calls[0][1], len(params)))
+        if len(params) > 2100:
+            raise fakes.FakeError("The server supports a maximum of 2100 parameters.")
+        values = iter(params)
+        for index, _, args in calls:
+            yield [StoredProcedureHandler.BATCH_INDEX_COLUMN], [(int(index),)]
+            call_values = [next(values) for _ in range(args.count("?"))]
+            if "FAIL" in call_values:
+                raise fakes.FakeError("SP failed")
+            yield ["INDEX", "PARAMS"], [(int(index), len(call_values))]
+
+    monkeypatch.setattr(fakes.FakeConnection, "results", staticmethod(results))
+    return requests
+
+
+def params(count: int, value: str = "x") -> dict:
+    """產生 count 個輸入參數
+
+    Args:
+        count (int): 參數數量
+        value (str, optional): 參數值. Defaults to "x".
+
+    Returns:
+        dict: 參數
+    """
+    return {f"P{index}": value for index in range(count)}
+
+
+def test_batch_splits_requests_below_parameter_limit(requests: List[Tuple[str, int]]) -> None:
+    """綁定的參數超過上限時拆成多次往返, 結果仍依 calls 順序對應
+
+    Args:
+        requests (List[Tuple[str, int]]): 每次往返的第一個 SP 名稱與參數數量
+    """
+    counts = [1000, 1000, 1000, 5, LIMIT]
+    responses = batch_sp_execution([(SP1, params(count)) for count in counts])
+
+    assert requests == [(SP1.name, 2000), (SP1.name, 1005), (SP1.name, LIMIT)]
+    assert [response.result_set for response in responses] == [
+        [{"INDEX": index, "PARAMS": count}] for index, count in enumerate(counts)
+    ]
+
+
+def test_batch_error_index_in_later_request(requests: List[Tuple[str, int]]) -> None:
+    """拆分後的往返中失敗時, SPBatchError.index 仍為該呼叫在 calls 中的位置
+
+    Args:
+        requests (List[Tuple[str, int]]): 每次往返的第一個 SP 名稱與參數數量
+    """
+    calls = [(SP1, params(1000)), (SP1, params(1000)), (SP1, params(1000)), (SP1, params(3, "FAIL"))]
+    with pytest.raises(SPBatchError) as error:
+        batch_sp_execution(calls)
+
+    assert len(requests) == 2
+    assert (error.value.index, error.value.sp_name, error.value.committed) == (3, SP1.name, ())
+
+
+def test_batch_error_reports_committed_calls(requests: List[Tuple[str, int]]) -> None:
+    """後面的 DB 失敗時, SPBatchError.committed 為前面的 DB 已經 commit 的呼叫
+
+    Args:
+        requests (List[Tuple[str, int]]): 每次往返的第一個 SP 名稱與參數數量
+    """
+    calls = [(SP1, params(1)), (SP2, params(1)), (SP1, params(1)), (SP2, params(1, "FAIL"))]
+    with pytest.raises(SPBatchError) as error:
+        batch_sp_execution(calls)
+
+    assert requests == [(SP1.name, 2), (SP2.name, 2)]
+    assert (error.value.index, error.value.sp_name, error.value.committed) == (3, SP2.name, (0, 2))
+
+
+def test_batch_call_over_parameter_limit(requests: List[Tuple[str, int]]) -> None:
+    """單一呼叫的參數超過上限時, 在任何 DB 執行之前拋出 ValueError
+
+    Args:
+        requests (List[Tuple[str, int]]): 每次往返的第一個 SP 名稱與參數數量
+    """
+    with pytest.raises(ValueError, match=r"calls\[1\]"):
+        batch_sp_execution([(SP1, params(1)), (SP2, params(LIMIT + 1))])
+    assert requests == []
@@ -0,0 +1,127 @@
+"""Stored Procedure 結果快取: 結果複本與非同步呼叫的合併執行."""
+
+import asyncio
+import threading
+from typing import Any, Iterator, List
+import pytest
+from app.benchmark import fakes
+from app.config.stored_procedure_mapping import StoredProcedureMapping
+from app.logic.core import db_executor
+from app.logic.core.db_executor import DBExecutor
+from app.logic.utilities import stored_procedure_handler
+from app.logic.utilities.stored_procedure_handler import async_sp_execution, simple_sp_execution
+from app.logic.utilities.ttl_cache import TTLCache
+
+SP_NAME = StoredProcedureMapping.SP_FAKE1.name
+
+
+@pytest.fixture(autouse=True)
+def sp_cache(monkeypatch: pytest.MonkeyPatch) -> TTLCache:
+    """讓 SP_FAKE1 使用結果快取
+
+    Args:
+        monkeypatch (pytest.MonkeyPatch): monkeypatch
+
+    Returns:
+        TTLCache: SP_FAKE1 的結果快取
+    """
+    cache = TTLCache(max_entries=10, ttl=60)
+    monkeypatch.setitem(stored_procedure_handler._sp_caches, SP_NAME, cache)
+    return cache
+
+
+@pytest.fixture
+def executor(monkeypatch: pytest.MonkeyPatch) -> Iterator[DBExecutor]:
+    """SP_FAKE1 的 DB 改用 2 個執行緒、不能排隊的執行緒池, 多佔用一個執行緒就會被拒絕
+
+    Args:
+        monkeypatch (pytest.MonkeyPatch): monkeypatch
+
+    Yields:
+        DBExecutor: 執行緒池
+    """
+    executor = DBExecutor(StoredProcedureMapping.SP_FAKE1.db, max_workers=2, max_queue=0, queue_timeout=0.2)
+    monkeypatch.setitem(db_executor._executors, executor.database, executor)
+    yield executor
+    executor.shutdown()
+
+
+@pytest.mark.parametrize("columnar", [False, True])
+def test_cached_result_is_a_copy(columnar: bool) -> None:
+    """修改取得的資料列與輸出參數不會影響快取, 之後的呼叫取得原本的結果
+
+    Args:
+        columnar (bool): 是否以欄為單位回傳 result_set
+    """
+    first = simple_sp_execution(SP_NAME, {"DRIVERID": "T123"}, columnar)
+    expected = first.model_dump()
+
+    if columnar:
+        first.result_set.columns.clear()  # type: ignore[union-attr]
+        first.result_set.data["COLUMN_0"][0] = "changed"  # type: ignore[union-attr]
+    else:
+        first.result_set[0]["COLUMN_0"] = "changed"  # type: ignore[index]
+        first.result_set.clear()  # type: ignore[union-attr]
+    first.output_parameters["O_MSG"] = "changed"
+
+    assert simple_sp_execution(SP_NAME, {"DRIVERID": "T123"}, columnar).model_dump() == expected
+
+
+@pytest.mark.anyio
+async def test_async_cached_result_is_a_copy() -> None:
+    """async_sp_execution 命中快取時同樣回傳複本"""
+    first = await async_sp_execution(SP_NAME, {"DRIVERID": "T123"})
+    expected = first.model_dump()
+    first.result_set[0]["COLUMN_0"] = "changed"  # type: ignore[index]
+
+    assert (await async_sp_execution(SP_NAME, {"DRIVERID": "T123"})).model_dump() == expected
+
+
+@pytest.mark.anyio
+async def test_concurrent_cold_key_uses_one_executor_thread(
+    monkeypatch: pytest.MonkeyPatch, sp_cache: TTLCache, executor: DBExecutor
+) -> None:
+    """同一個 key 同時 20 個呼叫只佔用一個 DB 執行緒, 其他 SP 仍可使用另一個執行緒; 取消等待者不影響其他呼叫
+
+    Args:
+        monkeypatch (pytest.MonkeyPatch): monkeypatch
+        sp_cache (TTLCache): SP_FAKE1 的結果快取
+        executor (DBExecutor): SP_FAKE1 的 DB 執行緒池
+    """
+    release = threading.Event()
+    executed: List[tuple] = []
+
+    def results(sql: str, params: tuple) -> Iterator[fakes.ResultSet]:
+        """T123 等到 release 才回傳
+
+        Args:
+            sql (str): SQL 語句
+            params (tuple): 綁定參數
+
+        Yields:
+            fakes.ResultSet: 結果集
+        """
+        executed.append(params)
+        if params == ("T123",):
+            release.wait(5)
+        yield fakes.synthetic_rows(3)
+
+    monkeypatch.setattr(fakes.FakeConnection, "results", staticmethod(results))
+
+    calls = [asyncio.create_task(async_sp_execution(SP_NAME, {"DRIVERID": "T123"})) for _ in range(20)]
+    while not executed:
+        await asyncio.sleep(0.01)
+    assert executor.stats()["pending"] == 1
+
+    # 另一組參數不會因為執行緒被等待者佔滿而 ExecutorBusyError
+    other = await async_sp_execution(SP_NAME, {"DRIVERID": "OTHER"})
+    assert len(other.result_set) == 3
+
+    calls[0].cancel()
+    release.set()
+    responses: Any = await asyncio.gather(*calls[1:])
+
+    assert executed.count(("T123",)) == 1
+    assert all(response.model_dump() == responses[0].model_dump() for response in responses)
+    assert sp_cache.stats()["coalesced"] == 19
+    assert sp_cache.claim(stored_procedure_handler.sp_cache_key(SP_NAME, {"DRIVERID": "T123"})).future is None
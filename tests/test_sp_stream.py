@@ -0,0 +1,123 @@
+"""Stored Procedure 串流回應: 讀取與關閉在執行緒池進行, 斷線時立即歸還 DB 連線."""
+
+import threading
+from typing import Any, List
+import anyio
+import orjson
+import pytest
+from app.benchmark import fakes
+from app.config.stored_procedure_mapping import StoredProcedureMapping
+from app.logic.core import db_manager
+from app.logic.core.db_manager import ConnectionPool
+from app.logic.utilities.stored_procedure_handler import sp_streaming_response
+
+SP = StoredProcedureMapping.SP_FAKE1
+
+
+@pytest.fixture
+def pool(monkeypatch: pytest.MonkeyPatch) -> ConnectionPool:
+    """SP 的 DB 使用新的 pool, SP 回傳 10 筆資料列
+
+    Args:
+        monkeypatch (pytest.MonkeyPatch): monkeypatch
+
+    Returns:
+        ConnectionPool: pool
+    """
+    pool = ConnectionPool(SP.db, min_size=0, max_size=1)
+    monkeypatch.setitem(db_manager._pools, SP.db, pool)
+    monkeypatch.setattr(
+        fakes.FakeConnection, "results", staticmethod(lambda sql, params: iter([fakes.synthetic_rows(10)]))
+    )
+    return pool
+
+
+@pytest.fixture
+def db_threads(monkeypatch: pytest.MonkeyPatch) -> List[int]:
+    """記錄 commit / rollback (結束借用連線) 所在的執行緒
+
+    Args:
+        monkeypatch (pytest.MonkeyPatch): monkeypatch
+
+    Returns:
+        List[int]: 執行緒 ID
+    """
+    threads: List[int] = []
+    monkeypatch.setattr(fakes.FakeConnection, "commit", lambda self: threads.append(threading.get_ident()))
+    monkeypatch.setattr(fakes.FakeConnection, "rollback", lambda self: threads.append(threading.get_ident()))
+    return threads
+
+
+async def call(response: Any, disconnect_after: int) -> List[bytes]:
+    """以 ASGI 呼叫 response, 送出 disconnect_after 個 body 片段後用戶端斷線
+
+    Args:
+        response (Any): StreamingResponse
+        disconnect_after (int): 斷線前收到的 body 片段數
+
+    Returns:
+        List[bytes]: 收到的 body 片段
+    """
+    bodies: List[bytes] = []
+    disconnected = anyio.Event()
+
+    async def receive() -> dict:
+        """等到斷線
+
+        Returns:
+            dict: http.disconnect
+        """
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: dict) -> None:
+        """記錄 body 片段
+
+        Args:
+            message (dict): ASGI 訊息
+        """
+        if message["type"] == "http.response.body" and message["body"]:
+            bodies.append(message["body"])
+            if len(bodies) == disconnect_after:
+                disconnected.set()
+        if not message.get("more_body", True):
+            disconnected.set()
+
+    await response({"type": "http"}, receive, send)
+    return bodies
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("media_format", ["ndjson", "json"])
+async def test_stream_releases_connection_after_last_row(
+    pool: ConnectionPool, db_threads: List[int], media_format: str
+) -> None:
+    """讀完所有資料列後在執行緒池 commit 並歸還連線
+
+    Args:
+        pool (ConnectionPool): pool
+        db_threads (List[int]): commit / rollback 所在的執行緒
+        media_format (str): 串流格式
+    """
+    bodies = await call(sp_streaming_response(SP.name, media_format=media_format, batch_size=3), 0)
+
+    content = b"".join(bodies)
+    rows = [orjson.loads(line) for line in content.splitlines()] if media_format == "ndjson" else orjson.loads(content)
+    assert [row["COLUMN_0"] for row in rows] == list(range(10))
+    assert pool.stats()["in_use"] == 0
+    assert len(db_threads) == 1 and db_threads[0] != threading.get_ident()
+
+
+@pytest.mark.anyio
+async def test_disconnect_releases_connection_in_threadpool(pool: ConnectionPool, db_threads: List[int]) -> None:
+    """用戶端斷線時在回應結束前 rollback 並歸還連線, 不在 event loop 執行緒進行
+
+    Args:
+        pool (ConnectionPool): pool
+        db_threads (List[int]): commit / rollback 所在的執行緒
+    """
+    bodies = await call(sp_streaming_response(SP.name, batch_size=1), 2)
+
+    assert 2 <= len(bodies) < 10
+    assert pool.stats()["in_use"] == 0
+    assert len(db_threads) == 1 and db_threads[0] != threading.get_ident()
@@ -0,0 +1,69 @@
+"""Token 撤銷與登出."""
+
+import multiprocessing
+import time
+from typing import Any
+import pytest
+from fastapi import HTTPException
+from app.logic.utilities.jwt_handler import JWTHandler
+from app.logic.utilities.token_revocation import RevocationList
+from app.schema.auth import PayloadDataSchema
+
+
+def revoke_many(path: str, worker: int, count: int) -> None:
+    """在另一個 process 撤銷 count 個 jti
+
+    Args:
+        path (str): 快照檔路徑
+        worker (int): worker 編號
+        count (int): 數量
+    """
+    revocation_list = RevocationList(path)
+    for index in range(count):
+        revocation_list.revoke(f"{worker}-{index}", time.time() + 3600)
+
+
+def test_concurrent_workers_keep_every_revocation(tmp_path: Any) -> None:
+    """多個 worker 同時撤銷時, 快照檔保留所有 worker 撤銷的 jti
+
+    Args:
+        tmp_path (Any): 暫存目錄
+    """
+    path = str(tmp_path / "revoked.json")
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=revoke_many, args=(path, worker, 50)) for worker in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+
+    revocation_list = RevocationList(path)
+    revocation_list.load()
+    assert revocation_list.stats()["revoked"] == 200
+    assert all(revocation_list.is_revoked(f"{worker}-{index}") for worker in range(4) for index in range(50))
+
+
+def test_logout_revokes_refresh_token() -> None:
+    """撤銷 access token 後, 同一次登入的 refresh token 與它換發的 access token 都無法再使用"""
+    jwt = JWTHandler()
+    data = PayloadDataSchema(
+        token_time="2024-01-01 00:00:00",
+        user_info={"user_name": "tester"},
+        token_expire_minutes=jwt.expire_minutes,
+        re_token_expire_minutes=jwt.re_expire_minutes,
+    )
+    login = jwt.generate_payload(data)
+    other_login = jwt.generate_payload(data)
+    assert login.refresh_token and other_login.refresh_token
+    refreshed = jwt.refresh_token(login.refresh_token)
+
+    jwt.revoke_token(login.access_token)
+
+    for access_token in (login.access_token, refreshed.access_token):
+        with pytest.raises(HTTPException):
+            jwt.verify_token(None, access_token)  # type: ignore[arg-type]
+    with pytest.raises(HTTPException):
+        jwt.refresh_token(login.refresh_token)
+    payload = jwt.verify_token(None, other_login.access_token)  # type: ignore[arg-type]
+    assert payload.user_info == {"user_name": "tester"}
+    assert jwt.refresh_token(other_login.refresh_token).access_token